@@ -0,0 +1,241 @@
+"""Замеры горячих путей файлового менеджера на синтетических деревьях main
+
+Пример:
+    python bench_fs.py --sizes 1000,100000 --shapes wide,deep --output bench.json
+    python bench_fs.py --sizes 1000 --compare bench.json
+
+Приложение запускается без окна (платформа Qt offscreen) во временной папке.
+Для каждой операции сохраняются время, пиковый RSS процесса и число вызовов
+os.stat/lstat/scandir/listdir/rename (на уровне Python, включая фоновые потоки).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from fs_metrics import call_counter
+
+# Глубина дерева формы deep
+DEEP_LEVELS = 50
+# Сколько файлов переименовывать группой
+GROUP_RENAME_FILES = 1000
+# Сколько ждать завершения фоновой работы, с
+WAIT_TIMEOUT = 600
+
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В macOS ru_maxrss в байтах, в Linux — в килобайтах
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+
+def create_tree(base, shape, size):
+    """Создаёт base/main формы shape с size файлами; возвращает (большая папка, путь вглубь)"""
+    root = os.path.join(base, "main")
+    os.makedirs(root)
+    if shape == "wide":
+        target = os.path.join(root, "wide")
+        os.makedirs(target)
+        for i in range(10):
+            os.makedirs(os.path.join(root, f"dir{i}"))
+        for i in range(size):
+            open(os.path.join(target, f"file{i}.txt"), "w").close()
+        return "wide", ["wide"]
+
+    if shape == "deep":
+        levels = [f"d{i}" for i in range(DEEP_LEVELS)]
+        path = root
+        per_level = max(1, size // DEEP_LEVELS)
+        for name in levels:
+            path = os.path.join(path, name)
+            os.makedirs(path)
+            for i in range(per_level):
+                open(os.path.join(path, f"file{i}.txt"), "w").close()
+        return "d0", levels[:10]
+
+    raise ValueError(f"Неизвестная форма дерева: {shape}")
+
+
+def wait_until(app, condition, timeout=WAIT_TIMEOUT):
+    end = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > end:
+            raise TimeoutError("фоновая операция не завершилась")
+        app.processEvents()
+        time.sleep(0.001)
+
+
+class Bench:
+    def __init__(self, app, window, counter):
+        self.app = app
+        self.window = window
+        self.counter = counter
+        self.results = []
+
+    def idle(self):
+        """Ждёт запуска окна и окончания чтения папки, подсчёта размера, переименования
+        и обновления индексов"""
+        w = self.window
+        wait_until(self.app, lambda: (w.started and w.listing_worker is None
+                                      and w.rollup_worker is None and w.rename_worker is None
+                                      and w.index_worker is None
+                                      and w.text_index_worker is None))
+
+    def measure(self, shape, size, op, action):
+        self.idle()
+        before = self.counter.snapshot()
+        rss_before = peak_rss_kb()
+        start = time.perf_counter()
+        action()
+        self.idle()
+        wall = time.perf_counter() - start
+        after = self.counter.snapshot()
+        result = {
+            "shape": shape,
+            "size": size,
+            "op": op,
+            "wall_s": round(wall, 6),
+            "peak_rss_kb": peak_rss_kb(),
+            "rss_growth_kb": peak_rss_kb() - rss_before,
+            "calls": {name: after[name] - before[name] for name in after},
+        }
+        self.results.append(result)
+        print(f"{shape:>5} {size:>9} {op:<22} {wall:9.4f} s  "
+              f"rss {result['peak_rss_kb']:>8} KB  "
+              + " ".join(f"{k}={v}" for k, v in result["calls"].items() if v))
+        return result
+
+    def command(self, text):
+        self.window.command_input.setText(text)
+        self.window.execute_command()
+
+
+def run_case(app, counter, shape, size):
+    """Строит дерево, запускает приложение в нём и замеряет операции"""
+    from fs_terminal_gui import FileManagerApp
+
+    base = tempfile.mkdtemp(prefix="fs_bench_")
+    old_cwd = os.getcwd()
+    try:
+        big_dir, descent = create_tree(base, shape, size)
+        os.chdir(base)
+        window = FileManagerApp()
+        bench = Bench(app, window, counter)
+        bench.idle()  # Первичное построение индекса в замер не входит
+
+        big_path = os.path.join(window.root_path, big_dir)
+        results = bench.results
+
+        def open_big():
+            window.open_directory(big_path)
+
+        bench.measure(shape, size, "show_dir_info", open_big)
+        bench.measure(shape, size, "refresh_view", window.refresh_view)
+
+        def descend():
+            window.open_directory(window.root_path)
+            for name in descent:
+                bench.command(f"вд {name}")
+            for _ in descent:
+                bench.command("нд")
+
+        bench.measure(shape, size, "вд/нд", descend)
+
+        def rename_back_and_forth():
+            bench.command("имя file0.txt renamed.txt")
+            bench.idle()
+            bench.command("имя renamed.txt file0.txt")
+
+        window.open_directory(big_path)
+        bench.idle()
+        bench.measure(shape, size, "имя", rename_back_and_forth)
+
+        names = sorted(os.listdir(big_path))
+        files = [os.path.join(big_path, n) for n in names if n.startswith("file")]
+        files = files[:GROUP_RENAME_FILES]
+        bench.measure(shape, size, "perform_group_rename",
+                      lambda: window.perform_group_rename(files, "bench"))
+
+        window.close()
+        window.deleteLater()
+        app.processEvents()
+        return results
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(base, ignore_errors=True)
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    """Печатает отношение времени к прошлому прогону по совпадающим операциям"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    old = {(r["shape"], r["size"], r["op"]): r for r in baseline["results"]}
+    print(f"\nСравнение с {baseline_path} ({baseline.get('version')}):")
+    for r in results:
+        prev = old.get((r["shape"], r["size"], r["op"]))
+        if prev is None or not prev["wall_s"]:
+            continue
+        ratio = r["wall_s"] / prev["wall_s"]
+        mark = "  ⚠️ медленнее" if ratio > 1.2 else ""
+        print(f"{r['shape']:>5} {r['size']:>9} {r['op']:<22} x{ratio:.2f}{mark}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры файлового менеджера")
+    parser.add_argument("--sizes", default="1000,100000",
+                        help="размеры деревьев через запятую (например 1000,100000,1000000)")
+    parser.add_argument("--shapes", default="wide,deep", help="формы деревьев: wide, deep")
+    parser.add_argument("--output", help="куда сохранить результаты в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from PySide6.QtWidgets import QApplication, QMessageBox
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    # Итог группового переименования показывается модальным окном — без окна замер встанет
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+
+    counter = call_counter
+    counter.install()
+    results = []
+    try:
+        for shape in args.shapes.split(","):
+            for size in (int(s) for s in args.sizes.split(",")):
+                results.extend(run_case(app, counter, shape.strip(), size))
+    finally:
+        counter.uninstall()
+
+    report = {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,611 @@
+"""Текстовые команды файлового менеджера без графического интерфейса
+
+Запуск сценария:
+    python fs_commands.py script.txt
+    echo "вд 1\\nинфо" | python fs_commands.py --json
+
+Модуль не импортирует Qt: графическое приложение — лишь тонкий клиент поверх
+CommandEngine.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from fs_history import RenameHistory, HISTORY_FILE_NAME
+from fs_duplicates import find_duplicates, HASH_CACHE_NAME, DEFAULT_DUPLICATE_GROUPS
+from fs_index import MetadataIndex, INDEX_FILE_NAME
+from fs_listing import ListingCache
+from fs_operations import (OperationQueue, FileOperation, COPY, MOVE, DELETE, DONE,
+                           STATE_TITLES)
+from fs_rollup import DirRollup, TOP_CHILDREN, format_rollup_lines, format_size
+from fs_rename_rules import RulePreview, PREVIEW_LINES
+from fs_rename import (plan_renames, group_rename_pairs, execute_plan, get_journal_path,
+                       resume_journal)
+from fs_search import compile_pattern, search_tree, search_index, DEFAULT_SEARCH_LIMIT
+from fs_state import STATE_DIR_NAME, get_state_dir
+from fs_textindex import TextIndex, TEXT_INDEX_NAME
+
+COMMANDS_HELP = """
+📋 Доступные команды:
+
+  Нд - подняться на уровень вверх
+  Вд <папка> - перейти в подпапку
+  имя <старое> <новое> - переименовать файл/папку
+  имягр <новое> <имя1> <имя2> ... - групповое переименование файлов
+  имяпр [-n] <отбор> <образец> - переименовать файлы по правилу (-n — только показать)
+      отбор: *.jpg или re:выражение; образец: photo_{n:4}{ext}, {date}_{name}{ext}, {1}{ext}
+  отмена - отменить последнее переименование (имя, имягр, имяпр)
+  повтор - повторить отменённое переименование
+  копир <имя> ... <папка> - скопировать файлы или папки в папку
+  перем <имя> ... <папка> - переместить файлы или папки в папку
+  удал <имя> ... - удалить файлы или папки
+  инфо - показать содержимое текущей папки
+  размер [N] - размер текущей папки и N крупнейших подпапок
+  поиск <шаблон> [лимит] - найти файлы и папки в main (*.txt или re:выражение)
+  поиск - остановить идущий поиск
+  искать <слова> - найти файлы в main, где есть все слова (отч* — слова с таким началом)
+  дубли [N] - найти одинаковые файлы в main (N крупнейших групп)
+  помощь - показать эту справку
+  выход - закрыть программу
+"""
+
+# Потоков общего пула обхода папок (размеры, поиск) на все сессии окна
+SCAN_WORKERS = 8
+
+# Команды файловых операций
+OPERATION_COMMANDS = {"копир": COPY, "перем": MOVE, "удал": DELETE}
+# Все команды ядра
+COMMAND_NAMES = ("выход", "нд", "вд", "имя", "имягр", "имяпр", "отмена", "повтор", "инфо", "размер", "поиск",
+                 "искать", "дубли", "помощь", *OPERATION_COMMANDS)
+
+
+class CommandResult:
+    """Итог команды: строки для вывода и структурированные данные"""
+
+    def __init__(self, command, ok=True, lines=None, data=None):
+        self.command = command
+        self.ok = ok
+        self.lines = lines or []
+        self.data = data or {}
+        self.navigated = False  # Сменилась текущая папка
+        self.changed = False  # Изменилось содержимое текущей папки
+        self.exit = False
+
+    def error(self, message):
+        self.ok = False
+        self.lines.append(message)
+        return self
+
+    def to_dict(self):
+        return {"command": self.command, "ok": self.ok, "lines": self.lines, "data": self.data}
+
+
+def parse_command(line):
+    """Разбивает строку на (команда в нижнем регистре, аргументы)"""
+    parts = line.strip().split()
+    if not parts:
+        return "", []
+    return parts[0].lower(), parts[1:]
+
+
+class CommandEngine:
+    """Состояние сессии (корень main и текущая папка) и выполнение команд
+
+    shared — сессия, с которой новая делит пул обхода, кэши папок и размеров
+    и очередь операций (вкладки одного окна); с сессией того же корня —
+    ещё и индекс содержимого.
+    """
+
+    def __init__(self, root_path, index=None, shared=None):
+        self.root_path = os.path.abspath(root_path)
+        os.makedirs(self.root_path, exist_ok=True)
+        self.current_path = self.root_path
+        self.index = index
+        if shared is None:
+            self.scan_pool = ThreadPoolExecutor(max_workers=SCAN_WORKERS,
+                                                thread_name_prefix="scan")
+            self.rollup = DirRollup(pool=self.scan_pool)
+            self.listings = ListingCache()
+            self.operations = OperationQueue()
+        else:
+            self.scan_pool = shared.scan_pool
+            self.rollup = shared.rollup
+            self.listings = shared.listings
+            self.operations = shared.operations
+        self.rename_journal_path = get_journal_path(get_state_dir(self.root_path))
+        self.hash_cache_path = os.path.join(get_state_dir(self.root_path), HASH_CACHE_NAME)
+        if shared is not None and shared.root_path == self.root_path:
+            self.text_index = shared.text_index
+            self.history = shared.history
+        else:
+            # Базы индекса содержимого и истории создаются при первом обращении
+            self.text_index = TextIndex(
+                self.root_path, os.path.join(get_state_dir(self.root_path), TEXT_INDEX_NAME))
+            self.history = RenameHistory(
+                os.path.join(get_state_dir(self.root_path), HISTORY_FILE_NAME))
+
+    def new_session(self, root_path=None):
+        """Ещё одна сессия с общими ресурсами; по умолчанию — того же корня и в той же папке"""
+        session = CommandEngine(root_path or self.root_path, shared=self)
+        if session.root_path == self.root_path:
+            session.index = self.index
+            session.current_path = self.current_path
+        return session
+
+    def get_relative_path(self):
+        rel_path = os.path.relpath(self.current_path, start=self.root_path)
+        return rel_path if rel_path != "." else "main"
+
+    def is_inside_root(self, path):
+        return self.is_inside(os.path.abspath(path), self.root_path)
+
+    @staticmethod
+    def is_inside(path, parent):
+        return os.path.commonpath([path, parent]) == parent
+
+    def execute(self, line, progress=None, on_matches=None, is_cancelled=None):
+        """Выполняет одну команду; исключения превращаются в строку ошибки
+
+        progress(выполнено, всего) — ход группового переименования,
+        on_matches(порция) — совпадения поиска по мере нахождения.
+        """
+        cmd, args = parse_command(line)
+        result = CommandResult(line.strip())
+        if not cmd:
+            return result
+
+        try:
+            if cmd == "выход":
+                result.exit = True
+            elif cmd == "нд":
+                self.go_up(result)
+            elif cmd == "вд":
+                self.go_down(result, args)
+            elif cmd == "имя":
+                self.rename(result, args)
+            elif cmd == "имягр":
+                self.group_rename(result, args, progress)
+            elif cmd == "имяпр":
+                self.rule_rename(result, args, progress)
+            elif cmd == "отмена":
+                self.undo(result, progress)
+            elif cmd == "повтор":
+                self.redo(result, progress)
+            elif cmd in OPERATION_COMMANDS:
+                self.file_operation(result, cmd, args)
+            elif cmd == "инфо":
+                self.info(result)
+            elif cmd == "размер":
+                self.size(result, args, is_cancelled)
+            elif cmd == "поиск":
+                self.search(result, args, on_matches, is_cancelled)
+            elif cmd == "искать":
+                self.text_search(result, args, is_cancelled)
+            elif cmd == "дубли":
+                self.duplicates(result, args, is_cancelled)
+            elif cmd == "помощь":
+                result.lines.append(COMMANDS_HELP.strip("\n"))
+            else:
+                result.error("❌ Неизвестная команда.")
+                result.lines.append(COMMANDS_HELP.strip("\n"))
+        except Exception as e:
+            result.error(f"⚠️ Ошибка: {e}")
+        return result
+
+    def go_up(self, result):
+        parent = os.path.dirname(self.current_path)
+        if os.path.commonpath([parent, self.root_path]) != self.root_path:
+            return result.error("❌ Нельзя подняться выше 'main'.")
+        if parent == self.current_path:
+            return result.error("❌ Вы уже в корне дерева.")
+
+        self.current_path = parent
+        result.navigated = True
+        result.data["path"] = self.get_relative_path()
+        return result
+
+    def go_down(self, result, args):
+        if not args:
+            return result.error("❌ Укажите имя папки.")
+
+        target = os.path.join(self.current_path, args[0])
+        if os.sep in args[0] or args[0] in (os.curdir, os.pardir):
+            exists = os.path.isdir(target)
+        else:
+            exists = self.listings.is_dir(self.current_path, args[0])
+        if not exists:
+            return result.error("❌ Папка не найдена.")
+        if not self.is_inside_root(target):
+            return result.error("❌ Нельзя выйти за пределы 'main'.")
+
+        self.current_path = os.path.abspath(target)
+        result.navigated = True
+        result.data["path"] = self.get_relative_path()
+        return result
+
+    def rename(self, result, args):
+        if len(args) < 2:
+            return result.error("❌ Использование: имя <старое> <новое>")
+
+        old_name = os.path.join(self.current_path, args[0])
+        new_name_full = ' '.join(args[1:])
+        new_name = os.path.join(self.current_path, new_name_full)
+
+        if not os.path.exists(old_name):
+            return result.error("❌ Файл или папка не существует.")
+
+        self.rename_path(old_name, new_name, result.command)
+        result.lines.append(f"✅ Переименовано: {args[0]} → {new_name_full}")
+        result.data["renamed"] = [[args[0], new_name_full]]
+        result.changed = True
+        return result
+
+    def group_rename(self, result, args, progress=None):
+        if len(args) < 2:
+            return result.error("❌ Использование: имягр <новое> <имя1> <имя2> <имя3> ...")
+
+        file_paths = [os.path.join(self.current_path, name) for name in args[1:]]
+        plan = plan_renames(group_rename_pairs(file_paths, args[0]), self.listings.listdir)
+        return self.report_renames(result, self.run_plan(plan, result.command, progress))
+
+    def rename_path(self, old_path, new_path, title):
+        """Одно переименование с записью в историю"""
+        os.rename(old_path, new_path)
+        self.history.record(title, [(old_path, new_path)])
+
+    def run_plan(self, plan, title, progress=None):
+        """Выполняет план переименований и записывает выполненное в историю"""
+        rename_result = execute_plan(plan, self.rename_journal_path, progress)
+        self.history.record(title, rename_result.renamed)
+        return rename_result
+
+    def resume_renames(self, progress=None):
+        """Доводит прерванный сбоем пакет и записывает его в историю
+
+        Прерванные отмена и повтор не записываются заново, а завершают переход
+        своего пакета истории.
+        """
+        rename_result = resume_journal(self.rename_journal_path, progress)
+        if rename_result.history is None:
+            self.history.record("Продолжение прерванного пакета", rename_result.renamed)
+        elif rename_result.success_count:
+            self.history.set_undone(*rename_result.history)
+        return rename_result
+
+    def undo(self, result, progress=None):
+        """Команда отмена: обратный пакет для последнего пакета истории"""
+        group = self.history.next_undo()
+        if group is None:
+            return result.error("❌ Нечего отменять.")
+        pairs = [(new, old) for old, new in reversed(self.history.moves(group.id))]
+        rename_result = execute_plan(plan_renames(pairs, self.listings.listdir),
+                                     self.rename_journal_path, progress,
+                                     history=(group.id, True))
+        if rename_result.success_count:
+            self.history.set_undone(group.id, True)
+        result.lines.append(f"↩️ Отмена: {group.title}")
+        return self.report_renames(result, rename_result)
+
+    def redo(self, result, progress=None):
+        """Команда повтор: пакет, отменённый последним, выполняется снова"""
+        group = self.history.next_redo()
+        if group is None:
+            return result.error("❌ Нечего повторять.")
+        rename_result = execute_plan(plan_renames(self.history.moves(group.id),
+                                                  self.listings.listdir),
+                                     self.rename_journal_path, progress,
+                                     history=(group.id, False))
+        if rename_result.success_count:
+            self.history.set_undone(group.id, False)
+        result.lines.append(f"↪️ Повтор: {group.title}")
+        return self.report_renames(result, rename_result)
+
+    def report_renames(self, result, rename_result):
+        renamed = [[os.path.basename(old), os.path.basename(new)]
+                   for old, new in rename_result.renamed]
+        # Полный список — в данных результата, в текст идёт только начало
+        result.lines.extend(f"✅ {old} → {new}" for old, new in renamed[:PREVIEW_LINES])
+        if len(renamed) > PREVIEW_LINES:
+            result.lines.append(f"  ... и ещё {len(renamed) - PREVIEW_LINES}")
+        result.lines.extend(f"⚠️ {warning}" for warning in rename_result.warnings)
+        if rename_result.success_count > 0:
+            result.lines.append(f"✅ Успешно переименовано: {rename_result.success_count} файлов")
+        result.data["renamed"] = renamed
+        result.data["warnings"] = rename_result.warnings
+        result.ok = not rename_result.warnings
+        result.changed = bool(renamed)
+        return result
+
+    def rule_rename(self, result, args, progress=None):
+        """Команда имяпр: [-n] <отбор> <образец>"""
+        dry_run = bool(args) and args[0] == "-n"
+        if dry_run:
+            args = args[1:]
+        if len(args) < 2:
+            return result.error("❌ Использование: имяпр [-n] <отбор> <образец>")
+
+        try:
+            preview = self.preview_rule(args[0], ' '.join(args[1:]))
+        except ValueError as e:
+            return result.error(f"❌ Неверный шаблон: {e}")
+
+        if dry_run:
+            mapping = list(zip(preview.old_names, preview.new_names))
+            result.lines.extend(f"  {old} → {new}" for old, new in mapping[:PREVIEW_LINES])
+            if len(mapping) > PREVIEW_LINES:
+                result.lines.append(f"  ... и ещё {len(mapping) - PREVIEW_LINES}")
+            result.lines.extend(f"⚠️ {warning}" for warning in preview.plan.warnings)
+            result.lines.append(f"🔎 {preview.summary()}")
+            result.data.update(renamed=[list(pair) for pair in mapping],
+                               warnings=preview.plan.warnings, dry_run=True)
+            return result
+
+        return self.report_renames(result, self.run_plan(preview.plan, result.command, progress))
+
+    def preview_rule(self, pattern, template_text, directory=None):
+        """Соответствие имён для правила в папке directory (по умолчанию текущей)
+
+        Ошибка в правиле — ValueError.
+        """
+        directory = directory or self.current_path
+        entries = self.listings.read(directory)
+        return RulePreview(directory, pattern, template_text, entries, self.listings.listdir)
+
+    def make_operation(self, result, cmd, args):
+        """Операция для команды копир/перем/удал или None (ошибка — в result)"""
+        kind = OPERATION_COMMANDS[cmd]
+        destination = None
+        if kind != DELETE:
+            if len(args) < 2:
+                result.error(f"❌ Использование: {cmd} <имя> ... <папка>")
+                return None
+            args, destination = args[:-1], os.path.join(self.current_path, args[-1])
+        elif not args:
+            result.error("❌ Использование: удал <имя> ...")
+            return None
+
+        sources = [os.path.join(self.current_path, name) for name in args]
+        return self.check_operation(result, kind, sources, destination)
+
+    def check_operation(self, result, kind, sources, destination=None):
+        """Операция над sources или None, если пути не годятся (ошибка — в result)"""
+        message = self.operation_error(sources, destination)
+        if message:
+            result.error(message)
+            return None
+        return FileOperation(kind, sources, destination)
+
+    def operation_error(self, sources, destination):
+        for path in map(os.path.abspath, sources):
+            if not os.path.lexists(path):
+                return f"❌ Не найдено: {os.path.basename(path)}"
+            if not self.is_inside_root(path) or path == self.root_path:
+                return "❌ Нельзя выйти за пределы 'main'."
+            if destination is not None and self.is_inside(os.path.abspath(destination), path):
+                return f"❌ Нельзя поместить папку саму в себя: {os.path.basename(path)}"
+
+        if destination is not None:
+            if not os.path.isdir(destination):
+                return "❌ Папка назначения не найдена."
+            if not self.is_inside_root(destination):
+                return "❌ Нельзя выйти за пределы 'main'."
+        return None
+
+    def file_operation(self, result, cmd, args):
+        """Команды копир/перем/удал: выполняются в очереди, команда ждёт завершения"""
+        operation = self.make_operation(result, cmd, args)
+        if operation is None:
+            return result
+        self.operations.submit(operation)
+        self.operations.wait(operation)
+        return self.report_operation(result, operation)
+
+    def report_operation(self, result, operation):
+        result.lines.extend(f"⚠️ {error}" for error in operation.errors)
+        result.lines.append(
+            f"{'✅' if operation.state == DONE else '❌'} {operation.title}: "
+            f"{STATE_TITLES[operation.state]} (записей: {operation.done_items}, "
+            f"{format_size(operation.done_bytes)})")
+        result.ok = operation.state == DONE
+        result.changed = True
+        result.data.update(state=operation.state, errors=operation.errors,
+                           items=operation.done_items, bytes=operation.done_bytes)
+        return result
+
+    def info(self, result):
+        rel = self.get_relative_path()
+        result.lines.append(f"📂 Текущая директория: {rel}")
+        result.data["path"] = rel
+
+        dirs = []
+        files = []
+        try:
+            for name, is_dir in self.listings.read(self.current_path).items():
+                if is_dir is not None:
+                    (dirs if is_dir else files).append(name)
+        except PermissionError:
+            return result.error("❌ Нет доступа к этой папке")
+
+        result.data["dirs"] = dirs
+        result.data["files"] = files
+        if not dirs and not files:
+            result.lines.append(" (папка пуста)")
+            return result
+
+        result.lines.append("📁 Папки:")
+        result.lines.extend(f"  📂 {d}" for d in dirs)
+        result.lines.append("📄 Файлы:")
+        for f in files:
+            ext = os.path.splitext(f)[1] or "(без расширения)"
+            result.lines.append(f"  📄 {f} — {ext}")
+        return result
+
+    def size(self, result, args, is_cancelled=None):
+        """Команда размер: [число крупнейших подпапок]"""
+        count = TOP_CHILDREN
+        if args:
+            if not args[0].isdigit():
+                return result.error("❌ Использование: размер [N]")
+            count = int(args[0])
+
+        rollup = self.rollup.compute(self.current_path, is_cancelled)
+        if rollup is None:
+            return result.error("❌ Не удалось посчитать размер папки")
+
+        result.lines.extend(format_rollup_lines(rollup, count))
+        result.data.update(rollup.totals.to_dict(), path=self.get_relative_path(),
+                           top=[dict(t.to_dict(), name=name) for name, t in rollup.top(count)])
+        return result
+
+    def duplicates(self, result, args, is_cancelled=None):
+        """Команда дубли: [число групп]"""
+        count = DEFAULT_DUPLICATE_GROUPS
+        if args:
+            if not args[0].isdigit():
+                return result.error("❌ Использование: дубли [N]")
+            count = int(args[0])
+
+        report = find_duplicates(self.root_path, self.hash_cache_path, is_cancelled)
+        if report is None:
+            return result.error("⏹ Поиск дубликатов остановлен.")
+
+        for group in report.groups[:count]:
+            result.lines.append(f"📑 {len(group.paths)} × {format_size(group.size)}:")
+            result.lines.extend(f"  📄 {path}" for path in group.paths)
+        if len(report.groups) > count:
+            result.lines.append(f"  ... и ещё групп: {len(report.groups) - count}")
+
+        wasted = sum(group.wasted for group in report.groups)
+        if report.groups:
+            result.lines.append(f"✅ Групп одинаковых файлов: {len(report.groups)}, "
+                                f"лишние копии занимают {format_size(wasted)}")
+        else:
+            result.lines.append("✅ Одинаковых файлов нет.")
+        result.lines.append(f"  файлов просмотрено: {report.scanned}, хешей посчитано: "
+                            f"{report.hashed}, взято из кэша: {report.cached}")
+        result.data.update(
+            wasted=wasted, scanned=report.scanned, hashed=report.hashed, cached=report.cached,
+            groups=[{"size": g.size, "hash": g.digest, "paths": g.paths} for g in report.groups])
+        return result
+
+    def text_search(self, result, args, is_cancelled=None):
+        """Команда искать: <слова> — поиск по содержимому файлов"""
+        if not args:
+            return result.error("❌ Использование: искать <слова>")
+
+        # Первый поиск в сессии досчитывает изменения в индексе; дальше его
+        # обновляет приложение в фоне
+        if not self.text_index.updated and self.text_index.update(is_cancelled) is None:
+            return result.error("⏹ Поиск остановлен.")
+        try:
+            hits, found = self.text_index.search(' '.join(args))
+        except ValueError as e:
+            return result.error(f"❌ Неверный запрос: {e}")
+
+        result.lines.extend(f"  📄 {hit.path} — вхождений: {hit.count}" for hit in hits)
+        if found == 0:
+            result.lines.append("❌ Ничего не найдено.")
+        elif found > len(hits):
+            result.lines.append(f"✅ Найдено файлов: {found}, показаны {len(hits)} лучших")
+        else:
+            result.lines.append(f"✅ Найдено файлов: {found}")
+        result.data.update(query=' '.join(args), found=found,
+                           hits=[{"path": hit.path, "score": round(hit.score, 4),
+                                  "count": hit.count} for hit in hits])
+        return result
+
+    def search(self, result, args, on_matches=None, is_cancelled=None):
+        """Команда поиск: <шаблон> [лимит]"""
+        if not args:
+            return result.error("❌ Использование: поиск <шаблон> [лимит]")
+
+        limit = DEFAULT_SEARCH_LIMIT
+        if len(args) > 1 and args[-1].isdigit():
+            limit = int(args[-1])
+            args = args[:-1]
+        return self.find(result, ' '.join(args), limit, on_matches, is_cancelled)
+
+    def find(self, result, pattern, limit=DEFAULT_SEARCH_LIMIT, on_matches=None,
+             is_cancelled=None):
+        """Поиск по именам во всём main; без on_matches совпадения попадают в результат"""
+        try:
+            regex = compile_pattern(pattern)
+        except re.error as e:
+            return result.error(f"❌ Неверное выражение: {e}")
+
+        collected = []
+        if on_matches is None:
+            on_matches = collected.extend
+
+        if self.index is not None and self.index.is_built():
+            found, limited = search_index(self.index, regex, on_matches, limit, is_cancelled)
+        else:
+            found, limited = search_tree(self.root_path, regex, on_matches, limit, is_cancelled,
+                                          pool=self.scan_pool)
+
+        result.lines.extend(f"  {'📂' if is_dir else '📄'} {rel}" for rel, is_dir in collected)
+        if found == 0:
+            result.lines.append("❌ Ничего не найдено.")
+        elif limited:
+            result.lines.append(f"✅ Показаны первые {found} совпадений")
+        else:
+            result.lines.append(f"✅ Найдено: {found}")
+        result.data.update(pattern=pattern, found=found, limited=limited,
+                           matches=[{"path": rel, "is_dir": is_dir} for rel, is_dir in collected])
+        return result
+
+
+def run_script(engine, lines, out, as_json=False):
+    """Выполняет команды по одной на строку; пустые строки и # комментарии пропускаются
+
+    Возвращает код завершения: 0, если все команды прошли успешно.
+    """
+    status = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        result = engine.execute(line)
+        if as_json:
+            out.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+        else:
+            out.write(f"> {line}\n")
+            for text in result.lines:
+                out.write(text + "\n")
+        if not result.ok:
+            status = 1
+        if result.exit:
+            break
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Команды файлового менеджера без GUI")
+    parser.add_argument("script", nargs="?", default="-",
+                        help="файл с командами (по умолчанию стандартный ввод)")
+    parser.add_argument("--root", default=os.path.join(os.getcwd(), "main"),
+                        help="корневая папка (по умолчанию ./main)")
+    parser.add_argument("--json", action="store_true",
+                        help="выводить результат каждой команды строкой JSON")
+    args = parser.parse_args(argv)
+
+    # Индекс используется для поиска, только если он уже построен приложением
+    index = None
+    index_path = os.path.join(os.path.dirname(os.path.abspath(args.root)),
+                              STATE_DIR_NAME, INDEX_FILE_NAME)
+    if os.path.exists(index_path):
+        index = MetadataIndex(args.root, index_path)
+
+    engine = CommandEngine(args.root, index)
+    if args.script == "-":
+        return run_script(engine, sys.stdin, sys.stdout, args.json)
+    with open(args.script, encoding="utf-8") as f:
+        return run_script(engine, f, sys.stdout, args.json)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,520 @@
+import os
+
+from PySide6.QtCore import Qt, QThread, QTimer, Signal, QEvent
+from PySide6.QtGui import QFont
+from PySide6.QtWidgets import (QDialog, QDialogButtonBox, QFormLayout, QLabel,
+                               QLineEdit, QVBoxLayout, QHBoxLayout, QTableView, QHeaderView,
+                               QPushButton, QWidget, QProgressBar, QSpinBox, QScrollArea,
+                               QTableWidget, QTableWidgetItem, QScrollBar)
+
+from fs_metrics import COUNTED_CALLS
+from fs_models import RenamePreviewModel, FilePreviewModel
+from fs_operations import PAUSED, STATE_TITLES
+from fs_preview import PreviewFile
+from fs_rollup import format_size
+
+# Предел значения полосы прокрутки просмотра; дальше позиция масштабируется
+PREVIEW_SCROLL_MAX = 1 << 30
+# Строк за один шаг колеса мыши
+WHEEL_ROWS = 3
+
+
+class RenameDialog(QDialog):
+    def __init__(self, current_name, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Переименовать")
+        self.setModal(True)
+        self.resize(300, 100)
+
+        layout = QFormLayout(self)
+
+        self.old_name_label = QLabel(current_name)
+        self.new_name_input = QLineEdit(current_name)
+
+        layout.addRow("Текущее имя:", self.old_name_label)
+        layout.addRow("Новое имя:", self.new_name_input)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout.addRow(buttons)
+
+    def get_new_name(self):
+        return self.new_name_input.text().strip()
+
+
+class GroupRenameDialog(QDialog):
+    def __init__(self, file_count, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Групповое переименование")
+        self.setModal(True)
+        self.resize(400, 150)
+
+        layout = QFormLayout(self)
+
+        self.file_count_label = QLabel(f"Будет переименовано файлов: {file_count}")
+        self.new_name_input = QLineEdit()
+        self.new_name_input.setPlaceholderText("Введите новое базовое имя")
+
+        layout.addRow(self.file_count_label)
+        layout.addRow("Базовое имя:", self.new_name_input)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout.addRow(buttons)
+
+    def get_new_name(self):
+        return self.new_name_input.text().strip()
+
+
+class RulePreviewWorker(QThread):
+    """Строит RulePreview в фоне: для большой папки это секунды"""
+    preview_ready = Signal(int, object, str)  # поколение, RulePreview или None, ошибка
+
+    def __init__(self, generation, build, pattern, template, parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.build = build
+        self.pattern = pattern
+        self.template = template
+
+    def run(self):
+        preview, error = None, ""
+        try:
+            preview = self.build(self.pattern, self.template)
+        except ValueError as e:
+            error = f"❌ Неверный шаблон: {e}"
+        except OSError as e:
+            error = f"❌ Не удалось прочитать папку: {e}"
+        self.preview_ready.emit(self.generation, preview, error)
+
+
+class RuleRenameDialog(QDialog):
+    """Переименование по правилу с предпросмотром полного соответствия имён
+
+    preview(отбор, образец) строит RulePreview или бросает ValueError; он
+    вызывается в RulePreviewWorker. Поток принадлежит родителю диалога, чтобы
+    закрытие диалога не ждало построения, а окно дождалось его при выходе.
+    """
+
+    def __init__(self, preview, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Переименование по шаблону")
+        self.setModal(True)
+        self.resize(700, 500)
+        self.build_preview = preview
+        self.preview = None
+        self.generation = 0  # Результат прежнего правила отбрасывается
+
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+
+        self.pattern_input = QLineEdit("*")
+        self.pattern_input.setPlaceholderText("*.jpg или re:выражение")
+        self.template_input = QLineEdit("{name}{ext}")
+        self.template_input.setPlaceholderText("photo_{n:4}{ext}")
+        form.addRow("Отбор:", self.pattern_input)
+        form.addRow("Образец:", self.template_input)
+        form.addRow(QLabel("Поля: {name} {ext} {n} {n:4} {n:4:100} {date} {date:%Y%m%d} "
+                           "{today} {1} {g:имя}"))
+        layout.addLayout(form)
+
+        self.preview_button = QPushButton("Просмотр")
+        self.preview_button.clicked.connect(self.update_preview)
+        layout.addWidget(self.preview_button)
+
+        # Предпросмотр: текст строк формируется только для видимой области
+        self.model = RenamePreviewModel(self)
+        view = QTableView()
+        view.setModel(self.model)
+        view.setShowGrid(False)
+        view.setWordWrap(False)
+        view.verticalHeader().hide()
+        view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        view.verticalHeader().setDefaultSectionSize(view.fontMetrics().height() + 4)
+        view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(view)
+
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        self.buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        layout.addWidget(self.buttons)
+
+        # Правило меняется — старый предпросмотр больше не подтверждает его
+        self.pattern_input.textChanged.connect(self.invalidate_preview)
+        self.template_input.textChanged.connect(self.invalidate_preview)
+        self.invalidate_preview()
+
+    def get_rule(self):
+        return self.pattern_input.text().strip(), self.template_input.text()
+
+    def invalidate_preview(self):
+        self.generation += 1
+        self.preview = None
+        self.model.set_preview(None)
+        self.summary_label.setText("Нажмите «Просмотр», чтобы проверить правило.")
+        self.preview_button.setEnabled(True)
+        self.buttons.button(QDialogButtonBox.Ok).setEnabled(False)
+
+    def update_preview(self):
+        pattern, template = self.get_rule()
+        self.invalidate_preview()
+        self.summary_label.setText("⏳ Строится предпросмотр...")
+        self.preview_button.setEnabled(False)
+        worker = RulePreviewWorker(self.generation, self.build_preview, pattern, template,
+                                   self.parent() or self)
+        worker.preview_ready.connect(self.on_preview_ready)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    def done(self, result):
+        # Без родителя поток принадлежит диалогу и не должен пережить его
+        for worker in self.findChildren(QThread):
+            worker.wait()
+        super().done(result)
+
+    def on_preview_ready(self, generation, preview, error):
+        if generation != self.generation:
+            return
+        self.preview_button.setEnabled(True)
+        if preview is None:
+            self.summary_label.setText(error)
+            return
+
+        self.preview = preview
+        self.model.set_preview(preview)
+        text = preview.summary()
+        if preview.plan.warnings:
+            shown = preview.plan.warnings[:5]
+            text += "\n" + "\n".join(f"⚠️ {w}" for w in shown)
+            if len(preview.plan.warnings) > len(shown):
+                text += f"\n... и ещё {len(preview.plan.warnings) - len(shown)}"
+        self.summary_label.setText(text)
+        self.buttons.button(QDialogButtonBox.Ok).setEnabled(preview.rename_count > 0)
+
+
+class OperationRow(QWidget):
+    """Строка панели операций: название, ход, пауза и отмена"""
+
+    def __init__(self, operation, parent=None):
+        super().__init__(parent)
+        self.operation = operation
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.title_label = QLabel(operation.title)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFixedWidth(160)
+        self.state_label = QLabel()
+        self.state_label.setFixedWidth(220)
+        self.pause_button = QPushButton("Пауза")
+        self.pause_button.setFixedWidth(100)
+        self.pause_button.clicked.connect(self.toggle_pause)
+        self.cancel_button = QPushButton("Отмена")
+        self.cancel_button.setFixedWidth(80)
+        self.cancel_button.clicked.connect(operation.cancel)
+
+        layout.addWidget(self.title_label, 1)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.state_label)
+        layout.addWidget(self.pause_button)
+        layout.addWidget(self.cancel_button)
+        self.update_state()
+
+    def toggle_pause(self):
+        if self.operation.resume_event.is_set():
+            self.operation.pause()
+        else:
+            self.operation.resume()
+        self.update_state()
+
+    def update_state(self):
+        op = self.operation
+        self.progress_bar.setValue(op.percent())
+        detail = f"{format_size(op.done_bytes)} из {format_size(op.total_bytes)}"
+        self.state_label.setText(f"{STATE_TITLES[op.state]}, {detail}")
+        if op.errors:
+            self.state_label.setToolTip("\n".join(op.errors))
+        self.pause_button.setText("Продолжить" if op.state == PAUSED else "Пауза")
+        self.pause_button.setEnabled(not op.finished)
+        self.cancel_button.setEnabled(not op.finished)
+
+
+class OperationsPanel(QWidget):
+    """Немодальная панель очереди файловых операций"""
+
+    def __init__(self, queue, parent=None):
+        super().__init__(parent)
+        self.queue = queue
+        self.rows = {}
+
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Ограничение скорости, МБ/с (0 — нет):"))
+        self.limit_input = QSpinBox()
+        self.limit_input.setRange(0, 10000)
+        self.limit_input.setValue(queue.throttle.bytes_per_second // (1024 * 1024))
+        self.limit_input.valueChanged.connect(
+            lambda value: queue.set_limit(value * 1024 * 1024))
+        controls.addWidget(self.limit_input)
+        controls.addStretch()
+        clear_button = QPushButton("Убрать завершённые")
+        clear_button.clicked.connect(self.clear_finished)
+        controls.addWidget(clear_button)
+        layout.addLayout(controls)
+
+        self.rows_widget = QWidget()
+        self.rows_layout = QVBoxLayout(self.rows_widget)
+        self.rows_layout.addStretch()
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(self.rows_widget)
+        layout.addWidget(scroll)
+
+    def update_operation(self, operation):
+        row = self.rows.get(operation.id)
+        if row is None:
+            row = OperationRow(operation)
+            self.rows[operation.id] = row
+            self.rows_layout.insertWidget(self.rows_layout.count() - 1, row)
+        row.update_state()
+
+    def clear_finished(self):
+        for op_id, row in list(self.rows.items()):
+            if row.operation.finished:
+                row.deleteLater()
+                del self.rows[op_id]
+        self.queue.forget_finished()
+
+
+class PreviewPanel(QWidget):
+    """Панель просмотра файла: текст или шестнадцатеричный дамп
+
+    Файл не читается целиком: строки берутся из отображения в память только
+    для видимой области, индекс строк строит окно в фоне и передаёт в add_lines.
+    Таблица показывает только видимые строки, а полоса прокрутки справа
+    отвечает номеру первой строки во всём файле: у таблицы высота строк
+    ограничена int и многогигабайтный файл в неё не поместился бы.
+    """
+    mode_changed = Signal(bool)  # True — дамп
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.preview = None
+
+        layout = QVBoxLayout(self)
+        header = QHBoxLayout()
+        self.title_label = QLabel()
+        header.addWidget(self.title_label, 1)
+        self.hex_button = QPushButton("Hex")
+        self.hex_button.setCheckable(True)
+        self.hex_button.setFixedWidth(60)
+        self.hex_button.toggled.connect(self.on_hex_toggled)
+        header.addWidget(self.hex_button)
+        layout.addLayout(header)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        # Фиксированная высота строк, как в панели содержимого папки: представление
+        # не обходит строки за пределами видимой области
+        self.model = FilePreviewModel(self)
+        self.view = QTableView()
+        self.view.setFont(QFont("Consolas", 10))
+        self.view.setModel(self.model)
+        self.view.setShowGrid(False)
+        self.view.setWordWrap(False)
+        self.view.setEditTriggers(QTableView.NoEditTriggers)
+        self.view.horizontalHeader().hide()
+        self.view.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.view.verticalHeader().hide()
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(self.view.fontMetrics().height() + 4)
+        self.view.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.view.installEventFilter(self)
+        self.view.viewport().installEventFilter(self)
+
+        self.scroll_bar = QScrollBar(Qt.Vertical)
+        self.scroll_bar.valueChanged.connect(self.on_scrolled)
+        body = QHBoxLayout()
+        body.setSpacing(0)
+        body.addWidget(self.view)
+        body.addWidget(self.scroll_bar)
+        layout.addLayout(body)
+
+    def page_rows(self):
+        return max(1, self.view.viewport().height()
+                   // self.view.verticalHeader().defaultSectionSize())
+
+    def scroll_to(self, first):
+        """Показывает строки с first и ставит полосу прокрутки в соответствующее место"""
+        self.model.set_window(first, self.page_rows())
+        self.update_scroll_bar()
+
+    def update_scroll_bar(self):
+        max_first = self.model.max_first()
+        maximum = min(max_first, PREVIEW_SCROLL_MAX)
+        value = self.model.first
+        if max_first > PREVIEW_SCROLL_MAX:
+            value = round(value * PREVIEW_SCROLL_MAX / max_first)
+        self.scroll_bar.blockSignals(True)
+        self.scroll_bar.setRange(0, maximum)
+        self.scroll_bar.setPageStep(min(self.page_rows(), PREVIEW_SCROLL_MAX))
+        self.scroll_bar.setValue(value)
+        self.scroll_bar.blockSignals(False)
+
+    def on_scrolled(self, value):
+        max_first = self.model.max_first()
+        if max_first > PREVIEW_SCROLL_MAX:
+            value = round(value * max_first / PREVIEW_SCROLL_MAX)
+        self.model.set_window(value, self.page_rows())
+
+    def eventFilter(self, watched, event):
+        if watched is self.view.viewport():
+            if event.type() == QEvent.Resize:
+                self.scroll_to(self.model.first)
+            elif event.type() == QEvent.Wheel:
+                steps = -event.angleDelta().y() / 120
+                self.scroll_to(self.model.first + round(steps * WHEEL_ROWS))
+                return True
+        elif watched is self.view and event.type() == QEvent.KeyPress:
+            page = self.page_rows()
+            moves = {Qt.Key_Up: -1, Qt.Key_Down: 1, Qt.Key_PageUp: -page,
+                     Qt.Key_PageDown: page}
+            if event.key() in moves:
+                self.scroll_to(self.model.first + moves[event.key()])
+                return True
+            if event.key() in (Qt.Key_Home, Qt.Key_End):
+                self.scroll_to(0 if event.key() == Qt.Key_Home else self.model.max_first())
+                return True
+        return super().eventFilter(watched, event)
+
+    def show_file(self, path):
+        """Открывает path для просмотра; PreviewFile или None, если открыть не удалось"""
+        self.close_file()
+        try:
+            self.preview = PreviewFile(path)
+        except (OSError, ValueError) as e:
+            self.title_label.setText(os.path.basename(path))
+            self.status_label.setText(f"❌ Не удалось открыть: {e}")
+            return None
+
+        self.title_label.setText(os.path.basename(path))
+        self.title_label.setToolTip(path)
+        self.hex_button.blockSignals(True)
+        self.hex_button.setChecked(self.preview.is_binary)
+        self.hex_button.blockSignals(False)
+        self.model.set_preview(self.preview, self.preview.is_binary)
+        self.scroll_to(0)
+        self.update_status()
+        return self.preview
+
+    def close_file(self):
+        """Закрывает отображение файла (на Windows оно мешает переименовать файл)"""
+        if self.preview is None:
+            return
+        self.model.set_preview(None, False)
+        self.update_scroll_bar()
+        self.preview.close()
+        self.preview = None
+        self.title_label.clear()
+        self.title_label.setToolTip("")
+        self.status_label.clear()
+
+    def add_lines(self, checkpoints, line_count, complete):
+        if self.preview is None:
+            return
+        self.preview.add_checkpoints(checkpoints, line_count, complete)
+        self.model.lines_added()
+        self.update_scroll_bar()
+        self.update_status()
+
+    def on_hex_toggled(self, checked):
+        if self.preview is None:
+            return
+        self.model.set_hex_mode(checked)
+        self.scroll_to(0)
+        self.update_status()
+        self.mode_changed.emit(checked)
+
+    def update_status(self):
+        preview = self.preview
+        if preview is None:
+            return
+        parts = [format_size(preview.size)]
+        if self.model.hex_mode:
+            parts.append(f"строк дампа: {preview.hex_rows}")
+        else:
+            lines = f"строк: {preview.line_count}"
+            if not preview.complete:
+                lines += " (подсчёт идёт…)"
+            parts += [lines, preview.encoding]
+            if preview.is_binary:
+                parts.append("двоичный файл")
+        if not preview.valid:
+            parts.append("⚠️ файл укоротили — откройте его заново")
+        self.status_label.setText(", ".join(parts))
+
+
+class DiagnosticsDialog(QDialog):
+    """Немодальное окно со сводкой замеров; обновляется раз в секунду
+
+    extra() возвращает строки о кэшах и фоновой работе.
+    """
+    COLUMNS = ("Операция", "Раз", "Среднее, мс", "Макс., мс", "Последнее, мс",
+               *(f"{name}/раз" for name in COUNTED_CALLS))
+
+    def __init__(self, metrics, extra, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Диагностика")
+        self.resize(900, 400)
+        self.metrics = metrics
+        self.extra = extra
+
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        self.extra_label = QLabel()
+        layout.addWidget(self.extra_label)
+
+        path = metrics.path or "не ведётся (запуск с --metrics <файл>)"
+        layout.addWidget(QLabel(f"Файл замеров: {path}"))
+        if metrics.path is None:
+            layout.addWidget(QLabel("Вызовы файловой системы считаются, пока открыто это окно"))
+
+        # Обёртки функций os ставятся только на время работы окна
+        metrics.begin_counting()
+        self.finished.connect(metrics.end_counting)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+        self.refresh()
+
+    def refresh(self):
+        rows = self.metrics.summary()
+        self.table.setRowCount(len(rows))
+        for row, (name, stats) in enumerate(rows):
+            values = [name, str(stats.count), f"{stats.total_s * 1000 / stats.count:.1f}",
+                      f"{stats.max_s * 1000:.1f}", f"{stats.last_s * 1000:.1f}"]
+            values.extend(f"{stats.calls.get(call, 0) / stats.count:.1f}"
+                          for call in COUNTED_CALLS)
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+        self.extra_label.setText("\n".join(self.extra()))
@@ -0,0 +1,262 @@
+"""Поиск одинаковых файлов в дереве main
+
+Файлы сравниваются в три шага: по размеру, по хешу начала файла и по хешу
+всего файла. Хеши считает пул процессов, файлы читаются через mmap. Готовые
+хеши сохраняются в кэше по (устройство, inode) вместе с размером и mtime:
+повторный поиск хеширует только новые и изменившиеся файлы, а записи
+удалённых и изменённых файлов после полного обхода убираются.
+"""
+import os
+import mmap
+import sqlite3
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Имя файла кэша хешей в служебной папке
+HASH_CACHE_NAME = "hash_cache.sqlite3"
+# Сколько байт от начала файла хешировать на втором шаге
+PARTIAL_HASH_BYTES = 64 * 1024
+# Порция, которую хеш-функция получает за раз
+HASH_BLOCK_BYTES = 1024 * 1024
+# Меньше стольких файлов хешируем в своём процессе: запуск пула дороже
+POOL_MIN_FILES = 32
+# Сколько групп выводить по умолчанию
+DEFAULT_DUPLICATE_GROUPS = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    partial TEXT,
+    full TEXT,
+    PRIMARY KEY (dev, ino)
+) WITHOUT ROWID;
+"""
+
+
+class FileInfo:
+    __slots__ = ("path", "size", "dev", "ino", "mtime_ns", "partial", "full")
+
+    def __init__(self, path, size, dev, ino, mtime_ns):
+        self.path = path
+        self.size = size
+        self.dev = dev
+        self.ino = ino
+        self.mtime_ns = mtime_ns
+        self.partial = None
+        self.full = None
+
+
+class DuplicateGroup:
+    """Одинаковые файлы: размер, хеш и пути"""
+
+    def __init__(self, size, digest, paths):
+        self.size = size
+        self.digest = digest
+        self.paths = paths
+
+    @property
+    def wasted(self):
+        """Сколько места занимают лишние копии"""
+        return self.size * (len(self.paths) - 1)
+
+
+class DuplicateReport:
+    def __init__(self, groups, scanned, hashed, cached):
+        self.groups = groups  # [DuplicateGroup] по убыванию wasted
+        self.scanned = scanned  # Файлов просмотрено
+        self.hashed = hashed  # Хешей посчитано
+        self.cached = cached  # Хешей взято из кэша
+
+
+def hash_file(path, limit=None):
+    """blake2b содержимого path (или первых limit байт) через mmap; None при ошибке"""
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if limit is not None:
+                size = min(size, limit)
+            if size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        for start in range(0, size, HASH_BLOCK_BYTES):
+                            digest.update(view[start:min(start + HASH_BLOCK_BYTES, size)])
+                    finally:
+                        view.release()
+    except (OSError, ValueError):
+        return None
+    return digest.hexdigest()
+
+
+def _hash_task(task):
+    path, limit = task
+    return hash_file(path, limit)
+
+
+class HashCache:
+    """Кэш хешей в SQLite; соединение открывается в потоке, который ищет дубликаты"""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def fill(self, files):
+        """Проставляет сохранённые хеши файлам, у которых не изменились размер и mtime"""
+        cached = 0
+        for info in files:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, partial, full FROM hashes WHERE dev = ? AND ino = ?",
+                (info.dev, info.ino)).fetchone()
+            if row is not None and row[0] == info.size and row[1] == info.mtime_ns:
+                info.partial, info.full = row[2], row[3]
+                cached += (info.partial is not None) + (info.full is not None)
+        return cached
+
+    def prune(self, files):
+        """Удаляет хеши файлов, которых нет среди files (полного обхода дерева)
+        или у которых изменились размер и mtime"""
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (dev INTEGER, ino INTEGER, "
+                              "size INTEGER, mtime_ns INTEGER, PRIMARY KEY (dev, ino)) "
+                              "WITHOUT ROWID")
+            self.conn.execute("DELETE FROM seen")
+            self.conn.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?, ?, ?)",
+                                  ((f.dev, f.ino, f.size, f.mtime_ns) for f in files))
+            self.conn.execute(
+                "DELETE FROM hashes WHERE NOT EXISTS (SELECT 1 FROM seen s WHERE "
+                "s.dev = hashes.dev AND s.ino = hashes.ino AND s.size = hashes.size "
+                "AND s.mtime_ns = hashes.mtime_ns)")
+            self.conn.execute("DELETE FROM seen")
+
+    def store(self, files):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                [(f.dev, f.ino, f.size, f.mtime_ns, f.partial, f.full) for f in files])
+
+    def close(self):
+        self.conn.close()
+
+
+def _walk_files(root_path, is_cancelled=None):
+    """Обычные файлы ненулевого размера без перехода по символическим ссылкам"""
+    stack = [root_path]
+    while stack:
+        if is_cancelled is not None and is_cancelled():
+            return
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            if st.st_size:
+                                yield FileInfo(entry.path, st.st_size, st.st_dev, st.st_ino,
+                                               st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def _group(files, key):
+    groups = {}
+    for info in files:
+        groups.setdefault(key(info), []).append(info)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _compute_hashes(files, attribute, limit, is_cancelled, pool_factory):
+    """Считает недостающие хеши files в атрибут attribute; возвращает их число"""
+    todo = [info for info in files if getattr(info, attribute) is None]
+    if not todo:
+        return 0
+
+    tasks = [(info.path, limit) for info in todo]
+    done = 0
+    if len(todo) >= POOL_MIN_FILES:
+        try:
+            pool = pool_factory()
+            try:
+                chunksize = max(1, len(tasks) // 64)
+                for info, digest in zip(todo, pool.map(_hash_task, tasks, chunksize=chunksize)):
+                    if is_cancelled is not None and is_cancelled():
+                        return 0
+                    setattr(info, attribute, digest)
+                    done += 1
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+            return done
+        except (BrokenProcessPool, OSError):
+            pass  # Пул не запустился или упал — досчитываем в своём процессе
+
+    for info, task in zip(todo[done:], tasks[done:]):
+        if is_cancelled is not None and is_cancelled():
+            return 0
+        setattr(info, attribute, _hash_task(task))
+    return len(todo)
+
+
+def find_duplicates(root_path, cache_path=None, is_cancelled=None, workers=None):
+    """Группы одинаковых файлов в дереве root_path; None, если поиск отменён
+
+    Жёсткие ссылки на один inode считаются одним файлом.
+    """
+    seen = set()
+    files = []
+    for info in _walk_files(root_path, is_cancelled):
+        if (info.dev, info.ino) not in seen:
+            seen.add((info.dev, info.ino))
+            files.append(info)
+    if is_cancelled is not None and is_cancelled():
+        return None
+    scanned = len(files)
+
+    # Пул создаётся в режиме spawn: fork из многопоточного процесса небезопасен
+    def pool_factory():
+        return ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context("spawn"))
+
+    candidates = [info for group in _group(files, lambda f: f.size) for info in group]
+    cache = HashCache(cache_path) if cache_path else None
+    try:
+        cached = cache.fill(candidates) if cache is not None else 0
+
+        # Маленькие файлы помещаются в частичный хеш целиком
+        hashed = _compute_hashes(candidates, "partial", PARTIAL_HASH_BYTES, is_cancelled,
+                                 pool_factory)
+        for info in candidates:
+            if info.size <= PARTIAL_HASH_BYTES:
+                info.full = info.partial
+
+        same_start = [info for group in _group(candidates, lambda f: (f.size, f.partial))
+                      for info in group if info.partial is not None]
+        hashed += _compute_hashes(same_start, "full", None, is_cancelled, pool_factory)
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        if cache is not None:
+            cache.prune(files)  # Удалённые и изменённые файлы не копятся в кэше
+            cache.store(candidates)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    groups = []
+    for group in _group(same_start, lambda f: (f.size, f.full)):
+        if group[0].full is None:
+            continue
+        paths = sorted(os.path.relpath(info.path, root_path).replace(os.sep, "/")
+                       for info in group)
+        groups.append(DuplicateGroup(group[0].size, group[0].full, paths))
+    groups.sort(key=lambda g: g.wasted, reverse=True)
+    return DuplicateReport(groups, scanned, hashed, cached)
@@ -0,0 +1,194 @@
+"""История переименований для отмены и повтора
+
+Каждый пакет (одна команда или одно действие в окне) записывается одной
+транзакцией: заголовок и список переименований. Пути хранятся компактно —
+папка один раз в отдельной таблице, в записи только имена. Отмена и повтор
+выполняются одним пакетом через plan_renames/execute_plan. История
+ограничена по числу пакетов и переименований: старые пакеты удаляются при
+записи новых, после чего база при необходимости уплотняется.
+"""
+import os
+import time
+import sqlite3
+
+# Имя файла истории в служебной папке
+HISTORY_FILE_NAME = "rename_history.sqlite3"
+# Сколько пакетов хранить
+HISTORY_MAX_GROUPS = 100
+# Сколько переименований хранить во всех пакетах (последний пакет хранится всегда)
+HISTORY_MAX_MOVES = 1_000_000
+# Доля свободных страниц базы, после которой она пересобирается
+VACUUM_FREE_RATIO = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    title TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    undone INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS moves (
+    group_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    dir_id INTEGER NOT NULL,
+    src TEXT NOT NULL,
+    dst TEXT NOT NULL,
+    PRIMARY KEY (group_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS moves_dir ON moves(dir_id);
+"""
+
+
+class HistoryGroup:
+    """Пакет переименований из истории"""
+
+    def __init__(self, id, ts, title, count, undone):
+        self.id = id
+        self.ts = ts
+        self.title = title
+        self.count = count
+        self.undone = bool(undone)
+
+
+class RenameHistory:
+    """История пакетов переименований в SQLite
+
+    Соединение открывается на каждую операцию: запись и отмена редки, а
+    выполняются они из разных потоков.
+    """
+
+    def __init__(self, db_path, max_groups=HISTORY_MAX_GROUPS, max_moves=HISTORY_MAX_MOVES):
+        self.db_path = db_path
+        self.max_groups = max_groups
+        self.max_moves = max_moves
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def record(self, title, pairs):
+        """Записывает выполненный пакет [(старый путь, новый путь)]
+
+        Отменённые пакеты после этого повторить уже нельзя.
+        """
+        pairs = [(old, new) for old, new in pairs if old != new]
+        if not pairs:
+            return None
+
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM moves WHERE group_id IN "
+                             "(SELECT id FROM groups WHERE undone = 1)")
+                dropped = conn.execute("DELETE FROM groups WHERE undone = 1").rowcount
+                group_id = conn.execute(
+                    "INSERT INTO groups (ts, title, count) VALUES (?, ?, ?)",
+                    (time.time(), title, len(pairs))).lastrowid
+
+                dir_ids = {}
+                rows = []
+                for seq, (old, new) in enumerate(pairs):
+                    directory, name = os.path.split(old)
+                    dir_id = dir_ids.get(directory)
+                    if dir_id is None:
+                        dir_id = dir_ids[directory] = self._dir_id(conn, directory)
+                    # Новое имя — относительно папки старого (обычно просто имя)
+                    rows.append((group_id, seq, dir_id, name, os.path.relpath(new, directory)))
+                conn.executemany("INSERT INTO moves VALUES (?, ?, ?, ?, ?)", rows)
+                if dropped:
+                    self._drop_unused_dirs(conn)
+            self.compact(conn)
+        finally:
+            conn.close()
+        return group_id
+
+    @staticmethod
+    def _dir_id(conn, directory):
+        row = conn.execute("SELECT id FROM dirs WHERE path = ?", (directory,)).fetchone()
+        if row is not None:
+            return row[0]
+        return conn.execute("INSERT INTO dirs (path) VALUES (?)", (directory,)).lastrowid
+
+    @staticmethod
+    def _drop_unused_dirs(conn):
+        # Проверка по индексу moves_dir — без него полный проход moves на каждую папку
+        conn.execute("DELETE FROM dirs WHERE NOT EXISTS "
+                     "(SELECT 1 FROM moves WHERE dir_id = dirs.id)")
+
+    def compact(self, conn):
+        """Удаляет старые пакеты сверх лимитов и при необходимости уплотняет базу"""
+        kept_groups = 0
+        kept_moves = 0
+        oldest_kept = None
+        for group_id, count in conn.execute("SELECT id, count FROM groups ORDER BY id DESC"):
+            if kept_groups and (kept_groups >= self.max_groups
+                                or kept_moves + count > self.max_moves):
+                break
+            kept_groups += 1
+            kept_moves += count
+            oldest_kept = group_id
+        if oldest_kept is None:
+            return
+
+        with conn:
+            removed = conn.execute("DELETE FROM groups WHERE id < ?", (oldest_kept,)).rowcount
+            if not removed:
+                return
+            conn.execute("DELETE FROM moves WHERE group_id < ?", (oldest_kept,))
+            self._drop_unused_dirs(conn)
+
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        if pages and free / pages > VACUUM_FREE_RATIO:
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def groups(self):
+        """Все пакеты истории, новые первыми"""
+        conn = self.connect()
+        try:
+            rows = conn.execute("SELECT id, ts, title, count, undone FROM groups "
+                                "ORDER BY id DESC").fetchall()
+        finally:
+            conn.close()
+        return [HistoryGroup(*row) for row in rows]
+
+    def next_undo(self):
+        """Последний не отменённый пакет или None"""
+        return next((group for group in self.groups() if not group.undone), None)
+
+    def next_redo(self):
+        """Пакет, отменённый последним, или None
+
+        Отменённые пакеты всегда самые новые; отменённый последним — самый ранний из них.
+        """
+        undone = [group for group in self.groups() if group.undone]
+        return undone[-1] if undone else None
+
+    def moves(self, group_id):
+        """Переименования пакета [(старый путь, новый путь)] в порядке выполнения"""
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT d.path, m.src, m.dst FROM moves m JOIN dirs d ON d.id = m.dir_id "
+                "WHERE m.group_id = ? ORDER BY m.seq", (group_id,)).fetchall()
+        finally:
+            conn.close()
+        return [(os.path.join(directory, src), os.path.normpath(os.path.join(directory, dst)))
+                for directory, src, dst in rows]
+
+    def set_undone(self, group_id, undone):
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("UPDATE groups SET undone = ? WHERE id = ?", (int(undone), group_id))
+        finally:
+            conn.close()
@@ -0,0 +1,243 @@
+import os
+import time
+import sqlite3
+import threading
+
+# Имя файла индекса в служебной папке
+INDEX_FILE_NAME = "index.sqlite3"
+# Папки, изменённые позже этого срока до сканирования, перечитываются в следующий раз:
+# изменение в пределах того же кванта mtime иначе осталось бы незамеченным
+RACY_MTIME_NS = 2_000_000_000
+# Версия схемы: индекс прежней версии строится заново
+INDEX_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entries (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    is_link INTEGER NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID;
+"""
+
+
+class IndexEntry:
+    """Запись индекса: одна папка или файл"""
+    __slots__ = ("dir", "name", "is_dir", "is_link", "ext", "size", "mtime_ns")
+
+    def __init__(self, dir, name, is_dir, is_link, ext, size, mtime_ns):
+        self.dir = dir
+        self.name = name
+        self.is_dir = bool(is_dir)
+        self.is_link = bool(is_link)
+        self.ext = ext
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+
+class MetadataIndex:
+    """Индекс метаданных дерева main в SQLite: имя, тип, расширение, размер, mtime
+
+    Пути папок хранятся относительно корня через '/', корень — пустая строка.
+    Обновление сравнивает mtime каждой папки с сохранённым и перечитывает только
+    изменившиеся папки, поэтому повторный проход стоит один stat на папку.
+    В перечитанной папке stat делается только для новых и заменённых записей.
+    """
+
+    def __init__(self, root_path, db_path):
+        self.root_path = os.path.abspath(root_path)
+        self.db_path = db_path
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        conn = self.connection()
+        if conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            conn.executescript("DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS dirs;")
+            conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        conn.executescript(SCHEMA)
+
+    def connection(self):
+        """Соединение текущего потока (sqlite3 не разрешает делить их между потоками)"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def to_rel(self, path):
+        rel = os.path.relpath(os.path.abspath(path), self.root_path)
+        if rel == ".":
+            return ""
+        return rel.replace(os.sep, "/")
+
+    def to_abs(self, rel):
+        if not rel:
+            return self.root_path
+        return os.path.join(self.root_path, *rel.split("/"))
+
+    def stored_mtime(self, rel):
+        row = self.connection().execute("SELECT mtime_ns FROM dirs WHERE path = ?",
+                                        (rel,)).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, path):
+        """Актуальна ли запись папки (совпадает mtime)"""
+        rel = self.to_rel(path)
+        stored = self.stored_mtime(rel)
+        if stored is None:
+            return False
+        try:
+            return os.stat(path).st_mtime_ns == stored
+        except OSError:
+            return False
+
+    def list_dir(self, path):
+        """Содержимое папки из индекса или None, если запись устарела, её нет
+        или индекс недоступен (тогда папку читают с диска)"""
+        try:
+            if not self.is_fresh(path):
+                return None
+            rel = self.to_rel(path)
+            rows = self.connection().execute(
+                "SELECT dir, name, is_dir, is_link, ext, size, mtime_ns FROM entries "
+                "WHERE dir = ?", (rel,))
+            return [IndexEntry(*row) for row in rows]
+        except sqlite3.Error:
+            return None
+
+    def is_built(self):
+        """Проходил ли уже индекс хотя бы по корню"""
+        row = self.connection().execute("SELECT 1 FROM dirs WHERE path = ''").fetchone()
+        return row is not None
+
+    def search_names(self, regex):
+        """Записи, имя которых подходит под regex: [(отн. путь, это_папка)]"""
+        conn = self.connection()
+        conn.create_function("name_matches", 1,
+                             lambda name: regex.search(name) is not None, deterministic=True)
+        rows = conn.execute("SELECT dir, name, is_dir FROM entries WHERE name_matches(name)")
+        for rel, name, is_dir in rows:
+            yield (f"{rel}/{name}" if rel else name), bool(is_dir)
+
+    def child_dirs(self, rel):
+        """Подпапки rel без символических ссылок (по ним обход не идёт)"""
+        rows = self.connection().execute(
+            "SELECT name FROM entries WHERE dir = ? AND is_dir = 1 AND is_link = 0", (rel,))
+        return [row[0] for row in rows]
+
+    def refresh_dir(self, path):
+        """Перечитывает одну папку с диска; возвращает её записи (IndexEntry)
+
+        Имена сверяются с сохранёнными записями: stat нужен только новым именам
+        и записям, у которых сменились тип или inode, исчезнувшие удаляются.
+        Файл, переписанный на месте (тот же inode), сохраняет прежние размер и mtime.
+        """
+        rel = self.to_rel(path)
+        scan_started = time.time_ns()
+        stored = {row[1]: row for row in self.connection().execute(
+            "SELECT dir, name, is_dir, is_link, ext, size, mtime_ns, ino FROM entries "
+            "WHERE dir = ?", (rel,))}
+        try:
+            dir_mtime = os.stat(path).st_mtime_ns
+            rows = []
+            changed = []
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                        if not is_dir and not entry.is_file():
+                            continue
+                        is_link = entry.is_symlink()
+                        ino = entry.inode()
+                        old = stored.get(entry.name)
+                        if old is not None and old[2:4] == (is_dir, is_link) and old[7] == ino:
+                            rows.append(old)
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    ext = "" if is_dir else os.path.splitext(entry.name)[1]
+                    row = (rel, entry.name, int(is_dir), int(is_link), ext,
+                           0 if is_dir else st.st_size, st.st_mtime_ns, ino)
+                    rows.append(row)
+                    changed.append(row)
+        except OSError:
+            self.forget_dir(rel)
+            return []
+
+        if scan_started - dir_mtime < RACY_MTIME_NS:
+            dir_mtime = -1  # Слишком свежая папка — перечитаем при следующем обновлении
+
+        removed = stored.keys() - {row[1] for row in rows}
+        old_dirs = {name for name, row in stored.items() if row[2] and not row[3]}
+        new_dirs = {row[1] for row in rows if row[2] and not row[3]}
+
+        with self.write_lock:
+            conn = self.connection()
+            with conn:
+                conn.executemany("DELETE FROM entries WHERE dir = ? AND name = ?",
+                                 ((rel, name) for name in removed))
+                conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 changed)
+                conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (rel, dir_mtime))
+
+        # Исчезнувшие подпапки убираем вместе с поддеревом
+        for name in old_dirs.difference(new_dirs):
+            self.forget_dir(f"{rel}/{name}" if rel else name)
+        return [IndexEntry(*row[:7]) for row in rows]
+
+    def forget_dir(self, rel):
+        """Удаляет из индекса папку rel и всё её поддерево"""
+        prefix = rel + "/"
+        with self.write_lock:
+            conn = self.connection()
+            with conn:
+                for table, column in (("dirs", "path"), ("entries", "dir")):
+                    conn.execute(f"DELETE FROM {table} WHERE {column} = ? "
+                                 f"OR substr({column}, 1, ?) = ?",
+                                 (rel, len(prefix), prefix))
+
+    def update(self, is_cancelled=None):
+        """Проходит дерево и перечитывает папки, у которых изменился mtime
+
+        Возвращает (проверено папок, перечитано папок).
+        """
+        checked = 0
+        refreshed = 0
+        stack = [""]
+        while stack:
+            if is_cancelled is not None and is_cancelled():
+                break
+            rel = stack.pop()
+            path = self.to_abs(rel)
+            checked += 1
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                self.forget_dir(rel)
+                continue
+
+            if mtime == self.stored_mtime(rel):
+                children = self.child_dirs(rel)
+            else:
+                children = [e.name for e in self.refresh_dir(path) if e.is_dir and not e.is_link]
+                refreshed += 1
+
+            stack.extend(f"{rel}/{name}" if rel else name for name in children)
+        return checked, refreshed
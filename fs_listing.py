@@ -0,0 +1,171 @@
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+from fs_index import RACY_MTIME_NS
+
+# Сколько записей отдавать за одну порцию
+LISTING_CHUNK_SIZE = 1000
+# Предел памяти кэша содержимого папок, байт (оценка)
+LISTING_CACHE_BYTES = 32 * 1024 * 1024
+# Оценка накладных расходов на запись кэша сверх строки имени
+ENTRY_OVERHEAD_BYTES = 100
+
+
+def iter_dir_chunks(path, chunk_size=LISTING_CHUNK_SIZE, is_cancelled=None, keep_other=False):
+    """Читает папку через os.scandir и отдаёт записи порциями [(имя, это_папка), ...]
+
+    Тип записи берётся из DirEntry (d_type), поэтому лишних stat-вызовов нет.
+    Записи, которые не являются ни папкой, ни файлом (сокеты, битые ссылки),
+    пропускаются, а с keep_other=True отдаются как (имя, None).
+    """
+    chunk = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if is_cancelled is not None and is_cancelled():
+                return
+
+            try:
+                if entry.is_dir():
+                    chunk.append((entry.name, True))
+                elif entry.is_file():
+                    chunk.append((entry.name, False))
+                elif keep_other:
+                    chunk.append((entry.name, None))
+            except OSError:
+                continue
+
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def iter_index_chunks(entries, chunk_size=LISTING_CHUNK_SIZE, is_cancelled=None):
+    """Те же порции [(имя, это_папка), ...], но из записей индекса метаданных"""
+    for start in range(0, len(entries), chunk_size):
+        if is_cancelled is not None and is_cancelled():
+            return
+        yield [(e.name, e.is_dir) for e in entries[start:start + chunk_size]]
+
+
+def list_chunks(entries, chunk_size=LISTING_CHUNK_SIZE, is_cancelled=None):
+    """Порции [(имя, это_папка), ...] из содержимого, сохранённого в ListingCache"""
+    items = [(name, is_dir) for name, is_dir in entries.items() if is_dir is not None]
+    for start in range(0, len(items), chunk_size):
+        if is_cancelled is not None and is_cancelled():
+            return
+        yield items[start:start + chunk_size]
+
+
+class ListingCache:
+    """Ограниченный LRU-кэш содержимого папок {имя: это_папка}
+
+    Хранятся все имена, включая записи, которые не являются ни папкой, ни файлом
+    (значение None): по кэшу проверяются конфликты имён при переименовании.
+
+    Запись действительна, пока у папки те же устройство, inode и mtime, поэтому
+    проверка стоит один stat. Папки, изменённые незадолго до чтения, не
+    кэшируются: следующее изменение в том же кванте mtime было бы незаметно.
+    Размер оценивается по длине имён; при превышении max_bytes вытесняются
+    давно не использованные папки.
+    """
+
+    def __init__(self, max_bytes=LISTING_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()  # путь -> (ключ stat, {имя: это_папка}, оценка размера)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def stat_key(path):
+        st = os.stat(path)
+        return st.st_dev, st.st_ino, st.st_mtime_ns
+
+    def get(self, path, key=None):
+        """Содержимое из кэша или None; key — заранее полученный stat_key(path)"""
+        path = os.path.abspath(path)
+        if key is None:
+            try:
+                key = self.stat_key(path)
+            except OSError:
+                self.discard(path)
+                return None
+
+        with self.lock:
+            item = self.items.get(path)
+            if item is not None and item[0] == key:
+                self.items.move_to_end(path)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+            return None
+
+    def put(self, path, key, entries, scan_started):
+        """Сохраняет содержимое, прочитанное после stat_key(path) == key"""
+        path = os.path.abspath(path)
+        if scan_started - key[2] < RACY_MTIME_NS:
+            self.discard(path)
+            return
+
+        cost = sum(sys.getsizeof(name) + ENTRY_OVERHEAD_BYTES for name in entries)
+        with self.lock:
+            old = self.items.pop(path, None)
+            if old is not None:
+                self.size -= old[2]
+            if cost > self.max_bytes:
+                return
+            self.items[path] = (key, entries, cost)
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self.items.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def discard(self, path):
+        with self.lock:
+            old = self.items.pop(os.path.abspath(path), None)
+            if old is not None:
+                self.size -= old[2]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+    def read(self, path):
+        """Содержимое папки из кэша или с диска (OSError пробрасывается)"""
+        key = self.stat_key(path)
+        entries = self.get(path, key)
+        if entries is not None:
+            return entries
+
+        scan_started = time.time_ns()
+        entries = {}
+        for chunk in iter_dir_chunks(path, keep_other=True):
+            entries.update(chunk)
+        self.put(path, key, entries, scan_started)
+        return entries
+
+    def listdir(self, path):
+        """Замена os.listdir для проверок перед переименованием"""
+        return list(self.read(path))
+
+    def is_dir(self, parent, name):
+        """Есть ли в parent подпапка name"""
+        try:
+            return self.read(parent).get(name) is True
+        except OSError:
+            return False
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self.items), "bytes": self.size, "max_bytes": self.max_bytes}
@@ -0,0 +1,280 @@
+"""Замеры горячих путей: время операций и число вызовов файловой системы
+
+Счётчик вызовов подменяет функции os на обёртки, только пока он кому-то
+нужен: при записи замеров в файл (--metrics) или пока открыто окно
+диагностики. Вызовы считаются в потоке, который их сделал, без общих
+блокировок; замер видит только вызовы потоков, к которым он подключён.
+"""
+import os
+import json
+import time
+import weakref
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Считаемые функции os
+COUNTED_CALLS = ("stat", "lstat", "scandir", "listdir", "rename")
+# Сколько последних замеров хранить в памяти
+RECENT_RECORDS = 500
+# Размер файла замеров, после которого он сдвигается в <файл>.1, байт
+METRICS_MAX_BYTES = 5 * 1024 * 1024
+
+
+class _ThreadState:
+    """Счётчики одного потока и подключённые к нему замеры"""
+    __slots__ = ("counts", "spans", "__weakref__")
+
+    def __init__(self, names):
+        self.counts = dict.fromkeys(names, 0)
+        self.spans = []  # Счётчики замеров, подключённых к потоку
+
+
+class CallCounter:
+    """Подменяет функции os на обёртки со счётчиком вызовов
+
+    Обёртка увеличивает счётчики своего потока; общий итог (snapshot) —
+    сумма по всем потокам, включая завершившиеся.
+    """
+
+    def __init__(self, names=COUNTED_CALLS):
+        self.names = names
+        self.local = threading.local()
+        self.lock = threading.Lock()  # Регистрация потоков и включение
+        self.states = weakref.WeakSet()
+        self.retired = dict.fromkeys(names, 0)  # Вызовы завершившихся потоков
+        self.originals = {}
+        self.users = 0
+
+    @property
+    def installed(self):
+        return bool(self.originals)
+
+    def install(self):
+        if self.installed:
+            return
+        for name in self.names:
+            original = getattr(os, name)
+            self.originals[name] = original
+            setattr(os, name, self.wrap(name, original))
+
+    def uninstall(self):
+        for name, original in self.originals.items():
+            setattr(os, name, original)
+        self.originals = {}
+
+    def acquire(self):
+        """Включает счётчик для ещё одного пользователя"""
+        with self.lock:
+            self.users += 1
+            self.install()
+
+    def release(self):
+        with self.lock:
+            self.users -= 1
+            if self.users <= 0:
+                self.users = 0
+                self.uninstall()
+
+    def _state(self):
+        state = getattr(self.local, "state", None)
+        if state is None:
+            state = self.local.state = _ThreadState(self.names)
+            with self.lock:
+                self.states.add(state)
+            # Счётчики потока переходят в общий итог, когда поток завершится
+            weakref.finalize(state, self._retire, state.counts)
+        return state
+
+    def _retire(self, counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.retired[name] += value
+
+    def wrap(self, name, original):
+        def counted(*args, **kwargs):
+            state = getattr(self.local, "state", None) or self._state()
+            state.counts[name] += 1
+            for counts in state.spans:
+                counts[name] += 1
+            return original(*args, **kwargs)
+        return counted
+
+    def attach(self, span):
+        """Подключает замер к текущему потоку; возвращает ключ для detach"""
+        state = self._state()
+        counts = dict.fromkeys(self.names, 0)
+        span.parts.append(counts)
+        state.spans.append(counts)
+        return state, counts
+
+    @staticmethod
+    def detach(token):
+        state, counts = token
+        try:
+            state.spans.remove(counts)
+        except ValueError:
+            pass
+
+    def snapshot(self):
+        """Вызовы всех потоков с начала работы"""
+        with self.lock:
+            totals = dict(self.retired)
+            for state in list(self.states):
+                for name, value in state.counts.items():
+                    totals[name] += value
+        return totals
+
+
+def tracking(span):
+    """span.track() или пустой блок, если замера нет"""
+    return span.track() if span is not None else nullcontext()
+
+
+# Один счётчик на процесс: обёртки нельзя ставить поверх друг друга
+call_counter = CallCounter()
+
+
+class Span:
+    """Незавершённый замер
+
+    Считаются вызовы потоков, к которым замер подключён: measure подключает
+    свой поток, фоновая работа подключается через track().
+    """
+    __slots__ = ("name", "started", "wall_started", "counter", "parts", "tokens")
+
+    def __init__(self, name, counter):
+        self.name = name
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.counter = counter
+        self.parts = []  # Счётчики каждого подключения
+        self.tokens = []
+
+    @contextmanager
+    def track(self):
+        """Считает вызовы текущего потока внутри блока"""
+        token = self.counter.attach(self)
+        try:
+            yield self
+        finally:
+            self.counter.detach(token)
+
+    def calls(self):
+        totals = dict.fromkeys(self.counter.names, 0)
+        for counts in self.parts:
+            for name, value in counts.items():
+                totals[name] += value
+        return totals
+
+
+class OperationStats:
+    """Сводка по одной операции"""
+    __slots__ = ("count", "total_s", "max_s", "last_s", "calls")
+
+    def __init__(self):
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.last_s = 0.0
+        self.calls = dict.fromkeys(COUNTED_CALLS, 0)
+
+    def add(self, wall_s, calls):
+        self.count += 1
+        self.total_s += wall_s
+        self.max_s = max(self.max_s, wall_s)
+        self.last_s = wall_s
+        for name, value in calls.items():
+            self.calls[name] = self.calls.get(name, 0) + value
+
+
+class Metrics:
+    """Время операций и вызовы файловой системы; по желанию — запись в файл JSON lines
+
+    Замер синхронной операции — measure(имя); операции, которая заканчивается
+    в фоне, — start(имя) и finish(замер) по её завершению.
+    """
+
+    def __init__(self, path=None, counter=call_counter):
+        self.counter = counter
+        self.counting = 0
+        self.path = path
+        self.file = None
+        self.stats = {}
+        self.recent = deque(maxlen=RECENT_RECORDS)
+        self.lock = threading.Lock()
+
+        if path is not None:
+            self.begin_counting()
+
+    def begin_counting(self):
+        """Включает счёт вызовов (запись в файл, открытое окно диагностики)"""
+        self.counting += 1
+        self.counter.acquire()
+
+    def end_counting(self):
+        if self.counting:
+            self.counting -= 1
+            self.counter.release()
+
+    def start(self, name):
+        """Замер операции, которая закончится позже; фоновая работа подключается span.track()"""
+        return Span(name, self.counter)
+
+    def finish(self, span, **extra):
+        wall_s = time.perf_counter() - span.started
+        for token in span.tokens:
+            self.counter.detach(token)
+        span.tokens = []
+        calls = span.calls()
+        record = {
+            "op": span.name,
+            "ts": round(span.wall_started, 3),
+            "wall_s": round(wall_s, 6),
+            "calls": {name: value for name, value in calls.items() if value},
+        }
+        record.update(extra)
+
+        with self.lock:
+            stats = self.stats.get(span.name)
+            if stats is None:
+                stats = self.stats[span.name] = OperationStats()
+            stats.add(wall_s, calls)
+            self.recent.append(record)
+            if self.path is not None:
+                self.write(record)
+        return record
+
+    @contextmanager
+    def measure(self, name, **extra):
+        """Замер синхронной операции: считаются вызовы текущего потока"""
+        span = self.start(name)
+        span.tokens.append(self.counter.attach(span))
+        try:
+            yield span
+        finally:
+            self.finish(span, **extra)
+
+    def write(self, record):
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        if self.file.tell() > METRICS_MAX_BYTES:
+            # Старые замеры сдвигаются в один запасной файл
+            self.file.close()
+            self.file = None
+            os.replace(self.path, self.path + ".1")
+
+    def summary(self):
+        """[(операция, OperationStats)] по убыванию общего времени"""
+        with self.lock:
+            return sorted(self.stats.items(), key=lambda item: item[1].total_s, reverse=True)
+
+    def close(self):
+        while self.counting:
+            self.end_counting()
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
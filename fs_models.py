@@ -0,0 +1,749 @@
+import os
+import bisect
+import functools
+import itertools
+from array import array
+from collections import OrderedDict
+
+from PySide6.QtCore import (Qt, QAbstractItemModel, QAbstractListModel, QAbstractTableModel,
+                            QModelIndex, Signal)
+from PySide6.QtWidgets import QFileIconProvider
+
+from fs_rename_rules import STATUS_OK, STATUS_CHAINED, STATUS_UNCHANGED, STATUS_SKIPPED
+
+# Сколько строк папки добавлять в дерево за раз
+TREE_PAGE_SIZE = 1000
+# Сколько узлов дерева держать загруженными; сверх этого выгружаются свёрнутые поддеревья
+TREE_MAX_NODES = 50_000
+# При большем числе изменений папка дерева перестраивается целиком, а не построчно
+TREE_PATCH_MAX_CHANGES = 100
+# Сколько подпапок раскрытой папки читать заранее
+TREE_PREFETCH_DIRS = 8
+
+
+def _name_key(name, is_dir):
+    return name.casefold()
+
+
+def _ext_key(name, is_dir):
+    return ("" if is_dir else os.path.splitext(name)[1].casefold(), name.casefold())
+
+
+def _type_key(name, is_dir):
+    return (not is_dir, name.casefold())
+
+
+class DirEntryModel(QAbstractTableModel):
+    """Содержимое текущей папки для правой панели
+
+    Записи хранятся в двух плоских массивах (имена и признак папки); текст ячеек
+    формируется в data() только для строк, которые представление рисует.
+    Без сортировки порядок как в прежней панели: папки, затем файлы, в порядке чтения.
+    """
+    COLUMNS = ("Имя", "Расширение", "Тип")
+    SORT_KEYS = (_name_key, _ext_key, _type_key)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.names = []
+        self.kinds = array("B")  # 1 — папка, 0 — файл
+        self.dir_count = 0
+        self.sort_column = -1  # -1 — исходный порядок
+        self.sort_order = Qt.AscendingOrder
+        self.sort_pending = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+
+        name = self.names[index.row()]
+        is_dir = self.kinds[index.row()]
+        column = index.column()
+        if column == 0:
+            return f"📂 {name}" if is_dir else f"📄 {name}"
+        if column == 1:
+            return "" if is_dir else (os.path.splitext(name)[1] or "(без расширения)")
+        return "Папка" if is_dir else "Файл"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def entry(self, row):
+        """(имя, это_папка) для строки row"""
+        return self.names[row], bool(self.kinds[row])
+
+    def entry_map(self):
+        """Словарь имя -> это_папка для сравнения с новым состоянием папки"""
+        return {name: bool(kind) for name, kind in zip(self.names, self.kinds)}
+
+    def clear(self):
+        self.beginResetModel()
+        self.names = []
+        self.kinds = array("B")
+        self.dir_count = 0
+        self.sort_pending = False
+        self.endResetModel()
+
+    def append_entries(self, entries):
+        """Добавляет порцию [(имя, это_папка)]: папки в конец раздела папок, файлы в конец"""
+        dirs = [name for name, is_dir in entries if is_dir]
+        files = [name for name, is_dir in entries if not is_dir]
+
+        if dirs:
+            row = self.dir_count
+            self.beginInsertRows(QModelIndex(), row, row + len(dirs) - 1)
+            self.names[row:row] = dirs
+            self.kinds[row:row] = array("B", [1]) * len(dirs)
+            self.dir_count += len(dirs)
+            self.endInsertRows()
+
+        if files:
+            row = len(self.names)
+            self.beginInsertRows(QModelIndex(), row, row + len(files) - 1)
+            self.names.extend(files)
+            self.kinds.extend(array("B", [0]) * len(files))
+            self.endInsertRows()
+
+        if self.sort_column >= 0:
+            self.sort_pending = True  # Отсортируем один раз, когда чтение закончится
+
+    def finish_loading(self):
+        if self.sort_pending:
+            self.sort(self.sort_column, self.sort_order)
+
+    def insert_entries(self, entries):
+        """Добавляет немного записей, сохраняя текущую сортировку"""
+        if self.sort_column < 0:
+            self.append_entries(entries)
+            return
+
+        key = self.SORT_KEYS[self.sort_column]
+        reverse = self.sort_order == Qt.DescendingOrder
+        for name, is_dir in entries:
+            target = key(name, is_dir)
+            low, high = 0, len(self.names)
+            while low < high:
+                mid = (low + high) // 2
+                mid_key = key(self.names[mid], self.kinds[mid])
+                if (mid_key > target) if reverse else (mid_key < target):
+                    low = mid + 1
+                else:
+                    high = mid
+            self.beginInsertRows(QModelIndex(), low, low)
+            self.names.insert(low, name)
+            self.kinds.insert(low, int(is_dir))
+            if is_dir:
+                self.dir_count += 1
+            self.endInsertRows()
+
+    def remove_names(self, names):
+        """Удаляет записи с именами из names"""
+        names = set(names)
+        rows = [row for row, name in enumerate(self.names) if name in names]
+        for row in reversed(rows):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.names[row]
+            if self.kinds.pop(row):
+                self.dir_count -= 1
+            self.endRemoveRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.sort_pending = False
+        if column < 0 or not self.names:
+            return
+
+        key = self.SORT_KEYS[column]
+        names = self.names
+        kinds = self.kinds
+        rows = sorted(range(len(names)), key=lambda row: key(names[row], kinds[row]),
+                      reverse=order == Qt.DescendingOrder)
+
+        self.layoutAboutToBeChanged.emit()
+        self.names = [names[row] for row in rows]
+        self.kinds = array("B", (kinds[row] for row in rows))
+
+        # Выделение в представлении держится на постоянных индексах — переносим их
+        new_rows = [0] * len(rows)
+        for new, old in enumerate(rows):
+            new_rows[old] = new
+        old_indexes = self.persistentIndexList()
+        self.changePersistentIndexList(
+            old_indexes, [self.index(new_rows[i.row()], i.column()) for i in old_indexes])
+        self.layoutChanged.emit()
+
+
+class RenamePreviewModel(QAbstractTableModel):
+    """Предпросмотр переименования по правилу: строки берутся из RulePreview по запросу"""
+    COLUMNS = ("Было", "Станет", "")
+    STATUS_TEXT = {
+        STATUS_OK: "",
+        STATUS_CHAINED: "через временное имя",
+        STATUS_UNCHANGED: "без изменений",
+        STATUS_SKIPPED: "⚠️ пропущен",
+    }
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.preview = None
+
+    def set_preview(self, preview):
+        self.beginResetModel()
+        self.preview = preview
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.preview is None:
+            return 0
+        return len(self.preview)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+
+        row = index.row()
+        column = index.column()
+        if column == 0:
+            return self.preview.old_names[row]
+        if column == 1:
+            return self.preview.new_names[row]
+        return self.STATUS_TEXT[self.preview.statuses[row]]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+
+def _changes_rows(method):
+    """Метод DirTreeModel, меняющий строки: пока он не закончил, fetchMore не выполняется
+
+    Представление (и тестер модели) может вызвать fetchMore из обработчика
+    rowsAboutToBeInserted и подобных сигналов; вложенная вставка добавила бы
+    ту же порцию дважды или начала бы изменение посреди другого.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        changing, self.changing = self.changing, True
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.changing = changing
+    return wrapper
+
+
+class _TreeNode:
+    __slots__ = ("id", "name", "parent", "row", "is_dir", "entries", "children", "loading")
+
+    def __init__(self, id, name, parent, row, is_dir):
+        self.id = id
+        self.name = name
+        self.parent = parent
+        self.row = row
+        self.is_dir = is_dir
+        self.entries = None  # Всё содержимое папки [(имя, это_папка)] в порядке показа
+        self.children = None  # Узлы первых len(children) записей; None — папка не читалась
+        self.loading = False
+
+    @property
+    def path(self):
+        names = []
+        node = self
+        while node is not None:
+            names.append(node.name)
+            node = node.parent
+        return os.path.join(*reversed(names))
+
+
+class DirTreeModel(QAbstractItemModel):
+    """Дерево папок для левой панели с подгрузкой по мере раскрытия
+
+    Папка читается в общем пуле обхода через ListingCache при первом раскрытии,
+    строки добавляются порциями через canFetchMore/fetchMore. После чтения
+    папки её первые подпапки читаются заранее в тот же кэш. Свёрнутые
+    поддеревья выгружаются, когда загруженных узлов больше max_nodes:
+    сначала свёрнутые давно. Индексы хранят id узла, а не сам узел, поэтому
+    устаревший индекс после выгрузки просто становится недействительным.
+    """
+    # Поколение, id узла, содержимое {имя: это_папка} или None при ошибке чтения
+    listing_ready = Signal(int, int, object)
+
+    def __init__(self, listings, pool, max_nodes=TREE_MAX_NODES, parent=None):
+        super().__init__(parent)
+        self.listings = listings
+        self.pool = pool
+        self.max_nodes = max_nodes
+        self.generation = 0
+        self.ids = itertools.count(1)
+        self.nodes = {}
+        self.root = None
+        self.loaded = 0  # Узлов в прочитанных папках
+        self.collapsed = OrderedDict()  # id свёрнутых прочитанных папок, давно свёрнутые первыми
+        self.pinned_path = None  # Папка, показанная в панели: её и предков не выгружаем
+        self.evicted = 0
+        self.changing = False  # Идёт изменение строк (см. _changes_rows)
+        provider = QFileIconProvider()
+        self.dir_icon = provider.icon(QFileIconProvider.Folder)
+        self.file_icon = provider.icon(QFileIconProvider.File)
+        self.listing_ready.connect(self.on_listing_ready)
+
+    @property
+    def root_path(self):
+        return self.root.name if self.root is not None else None
+
+    def set_root(self, path):
+        """Сбрасывает дерево на корень path; ответы на прежние чтения отбрасываются"""
+        self.beginResetModel()
+        self.generation += 1
+        self.nodes = {}
+        self.root = self._new_node(os.path.abspath(path), None, 0, True)
+        self.loaded = 0
+        self.collapsed.clear()
+        self.pinned_path = None
+        self.endResetModel()
+
+    def _new_node(self, name, parent, row, is_dir):
+        node = _TreeNode(next(self.ids), name, parent, row, is_dir)
+        self.nodes[node.id] = node
+        return node
+
+    def node(self, index):
+        if not index.isValid():
+            return self.root
+        return self.nodes.get(index.internalId())
+
+    def node_index(self, node):
+        if node is None or node is self.root:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node.id)
+
+    def isDir(self, index):
+        node = self.node(index)
+        return node is not None and node.is_dir
+
+    def filePath(self, index):
+        node = self.node(index)
+        return node.path if node is not None else ""
+
+    # --- QAbstractItemModel ---
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if (node is None or node.children is None or column != 0
+                or not 0 <= row < len(node.children)):
+            return QModelIndex()
+        return self.createIndex(row, 0, node.children[row].id)
+
+    def parent(self, index):
+        node = self.node(index)
+        if node is None or node.parent is None:
+            return QModelIndex()
+        return self.node_index(node.parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        node = self.node(parent)
+        if node is None or node.children is None:
+            return 0
+        return len(node.children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        if node is None or not node.is_dir:
+            return False
+        # Непрочитанную папку считаем непустой: стрелка пропадёт после чтения
+        return node.entries is None or bool(node.entries)
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        if self.changing or node is None or not node.is_dir or node.loading:
+            return False
+        return node.children is None or len(node.children) < len(node.entries)
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if self.changing or node is None or not node.is_dir or node.loading:
+            return
+        if node.children is None:
+            self._request(node)
+        else:
+            self._append_page(node)
+
+    def data(self, index, role=Qt.DisplayRole):
+        node = self.node(index) if index.isValid() else None
+        if node is None:
+            return None
+        if role == Qt.DisplayRole:
+            return node.name
+        if role == Qt.DecorationRole:
+            return self.dir_icon if node.is_dir else self.file_icon
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal and section == 0:
+            return "Имя"
+        return None
+
+    # --- Чтение папок ---
+
+    def _request(self, node):
+        node.loading = True
+        self.pool.submit(self._read_task, self.generation, node.id, node.path)
+
+    def _read_task(self, generation, node_id, path):
+        # Поток пула: сигнал доставляется в поток модели через очередь событий
+        try:
+            entries = self.listings.read(path)
+        except OSError:
+            entries = None
+        self.listing_ready.emit(generation, node_id, entries)
+
+    def on_listing_ready(self, generation, node_id, entries):
+        if generation != self.generation:
+            return
+        node = self.nodes.get(node_id)
+        if node is None or not node.loading:
+            return  # Узел выгружен или прочитан раньше через path_index
+        node.loading = False
+        self._set_entries(node, entries or {})
+        self.prefetch(node)
+
+    def _read_now(self, node):
+        node.loading = False
+        try:
+            entries = self.listings.read(node.path)
+        except OSError:
+            entries = {}
+        self._set_entries(node, entries)
+
+    @_changes_rows
+    def _set_entries(self, node, entries):
+        node.entries = sorted(((name, is_dir) for name, is_dir in entries.items()
+                               if is_dir is not None), key=lambda e: _type_key(*e))
+        node.children = []
+        if node.entries:
+            self._append_page(node)
+        else:
+            # Стрелка у пустой папки больше не нужна
+            index = self.node_index(node)
+            if index.isValid():
+                self.dataChanged.emit(index, index)
+
+    @_changes_rows
+    def _append_page(self, node, upto=0):
+        """Добавляет следующую порцию строк (и не меньше, чем до записи upto)"""
+        start = len(node.children)
+        end = min(len(node.entries), max(start + TREE_PAGE_SIZE, upto + 1))
+        if end <= start:
+            return
+        self.beginInsertRows(self.node_index(node), start, end - 1)
+        for row in range(start, end):
+            name, is_dir = node.entries[row]
+            node.children.append(self._new_node(name, node, row, is_dir))
+        self.loaded += end - start
+        self.endInsertRows()
+
+    def prefetch(self, node):
+        """Читает в кэш первые подпапки node: их, скорее всего, раскроют следующими"""
+        if not node.children:
+            return
+        paths = [child.path for child in node.children[:TREE_PREFETCH_DIRS * 4]
+                 if child.is_dir and child.children is None][:TREE_PREFETCH_DIRS]
+        for path in paths:
+            self.pool.submit(self._prefetch_task, path)
+
+    def _prefetch_task(self, path):
+        try:
+            self.listings.read(path)
+        except OSError:
+            pass
+
+    def find_node(self, path, load=False):
+        """Узел пути path; с load=True недостающие папки читаются сразу"""
+        path = os.path.abspath(path)
+        if self.root is None:
+            return None
+        relative = os.path.relpath(path, self.root.name)
+        if relative == os.curdir:
+            return self.root
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return None
+
+        node = self.root
+        for name in relative.split(os.sep):
+            if node.children is None:
+                if not load:
+                    return None
+                self._read_now(node)
+            row = next((row for row, entry in enumerate(node.entries) if entry[0] == name), None)
+            if row is None:
+                return None
+            if row >= len(node.children):
+                if not load:
+                    return None
+                self._append_page(node, row)
+            node = node.children[row]
+        return node
+
+    def path_index(self, path):
+        """Индекс пути path (для setRootIndex); корень дерева — пустой индекс"""
+        return self.node_index(self.find_node(path, load=True))
+
+    # --- Обновление ---
+
+    @_changes_rows
+    def refresh_dir(self, path):
+        """Сверяет прочитанную папку с диском: добавляет и удаляет только изменившиеся строки"""
+        node = self.find_node(path)
+        if node is None or node.children is None:
+            return False
+        try:
+            current = {name: is_dir for name, is_dir in self.listings.read(node.path).items()
+                       if is_dir is not None}
+        except OSError:
+            current = {}
+        old = dict(node.entries)
+        removed = [name for name, is_dir in old.items() if current.get(name) != is_dir]
+        added = [(name, is_dir) for name, is_dir in current.items() if old.get(name) != is_dir]
+        if not removed and not added:
+            return False
+
+        if len(removed) + len(added) > TREE_PATCH_MAX_CHANGES:
+            self._relayout(node, current)
+            return True
+
+        parent = self.node_index(node)
+        removed = set(removed)
+        for row in range(len(node.entries) - 1, -1, -1):
+            if node.entries[row][0] not in removed:
+                continue
+            del node.entries[row]
+            if row < len(node.children):
+                self.beginRemoveRows(parent, row, row)
+                self._drop(node.children.pop(row))
+                self._renumber(node, row)
+                self.endRemoveRows()
+
+        keys = [_type_key(*entry) for entry in node.entries]
+        for entry in sorted(added, key=lambda e: _type_key(*e)):
+            key = _type_key(*entry)
+            row = bisect.bisect_left(keys, key)
+            fully_loaded = len(node.children) == len(node.entries)
+            keys.insert(row, key)
+            node.entries.insert(row, entry)
+            # За последней загруженной строкой запись появится со следующей порцией
+            if row < len(node.children) or (fully_loaded and row == len(node.children)):
+                self.beginInsertRows(parent, row, row)
+                node.children.insert(row, self._new_node(entry[0], node, row, entry[1]))
+                self.loaded += 1
+                self._renumber(node, row + 1)
+                self.endInsertRows()
+        return True
+
+    def refresh_all(self):
+        """Сверяет с диском все прочитанные папки"""
+        paths = [node.path for node in list(self.nodes.values()) if node.children is not None]
+        for path in paths:
+            self.refresh_dir(path)
+
+    @_changes_rows
+    def _relayout(self, node, current):
+        """Перестраивает строки папки за один проход при множестве изменений
+
+        Оставшиеся записи сохраняют свои узлы (и раскрытые поддеревья), выделение
+        переносится через постоянные индексы.
+        """
+        fully_loaded = len(node.children) == len(node.entries)
+        loaded_count = len(node.children)
+        old_children = {child.name: child for child in node.children}
+
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        node.entries = sorted(current.items(), key=lambda e: _type_key(*e))
+        if fully_loaded:
+            loaded_count = len(node.entries)
+        children = []
+        for row, (name, is_dir) in enumerate(node.entries[:loaded_count]):
+            child = old_children.pop(name, None)
+            if child is None or child.is_dir != is_dir:
+                if child is not None:
+                    self._drop(child)
+                child = self._new_node(name, node, row, is_dir)
+                self.loaded += 1
+            child.row = row
+            children.append(child)
+        node.children = children
+        for child in old_children.values():
+            self._drop(child)
+        self.changePersistentIndexList(
+            old_indexes, [self.node_index(self.nodes.get(index.internalId()))
+                          if index.isValid() and index.internalId() in self.nodes
+                          else QModelIndex() for index in old_indexes])
+        self.layoutChanged.emit()
+
+    @staticmethod
+    def _renumber(node, start):
+        for row in range(start, len(node.children)):
+            node.children[row].row = row
+
+    def _drop(self, node):
+        """Забывает узел и его поддерево; возвращает число узлов"""
+        stack = [node]
+        count = 0
+        while stack:
+            node = stack.pop()
+            self.nodes.pop(node.id, None)
+            self.collapsed.pop(node.id, None)
+            count += 1
+            if node.children:
+                stack.extend(node.children)
+        self.loaded -= count
+        return count
+
+    # --- Выгрузка свёрнутых поддеревьев ---
+
+    def on_expanded(self, index):
+        node = self.node(index)
+        if node is None:
+            return
+        self.collapsed.pop(node.id, None)
+        self.prefetch(node)
+
+    def on_collapsed(self, index):
+        node = self.node(index)
+        if node is None or not node.children:
+            return
+        self.collapsed[node.id] = None
+        self.collapsed.move_to_end(node.id)
+        self.evict()
+
+    def pin(self, path):
+        """Отмечает папку, показанную в панели; соседние поддеревья на пути к ней
+        не видны и становятся кандидатами на выгрузку"""
+        self.pinned_path = os.path.abspath(path)
+        node = self.find_node(path)
+        while node is not None and node.parent is not None:
+            for sibling in node.parent.children:
+                if sibling is not node and sibling.children:
+                    self.collapsed.setdefault(sibling.id, None)
+            node = node.parent
+        self.evict()
+
+    def evict(self):
+        """Выгружает давно свёрнутые поддеревья, пока загружено больше max_nodes"""
+        skipped = []
+        while self.loaded > self.max_nodes and self.collapsed:
+            node_id, _ = self.collapsed.popitem(last=False)
+            node = self.nodes.get(node_id)
+            if node is None or not node.children:
+                continue
+            if self.pinned_path is not None and self._contains(node, self.pinned_path):
+                skipped.append(node_id)
+                continue
+            self.unload(node)
+        for node_id in skipped:
+            self.collapsed[node_id] = None
+
+    def _contains(self, node, path):
+        node_path = node.path
+        return path == node_path or path.startswith(node_path.rstrip(os.sep) + os.sep)
+
+    @_changes_rows
+    def unload(self, node):
+        """Выгружает содержимое папки; при следующем раскрытии она прочитается заново"""
+        if node.children:
+            self.beginRemoveRows(self.node_index(node), 0, len(node.children) - 1)
+            children = node.children
+            node.children = []
+            for child in children:
+                self.evicted += self._drop(child)
+            self.endRemoveRows()
+        node.children = None
+        node.entries = None
+        node.loading = False
+
+    def stats(self):
+        return {"nodes": self.loaded, "max_nodes": self.max_nodes,
+                "collapsed": len(self.collapsed), "evicted": self.evicted}
+
+
+class FilePreviewModel(QAbstractListModel):
+    """Окно строк просмотра файла: текст или дамп берётся из PreviewFile только для них
+
+    Модель отдаёт не весь файл, а page строк, начиная со строки first: в
+    многогигабайтном файле строк больше, чем помещается в int представления.
+    Прокрутку по всему файлу ведёт панель своей полосой прокрутки.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.preview = None
+        self.hex_mode = False
+        self.first = 0
+        self.page = 0
+        self.rows = 0
+
+    def total(self):
+        """Строк во всём файле (в текстовом режиме — найденных на данный момент)"""
+        if self.preview is None:
+            return 0
+        return self.preview.hex_rows if self.hex_mode else self.preview.line_count
+
+    def set_preview(self, preview, hex_mode):
+        self.beginResetModel()
+        self.preview = preview
+        self.hex_mode = hex_mode
+        self.first = 0
+        self.rows = min(self.page, self.total())
+        self.endResetModel()
+
+    def set_hex_mode(self, hex_mode):
+        if hex_mode != self.hex_mode:
+            self.set_preview(self.preview, hex_mode)
+
+    def max_first(self):
+        return max(0, self.total() - self.page)
+
+    def set_window(self, first, page):
+        """Показывает page строк с first (first ограничивается концом файла)"""
+        self.page = page
+        first = max(0, min(first, self.max_first()))
+        rows = min(page, self.total() - first)
+        if rows != self.rows:
+            self.beginResetModel()
+            self.first = first
+            self.rows = rows
+            self.endResetModel()
+        elif first != self.first or rows:
+            self.first = first
+            if rows:
+                self.dataChanged.emit(self.index(0), self.index(rows - 1))
+
+    def lines_added(self):
+        """Дополняет неполное окно строками, найденными индексом"""
+        if self.rows < self.page:
+            self.set_window(self.first, self.page)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid() or self.preview is None:
+            return None
+        row = self.first + index.row()
+        text = self.preview.hex_row(row) if self.hex_mode else self.preview.line(row)
+        return "" if text is None else text
@@ -0,0 +1,385 @@
+"""Очередь файловых операций: копирование, перемещение и удаление в фоне
+
+Операции выполняет пул потоков. Файлы копируются без участия Python-буферов
+(os.copy_file_range, затем os.sendfile, при неудаче — чтение и запись порциями),
+перемещение внутри одного устройства — один os.rename. У каждой операции есть
+ход выполнения, пауза и отмена; общая скорость ввода-вывода ограничивается.
+"""
+import os
+import time
+import errno
+import shutil
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Число одновременно выполняемых операций
+OPERATION_WORKERS = 2
+# Размер порции копирования, байт: между порциями проверяются пауза, отмена и лимит
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# Как часто сообщать о ходе операции, с
+PROGRESS_INTERVAL = 0.1
+# Самый долгий сон ограничителя скорости без проверки паузы и отмены, с
+THROTTLE_SLICE = 0.1
+
+# Ошибки, после которых копирование переходит к следующему способу
+COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP,
+                        errno.EOPNOTSUPP, errno.ENOTSOCK}
+
+COPY = "copy"
+MOVE = "move"
+DELETE = "delete"
+OPERATION_TITLES = {COPY: "Копирование", MOVE: "Перемещение", DELETE: "Удаление"}
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+STATE_TITLES = {QUEUED: "в очереди", RUNNING: "выполняется", PAUSED: "пауза",
+                DONE: "готово", FAILED: "ошибка", CANCELLED: "отменено"}
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class Throttle:
+    """Общий лимит скорости ввода-вывода, байт/с (0 — без ограничения)"""
+
+    def __init__(self, bytes_per_second=0):
+        self.bytes_per_second = bytes_per_second
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def consume(self, size, checkpoint=None):
+        """Ждёт, пока size байт уложатся в лимит
+
+        Ожидание идёт отрезками по THROTTLE_SLICE, между ними вызывается
+        checkpoint — при низком лимите пауза и отмена не ждут всю порцию.
+        """
+        if self.bytes_per_second <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.next_time = max(self.next_time, now) + size / self.bytes_per_second
+            deadline = self.next_time
+        while True:
+            delay = deadline - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(min(delay, THROTTLE_SLICE))
+            if checkpoint is not None:
+                checkpoint()
+
+
+class FileOperation:
+    """Одна операция над списком путей; состояние читается из любого потока"""
+    _ids = itertools.count(1)
+
+    def __init__(self, kind, sources, destination=None):
+        self.id = next(self._ids)
+        self.kind = kind
+        self.sources = [os.path.abspath(path) for path in sources]
+        self.destination = os.path.abspath(destination) if destination else None
+        self.state = QUEUED
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.total_items = 0
+        self.done_items = 0
+        self.errors = []
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.cancel_requested = False
+        self.last_reported = 0.0
+
+    @property
+    def title(self):
+        names = ", ".join(os.path.basename(path) for path in self.sources[:3])
+        if len(self.sources) > 3:
+            names += f" и ещё {len(self.sources) - 3}"
+        text = f"{OPERATION_TITLES[self.kind]}: {names}"
+        if self.destination is not None:
+            text += f" → {os.path.basename(self.destination) or self.destination}"
+        return text
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def percent(self):
+        if self.total_bytes:
+            return int(self.done_bytes * 100 / self.total_bytes)
+        if self.total_items:
+            return int(self.done_items * 100 / self.total_items)
+        return 100 if self.state == DONE else 0
+
+    def pause(self):
+        if not self.finished:
+            self.resume_event.clear()
+            if self.state == RUNNING:
+                self.state = PAUSED
+
+    def resume(self):
+        if self.state == PAUSED:
+            self.state = RUNNING
+        self.resume_event.set()
+
+    def cancel(self):
+        self.cancel_requested = True
+        self.resume_event.set()
+
+    def checkpoint(self):
+        """Вызывается между порциями работы: ждёт снятия паузы, прерывает при отмене"""
+        if not self.resume_event.is_set():
+            self.resume_event.wait()
+        if self.cancel_requested:
+            raise OperationCancelled()
+
+
+def _plan_size(path):
+    """(байт, записей) в дереве path без перехода по символическим ссылкам"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return 0, 0
+    if not os.path.isdir(path) or os.path.islink(path):
+        return st.st_size, 1
+
+    size, items = 0, 1
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    items += 1
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            size += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return size, items
+
+
+class OperationQueue:
+    """Очередь операций на пуле потоков
+
+    on_update(операция) вызывается из рабочих потоков при смене состояния
+    и не чаще PROGRESS_INTERVAL при ходе выполнения.
+    """
+
+    def __init__(self, workers=OPERATION_WORKERS, on_update=None, bytes_per_second=0):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.on_update = on_update
+        self.throttle = Throttle(bytes_per_second)
+        self.operations = []
+        self.futures = {}
+
+    def submit(self, operation):
+        self.operations.append(operation)
+        self.futures[operation.id] = self.pool.submit(self.run, operation)
+        self.notify(operation, force=True)
+        return operation
+
+    def wait(self, operation):
+        self.futures[operation.id].result()
+
+    def set_limit(self, bytes_per_second):
+        self.throttle.bytes_per_second = bytes_per_second
+
+    def active(self):
+        return [op for op in self.operations if not op.finished]
+
+    def forget_finished(self):
+        self.operations = [op for op in self.operations if not op.finished]
+        self.futures = {op.id: self.futures[op.id] for op in self.operations}
+
+    def shutdown(self):
+        """Отменяет незавершённые операции и дожидается потоков"""
+        for operation in self.operations:
+            operation.cancel()
+        self.pool.shutdown(wait=True)
+
+    def notify(self, operation, force=False):
+        if self.on_update is None:
+            return
+        now = time.monotonic()
+        if force or now - operation.last_reported >= PROGRESS_INTERVAL:
+            operation.last_reported = now
+            self.on_update(operation)
+
+    def run(self, operation):
+        if operation.cancel_requested:
+            operation.state = CANCELLED
+            self.notify(operation, force=True)
+            return
+
+        operation.state = RUNNING if operation.resume_event.is_set() else PAUSED
+        self.notify(operation, force=True)
+        try:
+            plans = [_plan_size(path) for path in operation.sources]
+            for size, items in plans:
+                operation.total_bytes += size
+                operation.total_items += items
+
+            for path, plan in zip(operation.sources, plans):
+                operation.checkpoint()
+                if operation.kind == DELETE:
+                    self.delete_path(operation, path)
+                else:
+                    target = os.path.join(operation.destination, os.path.basename(path))
+                    if os.path.lexists(target):
+                        operation.errors.append(f"Уже существует: {os.path.basename(path)}")
+                        continue
+                    if operation.kind == COPY:
+                        self.copy_whole(operation, path, target)
+                    else:
+                        self.move_path(operation, path, target, plan)
+            operation.state = FAILED if operation.errors else DONE
+        except OperationCancelled:
+            operation.state = CANCELLED
+        except OSError as e:
+            operation.errors.append(str(e))
+            operation.state = FAILED
+        self.notify(operation, force=True)
+
+    def item_done(self, operation, size=0):
+        operation.done_items += 1
+        operation.done_bytes += size
+        self.notify(operation)
+
+    def copy_whole(self, operation, src, dst):
+        """Копирует дерево; недоделанная копия удаляется (до операции цели не было)"""
+        try:
+            self.copy_path(operation, src, dst)
+        except BaseException:
+            _remove_tree(dst)
+            raise
+
+    def copy_path(self, operation, src, dst):
+        if os.path.islink(src):
+            os.symlink(os.readlink(src), dst)
+            self.item_done(operation)
+            return
+        if not os.path.isdir(src):
+            self.copy_file(operation, src, dst)
+            return
+
+        os.mkdir(dst)
+        self.item_done(operation)
+        with os.scandir(src) as it:
+            entries = list(it)
+        for entry in entries:
+            operation.checkpoint()
+            self.copy_path(operation, entry.path, os.path.join(dst, entry.name))
+        shutil.copystat(src, dst)
+
+    def copy_file(self, operation, src, dst):
+        """Копирует файл порциями; недописанный файл при отмене или ошибке удаляется"""
+        try:
+            with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+                in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+                methods = list(_COPY_METHODS)
+                offset = 0
+                while True:
+                    operation.checkpoint()
+                    try:
+                        copied = methods[0](in_fd, out_fd, offset)
+                    except OSError as e:
+                        # Способ не подходит для этих файлов — пробуем следующий,
+                        # пока ничего не записано
+                        if offset or len(methods) == 1 or e.errno not in COPY_FALLBACK_ERRNOS:
+                            raise
+                        methods.pop(0)
+                        continue
+                    if not copied:
+                        break
+                    offset += copied
+                    operation.done_bytes += copied
+                    self.throttle.consume(copied, operation.checkpoint)
+                    self.notify(operation)
+            shutil.copystat(src, dst)
+        except BaseException:
+            try:
+                os.unlink(dst)
+            except OSError:
+                pass
+            raise
+        self.item_done(operation)
+
+    def move_path(self, operation, src, dst, plan=(0, 0)):
+        """Перемещает src; plan — (байт, записей) из _plan_size для хода операции"""
+        try:
+            same_device = os.lstat(src).st_dev == os.stat(os.path.dirname(dst)).st_dev
+        except OSError:
+            same_device = False
+        if same_device:
+            os.rename(src, dst)
+            size, items = plan
+            operation.done_items += items
+            operation.done_bytes += size
+            self.notify(operation)
+            return
+
+        # Между устройствами: копия, затем удаление исходника
+        self.copy_whole(operation, src, dst)
+        self.delete_path(operation, src, count=False)
+
+    def delete_path(self, operation, path, count=True):
+        size = 0
+        if os.path.isdir(path) and not os.path.islink(path):
+            with os.scandir(path) as it:
+                entries = list(it)
+            for entry in entries:
+                operation.checkpoint()
+                self.delete_path(operation, entry.path, count)
+            os.rmdir(path)
+        else:
+            size = os.lstat(path).st_size
+            os.unlink(path)
+        if count:
+            self.item_done(operation, size)
+
+
+def _remove_tree(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _copy_file_range(in_fd, out_fd, offset):
+    return os.copy_file_range(in_fd, out_fd, COPY_CHUNK_SIZE, offset, offset)
+
+
+def _sendfile(in_fd, out_fd, offset):
+    return os.sendfile(out_fd, in_fd, offset, COPY_CHUNK_SIZE)
+
+
+def _read_write(in_fd, out_fd, offset):
+    data = os.pread(in_fd, COPY_CHUNK_SIZE, offset)
+    # Запись может оказаться частичной (сетевые ФС, FUSE, почти полный диск)
+    view = memoryview(data)
+    while view:
+        written = os.write(out_fd, view)
+        if not written:
+            raise OSError(errno.EIO, "Запись в файл не продвинулась")
+        view = view[written:]
+    return len(data)
+
+
+# Способы копирования порции в порядке предпочтения: без копирования через
+# память процесса, затем обычное чтение и запись
+_COPY_METHODS = tuple(method for method, available in (
+    (_copy_file_range, hasattr(os, "copy_file_range")),
+    (_sendfile, hasattr(os, "sendfile")),
+    (_read_write, True),
+) if available)
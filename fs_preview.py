@@ -0,0 +1,179 @@
+"""Просмотр файлов без чтения целиком
+
+Файл отображается в память (mmap), представление запрашивает только видимые
+строки. Для текста в фоне строится разреженный индекс строк: смещение начала
+каждой LINE_STRIDE-й строки, поэтому даже для многогигабайтного журнала он
+занимает единицы мегабайт, а строка между опорными находится поиском вперёд.
+Двоичные файлы показываются шестнадцатеричным дампом — число его строк
+известно сразу.
+"""
+import os
+import mmap
+import itertools
+from array import array
+
+# Сколько байт от начала файла смотреть, чтобы отличить текст от двоичных данных
+PREVIEW_SNIFF_BYTES = 8 * 1024
+# Через сколько строк сохраняется опорное смещение
+LINE_STRIDE = 64
+# Длиннее строки при показе обрезаются
+LINE_MAX_BYTES = 4096
+# Байт в строке шестнадцатеричного дампа
+HEX_ROW_BYTES = 16
+# Порция файла, которую индекс строк разбирает за раз; между порциями
+# проверяются отмена и размер файла
+SCAN_BLOCK_BYTES = 4 * 1024 * 1024
+
+
+def _detect_encoding(sample):
+    """'utf-8' или 'cp1251' по началу файла; None для двоичных данных"""
+    if b"\0" in sample:
+        return None
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(sample) - 3 or len(sample) < PREVIEW_SNIFF_BYTES:
+            return "cp1251"
+        # Начало обрезано посреди символа — остальное в UTF-8
+    return "utf-8"
+
+
+class PreviewFile:
+    """Файл, отображённый в память, со строками текста и шестнадцатеричного дампа
+
+    Пока индекс строк строится, line_count растёт через add_checkpoints.
+    Если файл укоротили, обращение к отображению за новым концом файла
+    аварийно завершило бы процесс, поэтому перед чтением размер сверяется
+    и после укорочения строки больше не отдаются (valid становится False).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.size = os.fstat(self.file.fileno()).st_size
+            self.mapped = (mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+                           if self.size else None)
+        except (OSError, ValueError):
+            self.file.close()
+            raise
+        sample = self.mapped[:PREVIEW_SNIFF_BYTES] if self.mapped is not None else b""
+        detected = _detect_encoding(sample)
+        self.is_binary = detected is None
+        self.encoding = detected or "cp1251"
+        self.checkpoints = array("Q", [0])  # Смещения строк 0, LINE_STRIDE, 2 * LINE_STRIDE...
+        self.line_count = 1 if self.size else 0  # Строк, начало которых уже известно
+        self.complete = not self.size
+        self.valid = True
+        self.offset_width = max(8, len(f"{self.size:x}"))
+        self._last = None  # (номер, смещение) последней прочитанной строки
+
+    @property
+    def hex_rows(self):
+        return (self.size + HEX_ROW_BYTES - 1) // HEX_ROW_BYTES
+
+    def close(self):
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        self.file.close()
+        self.valid = False
+
+    def add_checkpoints(self, checkpoints, line_count, complete):
+        """Принимает порцию индекса строк из iter_line_checkpoints"""
+        self.checkpoints.extend(checkpoints)
+        self.line_count = line_count
+        self.complete = complete
+
+    def _check(self):
+        if self.valid and self.mapped is not None:
+            try:
+                self.valid = os.fstat(self.file.fileno()).st_size >= self.size
+            except OSError:
+                self.valid = False
+        return self.valid and self.mapped is not None
+
+    def _line_start(self, number):
+        checkpoint = number // LINE_STRIDE
+        if checkpoint >= len(self.checkpoints):
+            return None
+        line, start = checkpoint * LINE_STRIDE, self.checkpoints[checkpoint]
+        # Представление просит строки подряд — продолжаем от предыдущей
+        if self._last is not None and line <= self._last[0] <= number:
+            line, start = self._last
+        while line < number:
+            newline = self.mapped.find(b"\n", start)
+            if newline < 0:
+                return None
+            start = newline + 1
+            line += 1
+        self._last = (number, start)
+        return start
+
+    def line(self, number):
+        """Текст строки number (без перевода строки) или None"""
+        if not self._check() or not 0 <= number < self.line_count:
+            return None
+        start = self._line_start(number)
+        if start is None or start >= self.size:
+            return None
+        limit = min(self.size, start + LINE_MAX_BYTES)
+        end = self.mapped.find(b"\n", start, limit)
+        truncated = end < 0 and limit < self.size
+        data = self.mapped[start:end if end >= 0 else limit]
+        if data.endswith(b"\r"):
+            data = data[:-1]
+        text = data.decode(self.encoding, errors="replace").expandtabs(4)
+        return text + " …" if truncated else text
+
+    def hex_row(self, row):
+        """Строка дампа: смещение, байты и их печатные символы; None при ошибке"""
+        if not self._check():
+            return None
+        offset = row * HEX_ROW_BYTES
+        data = self.mapped[offset:offset + HEX_ROW_BYTES]
+        if not data:
+            return None
+        hex_part = " ".join(f"{byte:02x}" for byte in data)
+        if len(data) > 8:
+            hex_part = hex_part[:23] + " " + hex_part[23:]
+        text = "".join(chr(byte) if 32 <= byte < 127 else "." for byte in data)
+        return f"{offset:0{self.offset_width}x}  {hex_part:<{HEX_ROW_BYTES * 3}}  |{text}|"
+
+
+def iter_line_checkpoints(path, is_cancelled=None):
+    """Строит индекс строк файла порциями: (опорные смещения, строк известно, готово)
+
+    Файл читается своим отображением (в потоке индекса) по SCAN_BLOCK_BYTES;
+    переводы строк ищет bytes.split, поэтому цикл Python идёт по порциям, а не
+    по строкам. Смещения продолжают PreviewFile.checkpoints, начиная со
+    строки LINE_STRIDE. Если файл укоротили, построение прекращается.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            yield array("Q"), 0, True
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            newlines = 0
+            position = 0
+            while position < size:
+                if is_cancelled is not None and is_cancelled():
+                    return
+                if os.fstat(f.fileno()).st_size < size:
+                    return
+                end = min(position + SCAN_BLOCK_BYTES, size)
+                parts = mapped[position:end].split(b"\n")
+                # Начала строк после каждого перевода строки порции
+                starts = list(itertools.accumulate((len(part) + 1 for part in parts[:-1]),
+                                                   initial=position))[1:]
+                first = (-newlines - 1) % LINE_STRIDE  # Номер строки кратен LINE_STRIDE
+                checkpoints = array("Q", (start for start in starts[first::LINE_STRIDE]
+                                          if start < size))
+                newlines += len(starts)
+                position = end
+                # Перевод строки в самом конце файла новой строки не начинает
+                line_count = newlines + 1
+                if position >= size and mapped[size - 1:size] == b"\n":
+                    line_count -= 1
+                yield checkpoints, line_count, position >= size
@@ -0,0 +1,412 @@
+import os
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Число потоков, выполняющих os.rename
+RENAME_WORKERS = 8
+# Как часто (в шагах) сбрасывать отметки о выполнении в журнал
+JOURNAL_FLUSH_EVERY = 256
+# Имя файла журнала в служебной папке
+RENAME_JOURNAL_NAME = "rename_journal.jsonl"
+
+# Где находится файл шага
+AT_SOURCE = 0
+AT_TEMP = 1
+AT_TARGET = 2
+
+
+class PendingJournalError(Exception):
+    """Журнал прерванного пакета не даёт начать новый: его нужно продолжить или откатить"""
+
+
+class RenameStep:
+    """Один шаг переименования: src → (tmp →) dst"""
+
+    def __init__(self, src, dst, tmp=None):
+        self.src = src
+        self.dst = dst
+        self.tmp = tmp
+
+
+class RenamePlan:
+    """Проверенный набор шагов переименования"""
+
+    def __init__(self, steps, warnings=None, unchanged=None):
+        self.steps = steps
+        self.warnings = warnings or []
+        self.unchanged = unchanged or []  # Пары, где имя не меняется
+
+    @property
+    def chained_count(self):
+        """Сколько шагов идёт через временное имя (цепочки и циклы)"""
+        return sum(1 for step in self.steps if step.tmp is not None)
+
+
+class RenameResult:
+    """Итог выполнения плана"""
+
+    def __init__(self):
+        self.renamed = []  # [(старый путь, новый путь)]
+        self.warnings = []
+        self.history = None  # (пакет истории, отменён) для отмены и повтора
+
+    @property
+    def success_count(self):
+        return len(self.renamed)
+
+
+def group_rename_pairs(file_paths, new_base_name):
+    """Пары (старый, новый) для схемы <база>_<номер><расширение>"""
+    pairs = []
+    for i, old_path in enumerate(file_paths, 1):
+        _, ext = os.path.splitext(old_path)
+        new_name = f"{new_base_name}_{i}{ext}"
+        pairs.append((old_path, os.path.join(os.path.dirname(old_path), new_name)))
+    return pairs
+
+
+def plan_renames(pairs, listdir=os.listdir):
+    """Строит план для пар (старый путь, новый путь) целиком, до первого os.rename
+
+    Содержимое затронутых папок читается один раз и проверяется по множествам имён.
+    Отбрасываются отсутствующие файлы, повторные цели и цели, занятые файлами вне
+    пакета. Шаги, чей источник является целью другого шага (цепочки a→b→c и циклы
+    a→b, b→a), идут через временное имя в той же папке.
+    """
+    warnings = []
+    unchanged = []
+    listings = {}
+
+    def names_in(directory):
+        names = listings.get(directory)
+        if names is None:
+            try:
+                names = set(listdir(directory))
+            except OSError:
+                names = set()
+            listings[directory] = names
+        return names
+
+    steps = []
+    targets = set()
+    sources = set()
+    for old_path, new_path in pairs:
+        old_path = os.path.abspath(old_path)
+        new_path = os.path.abspath(new_path)
+        old_dir, old_name = os.path.split(old_path)
+        new_name = os.path.basename(new_path)
+
+        if old_name not in names_in(old_dir) or old_path in sources:
+            warnings.append(f"Файл не существует: {old_name}")
+            continue
+        if old_path == new_path:
+            unchanged.append((old_path, new_path))
+            continue
+        if new_path in targets:
+            warnings.append(f"Конфликт имён: {new_name} уже назначено другому файлу")
+            continue
+
+        targets.add(new_path)
+        sources.add(old_path)
+        steps.append(RenameStep(old_path, new_path))
+
+    # Цель занята файлом, который сам не переименовывается. Отбрасывание шага
+    # оставляет его источник на месте, поэтому проверка повторяется до устойчивости.
+    while True:
+        sources = {step.src for step in steps}
+        kept = []
+        for step in steps:
+            new_dir, new_name = os.path.split(step.dst)
+            if new_name in names_in(new_dir) and step.dst not in sources:
+                warnings.append(f"Файл уже существует: {new_name}")
+            else:
+                kept.append(step)
+        if len(kept) == len(steps):
+            break
+        steps = kept
+
+    targets = {step.dst for step in steps}
+    batch = uuid.uuid4().hex[:8]
+    for i, step in enumerate(steps):
+        if step.src in targets:
+            step.tmp = os.path.join(os.path.dirname(step.src), f".fsm-{batch}-{i}.tmp")
+
+    return RenamePlan(steps, warnings, unchanged)
+
+
+def get_journal_path(state_dir):
+    return os.path.join(state_dir, RENAME_JOURNAL_NAME)
+
+
+class RenameJournal:
+    """Журнал пакета переименований (JSON lines) для отката и продолжения после сбоя
+
+    Записи: begin (все шаги и для отмены и повтора — пакет истории), phase (начало
+    второй фазы), done (выполненные шаги), commit (пакет завершён).
+    Новый журнал пишется рядом и заменяет прежний целиком, поэтому сбой в начале
+    пакета не теряет журнал предыдущего, прерванного.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.pending = []
+        self.pending_state = None
+
+    def begin(self, steps, history=None, replace_pending=False):
+        """Начинает журнал пакета; прерванный пакет заменяется только при
+        продолжении или откате (replace_pending)"""
+        if not replace_pending and has_pending_journal(self.path):
+            raise PendingJournalError("предыдущее переименование не завершено — "
+                                      "продолжите или откатите его")
+        tmp_path = self.path + ".tmp"
+        self.file = open(tmp_path, "w", encoding="utf-8")
+        record = {"op": "begin", "steps": [[s.src, s.tmp, s.dst] for s in steps]}
+        if history is not None:
+            record["history"] = list(history)
+        try:
+            self._write(record)
+        finally:
+            self.file.close()
+            self.file = None
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def mark(self, index, state):
+        if self.pending_state != state:
+            self.flush()
+            self.pending_state = state
+        self.pending.append(index)
+        if len(self.pending) >= JOURNAL_FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self._write({"op": "done", "state": self.pending_state, "steps": self.pending})
+            self.pending = []
+
+    def start_phase(self, phase):
+        self.flush()
+        self._write({"op": "phase", "phase": phase})
+
+    def commit(self):
+        self.flush()
+        self._write({"op": "commit"})
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+
+def _run_renames(moves, progress, done_before, total, workers, on_success):
+    """Выполняет независимые переименования [(индекс, откуда, куда)] в пуле потоков
+
+    on_success(индекс) вызывается сразу после каждого успешного шага.
+    Возвращает (успешные индексы, [(индекс, ошибка)]).
+    """
+    succeeded = []
+    failed = []
+    if not moves:
+        return succeeded, failed
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(os.rename, src, dst): index for index, src, dst in moves}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                future.result()
+                succeeded.append(index)
+                on_success(index)
+            except OSError as e:
+                failed.append((index, e))
+            if progress is not None:
+                progress(done_before + len(succeeded) + len(failed), total)
+
+    return succeeded, failed
+
+
+def execute_plan(plan, journal_path=None, progress=None, workers=RENAME_WORKERS, states=None,
+                 history=None, replace_pending=False):
+    """Выполняет план в две фазы: сначала источники цепочек уходят во временные имена,
+    затем все файлы параллельно получают итоговые имена.
+
+    progress(выполнено, всего) вызывается из вызывающего потока.
+    states — начальное положение шагов (при продолжении прерванного пакета).
+    history — (id пакета истории, отменён после выполнения) для отмены и повтора:
+    пишется в журнал, чтобы продолжение после сбоя довело тот же переход.
+    replace_pending — план продолжает или откатывает прерванный пакет из журнала;
+    иначе при незавершённом журнале бросается PendingJournalError.
+    """
+    steps = plan.steps
+    if states is None:
+        states = [AT_SOURCE] * len(steps)
+    result = RenameResult()
+    result.history = history
+    result.warnings.extend(plan.warnings)
+    result.renamed.extend(plan.unchanged)
+
+    journal = None
+    if journal_path is not None:
+        journal = RenameJournal(journal_path)
+        journal.begin(steps, history, replace_pending)
+        for i, state in enumerate(states):
+            if state != AT_SOURCE:
+                journal.mark(i, state)
+
+    # Всего операций: уход во временные имена плюс итоговые переименования
+    total = sum(1 for i, s in enumerate(steps) if s.tmp is not None and states[i] == AT_SOURCE)
+    total += sum(1 for state in states if state != AT_TARGET)
+    done = 0
+
+    def moved_to(state):
+        def on_success(i):
+            states[i] = state
+            if journal is not None:
+                journal.mark(i, state)
+        return on_success
+
+    try:
+        # Фаза 1: освобождаем имена, которые нужны другим шагам
+        moves = [(i, s.src, s.tmp) for i, s in enumerate(steps)
+                 if s.tmp is not None and states[i] == AT_SOURCE]
+        _, failed = _run_renames(moves, progress, done, total, workers, moved_to(AT_TEMP))
+        done += len(moves)
+
+        # Источник не освободился — шаг, который в него целится, выполнять нельзя
+        blocked = set()
+        for i, e in failed:
+            blocked.add(steps[i].src)
+            result.warnings.append(f"Ошибка переименования {os.path.basename(steps[i].src)}: {e}")
+
+        if journal is not None:
+            journal.start_phase(2)
+
+        # Фаза 2: итоговые имена
+        moves = []
+        for i, step in enumerate(steps):
+            if states[i] == AT_TARGET:
+                continue
+            if step.tmp is not None and states[i] == AT_SOURCE:
+                done += 1  # Не ушёл во временное имя, ошибка уже записана
+                continue
+            if step.dst in blocked:
+                result.warnings.append(f"Пропущено {os.path.basename(step.src)}: "
+                                       f"{os.path.basename(step.dst)} не освободилось")
+                done += 1
+                continue
+            current = step.tmp if states[i] == AT_TEMP else step.src
+            moves.append((i, current, step.dst))
+
+        _, failed = _run_renames(moves, progress, done, total, workers, moved_to(AT_TARGET))
+        for i, e in failed:
+            message = f"Ошибка переименования {os.path.basename(steps[i].src)}: {e}"
+            if states[i] == AT_TEMP:
+                message += f" (файл оставлен как {os.path.basename(steps[i].tmp)})"
+            result.warnings.append(message)
+    except BaseException:
+        if journal is not None:
+            journal.close()  # Пакет не завершён — его можно продолжить или откатить
+        raise
+
+    if journal is not None:
+        if any(state == AT_TEMP for state in states):
+            journal.close()  # Остались временные имена — пакет можно откатить
+        else:
+            journal.commit()
+
+    for step, state in zip(steps, states):
+        if state == AT_TARGET:
+            result.renamed.append((step.src, step.dst))
+    return result
+
+
+def load_journal(journal_path):
+    """Читает журнал прерванного пакета: (шаги, положения, пакет истории) или None,
+    если пакет завершён"""
+    try:
+        with open(journal_path, encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+
+    steps = None
+    history = None
+    recorded = {}
+    phase = 1
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break  # Недописанная последняя строка
+        op = record.get("op")
+        if op == "begin":
+            steps = [RenameStep(src, dst, tmp) for src, tmp, dst in record["steps"]]
+            if "history" in record:
+                history = tuple(record["history"])
+        elif op == "done":
+            for i in record["steps"]:
+                recorded[i] = record["state"]
+        elif op == "phase":
+            phase = record["phase"]
+        elif op == "commit":
+            return None
+
+    if steps is None:
+        return None
+
+    # Переименование могло пройти, но не успеть попасть в журнал — уточняем по диску.
+    # Во второй фазе все источники цепочек уже во временных именах, поэтому проверка
+    # существования однозначна.
+    states = []
+    for i, step in enumerate(steps):
+        state = recorded.get(i, AT_SOURCE)
+        if state != AT_TARGET:
+            if step.tmp is not None and os.path.lexists(step.tmp):
+                state = AT_TEMP
+            elif phase == 2 and (step.tmp is not None or not os.path.lexists(step.src)):
+                state = AT_TARGET if os.path.lexists(step.dst) else state
+        states.append(state)
+    return steps, states, history
+
+
+def has_pending_journal(journal_path):
+    return load_journal(journal_path) is not None
+
+
+def resume_journal(journal_path, progress=None, workers=RENAME_WORKERS):
+    """Доводит прерванный пакет до конца
+
+    Для отмены и повтора в result.history — пакет истории и его новое положение.
+    """
+    loaded = load_journal(journal_path)
+    if loaded is None:
+        return RenameResult()
+    steps, states, history = loaded
+    return execute_plan(RenamePlan(steps), journal_path, progress, workers, states, history,
+                        replace_pending=True)
+
+
+def rollback_journal(journal_path, progress=None, workers=RENAME_WORKERS):
+    """Возвращает файлы прерванного пакета к исходным именам"""
+    loaded = load_journal(journal_path)
+    if loaded is None:
+        return RenameResult()
+    steps, states, _ = loaded
+
+    pairs = []
+    for step, state in zip(steps, states):
+        if state == AT_TEMP:
+            pairs.append((step.tmp, step.src))
+        elif state == AT_TARGET:
+            pairs.append((step.dst, step.src))
+    return execute_plan(plan_renames(pairs), journal_path, progress, workers,
+                        replace_pending=True)
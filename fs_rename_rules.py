@@ -0,0 +1,217 @@
+"""Переименование по правилу: отбор файлов шаблоном имени и новое имя по образцу
+
+Образец нового имени — текст с полями в фигурных скобках:
+    {name}            имя без расширения
+    {ext}             расширение с точкой (.txt) или пустая строка
+    {n}               счётчик 1, 2, 3...
+    {n:4}             счётчик, дополненный нулями до 4 цифр
+    {n:4:100}         ... начиная со 100
+    {n:4:100:10}      ... с шагом 10
+    {date}            дата изменения файла (2024-05-31)
+    {date:%Y%m%d}     дата изменения в формате strftime
+    {today}           сегодняшняя дата, формат как у {date}
+    {0}, {1}, ...     группы выражения отбора (только для re:)
+    {g:имя}           именованная группа (?P<имя>...) выражения отбора
+    {{ и }}           фигурные скобки
+"""
+import os
+import re
+import time
+
+from fs_rename import plan_renames
+from fs_search import compile_pattern
+
+# Формат дат по умолчанию
+DEFAULT_DATE_FORMAT = "%Y-%m-%d"
+# Сколько строк соответствия выводить командой (полный список — в данных результата)
+PREVIEW_LINES = 50
+
+_TOKEN_RE = re.compile(r"\{\{|\}\}|\{([^{}]*)\}|[{}]")
+_DIGITS_RE = re.compile(r"(\d+)")
+
+# Состояния строк предпросмотра
+STATUS_OK = 0
+STATUS_CHAINED = 1  # Пойдёт через временное имя
+STATUS_UNCHANGED = 2
+STATUS_SKIPPED = 3  # Конфликт или неверное имя
+
+
+class RenameTemplate:
+    """Разобранный образец имени: список кусков — строк и функций от записи"""
+
+    def __init__(self, text, parts, uses_mtime):
+        self.text = text
+        self.parts = parts
+        self.uses_mtime = uses_mtime
+
+    def render(self, name, counter, match, mtime=None):
+        stem, ext = os.path.splitext(name)
+        return "".join([part if isinstance(part, str) else part(stem, ext, counter, match, mtime)
+                        for part in self.parts])
+
+
+def _int_field(value, field):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{{{field}}}: ожидается число, получено '{value}'") from None
+
+
+def _counter_part(field, options):
+    if len(options) > 3:
+        raise ValueError(f"{{{field}}}: слишком много параметров")
+    width = _int_field(options[0], field) if options and options[0] else 0
+    start = _int_field(options[1], field) if len(options) > 1 else 1
+    step = _int_field(options[2], field) if len(options) > 2 else 1
+    return lambda stem, ext, counter, match, mtime: str(start + counter * step).zfill(width)
+
+
+def compile_template(text, regex=None):
+    """Разбирает образец; ошибки в нём — ValueError с понятным сообщением
+
+    regex — выражение отбора: по нему проверяются ссылки на группы.
+    """
+    parts = []
+    uses_mtime = False
+    position = 0
+    for token in _TOKEN_RE.finditer(text):
+        if token.start() > position:
+            parts.append(text[position:token.start()])
+        position = token.end()
+
+        raw = token.group(0)
+        if raw in ("{{", "}}"):
+            parts.append(raw[0])
+            continue
+        if raw in ("{", "}"):
+            raise ValueError("непарная фигурная скобка")
+
+        field = token.group(1)
+        name, _, rest = field.partition(":")
+        options = rest.split(":") if rest else []
+        if name == "name" and not rest:
+            parts.append(lambda stem, ext, counter, match, mtime: stem)
+        elif name == "ext" and not rest:
+            parts.append(lambda stem, ext, counter, match, mtime: ext)
+        elif name == "n":
+            parts.append(_counter_part(field, options))
+        elif name == "date":
+            date_format = rest or DEFAULT_DATE_FORMAT
+            parts.append(lambda stem, ext, counter, match, mtime, fmt=date_format:
+                         time.strftime(fmt, time.localtime(mtime)))
+            uses_mtime = True
+        elif name == "today":
+            parts.append(time.strftime(rest or DEFAULT_DATE_FORMAT))
+        elif name == "g":
+            if regex is None or rest not in regex.groupindex:
+                raise ValueError(f"{{{field}}}: в выражении отбора нет группы '{rest}'")
+            parts.append(lambda stem, ext, counter, match, mtime, group=rest:
+                         match.group(group) or "")
+        elif name.isdigit() and not rest:
+            group = int(name)
+            if regex is None or group > regex.groups:
+                raise ValueError(f"{{{field}}}: в выражении отбора нет группы {group}")
+            parts.append(lambda stem, ext, counter, match, mtime, group=group:
+                         match.group(group) or "")
+        else:
+            raise ValueError(f"неизвестное поле {{{field}}}")
+
+    if position < len(text):
+        parts.append(text[position:])
+    return RenameTemplate(text, parts, uses_mtime)
+
+
+def _natural_key(name):
+    """IMG_2 раньше IMG_10: числа в имени сравниваются как числа"""
+    parts = _DIGITS_RE.split(name.casefold())
+    parts[1::2] = map(int, parts[1::2])  # Текст и числа чередуются, типы на местах совпадают
+    return parts
+
+
+def _invalid_name(name):
+    return (not name or name in (os.curdir, os.pardir) or os.sep in name
+            or (os.altsep is not None and os.altsep in name))
+
+
+def rule_rename_pairs(directory, pattern, template_text, entries):
+    """Пары (старый путь, новый путь) для файлов directory, подходящих под pattern
+
+    entries — содержимое папки {имя: это_папка} (например, из ListingCache).
+    Счётчик идёт по именам в естественном порядке (IMG_2 раньше IMG_10).
+    Возвращает (пары, предупреждения).
+    Ошибки в шаблоне или образце — ValueError (re.error тоже ValueError).
+    """
+    regex = compile_pattern(pattern)
+    template = compile_template(template_text, regex if pattern.startswith("re:") else None)
+
+    selected = []
+    for name, is_dir in entries.items():
+        if is_dir is False:
+            match = regex.search(name)
+            if match is not None:
+                selected.append((name, match))
+    selected.sort(key=lambda item: _natural_key(item[0]))
+
+    pairs = []
+    warnings = []
+    for counter, (name, match) in enumerate(selected):
+        old_path = os.path.join(directory, name)
+        mtime = None
+        if template.uses_mtime:
+            try:
+                mtime = os.stat(old_path).st_mtime
+            except OSError:
+                warnings.append(f"Файл не существует: {name}")
+                continue
+
+        new_name = template.render(name, counter, match, mtime)
+        if _invalid_name(new_name):
+            warnings.append(f"Недопустимое имя: '{new_name}' для {name}")
+            continue
+        pairs.append((old_path, os.path.join(directory, new_name)))
+    return pairs, warnings
+
+
+class RulePreview:
+    """Полное соответствие старых и новых имён и его проверенный план
+
+    Имена хранятся плоскими списками, состояние строки — байтом, чтобы
+    предпросмотр на сотни тысяч файлов не создавал объект на строку.
+    """
+
+    def __init__(self, directory, pattern, template_text, entries, listdir=os.listdir):
+        pairs, warnings = rule_rename_pairs(directory, pattern, template_text, entries)
+        self.plan = plan_renames(pairs, listdir)
+        self.plan.warnings[:0] = warnings
+
+        steps = {step.src: step for step in self.plan.steps}
+        unchanged = {src for src, _ in self.plan.unchanged}
+        self.old_names = []
+        self.new_names = []
+        self.statuses = bytearray(len(pairs))
+        for row, (old_path, new_path) in enumerate(pairs):
+            self.old_names.append(os.path.basename(old_path))
+            self.new_names.append(os.path.basename(new_path))
+            step = steps.get(old_path)
+            if step is not None:
+                self.statuses[row] = STATUS_CHAINED if step.tmp is not None else STATUS_OK
+            elif old_path in unchanged:
+                self.statuses[row] = STATUS_UNCHANGED
+            else:
+                self.statuses[row] = STATUS_SKIPPED
+        self.skipped = len(warnings)
+
+    def __len__(self):
+        return len(self.old_names)
+
+    @property
+    def rename_count(self):
+        return len(self.plan.steps)
+
+    @property
+    def conflict_count(self):
+        return len(self.plan.warnings)
+
+    def summary(self):
+        return (f"Подходит файлов: {len(self) + self.skipped}, будет переименовано: "
+                f"{self.rename_count}, пропущено: {self.conflict_count}")
@@ -0,0 +1,204 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from fs_index import RACY_MTIME_NS
+
+# Число потоков обхода дерева
+ROLLUP_WORKERS = 8
+# Сколько крупнейших подпапок показывать
+TOP_CHILDREN = 5
+# Сколько папок держать в кэше; сверх этого вытесняются давно не использованные
+ROLLUP_MAX_DIRS = 200_000
+
+
+class DirTotals:
+    """Суммы по папке: размер файлов, число файлов и подпапок"""
+    __slots__ = ("size", "files", "dirs")
+
+    def __init__(self, size=0, files=0, dirs=0):
+        self.size = size
+        self.files = files
+        self.dirs = dirs
+
+    def add(self, other):
+        self.size += other.size
+        self.files += other.files
+        self.dirs += other.dirs
+
+    def to_dict(self):
+        return {"size": self.size, "files": self.files, "dirs": self.dirs}
+
+
+class _DirRecord:
+    """Собственное содержимое одной папки, прочитанное при данном mtime"""
+    __slots__ = ("mtime_ns", "own", "children")
+
+    def __init__(self, mtime_ns, own, children):
+        self.mtime_ns = mtime_ns
+        self.own = own  # DirTotals только по файлам и подпапкам самой папки
+        self.children = children  # Имена подпапок без символических ссылок
+
+
+class RollupResult:
+    """Итог подсчёта: суммы по папке и по каждой её подпапке"""
+
+    def __init__(self, path, totals, children, scanned, checked):
+        self.path = path
+        self.totals = totals
+        self.children = children  # [(имя, DirTotals)] по убыванию размера
+        self.scanned = scanned  # Сколько папок пришлось перечитать
+        self.checked = checked  # Сколько папок проверено по mtime
+
+    def top(self, count=TOP_CHILDREN):
+        return self.children[:count]
+
+
+def format_size(size):
+    """Размер в байтах для человека: 1.5 МБ"""
+    for unit in ("Б", "КБ", "МБ", "ГБ"):
+        if size < 1024 or unit == "ГБ":
+            return f"{size} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class DirRollup:
+    """Подсчёт размеров и числа записей по поддеревьям с кэшем по mtime папок
+
+    Для каждой папки запоминается её собственное содержимое вместе с mtime.
+    Повторный подсчёт стоит один stat на папку: перечитываются только папки,
+    у которых mtime изменился, суммы поддеревьев собираются из кэша.
+    Изменение размера файла без изменения папки до нового чтения не видно —
+    так же, как в индексе метаданных. Кэш ограничен max_dirs папками (LRU):
+    вытесненная папка просто перечитывается при следующем подсчёте.
+    """
+
+    def __init__(self, workers=ROLLUP_WORKERS, pool=None, max_dirs=ROLLUP_MAX_DIRS):
+        self.workers = workers
+        self.pool = pool  # Общий пул обхода; без него на подсчёт создаётся свой
+        self.max_dirs = max_dirs
+        self.records = OrderedDict()  # абсолютный путь -> _DirRecord, давно нужные первыми
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def _check_dir(self, path):
+        """Актуализирует запись одной папки; возвращает (запись или None, перечитана ли)"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.forget(path)
+            return None, False
+
+        with self.lock:
+            record = self.records.get(path)
+            if record is not None:
+                self.records.move_to_end(path)
+        if record is not None and record.mtime_ns == mtime:
+            return record, False
+
+        scan_started = time.time_ns()
+        own = DirTotals()
+        children = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            own.dirs += 1
+                            if not entry.is_symlink():
+                                children.append(entry.name)
+                        elif entry.is_file():
+                            own.files += 1
+                            own.size += entry.stat().st_size
+                    except OSError:
+                        continue
+        except OSError:
+            self.forget(path)
+            return None, True
+
+        if scan_started - mtime < RACY_MTIME_NS:
+            mtime = -1  # Слишком свежая папка — перечитаем при следующем подсчёте
+
+        if record is not None:
+            for name in set(record.children).difference(children):
+                self.forget(os.path.join(path, name))
+
+        record = _DirRecord(mtime, own, children)
+        with self.lock:
+            self.records[path] = record
+            self.records.move_to_end(path)
+            while len(self.records) > self.max_dirs:
+                self.records.popitem(last=False)
+                self.evictions += 1
+        return record, True
+
+    def forget(self, path):
+        """Убирает из кэша папку path и всё её поддерево"""
+        prefix = path + os.sep
+        with self.lock:
+            for key in [k for k in self.records if k == path or k.startswith(prefix)]:
+                del self.records[key]
+
+    def compute(self, path, is_cancelled=None):
+        """Суммы по дереву path; None, если подсчёт отменён или папка недоступна"""
+        if self.pool is None:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                return self._compute(pool, os.path.abspath(path), is_cancelled)
+        return self._compute(self.pool, os.path.abspath(path), is_cancelled)
+
+    def _compute(self, pool, path, is_cancelled):
+        found = {}
+        checked = 0
+        scanned = 0
+
+        pending = {pool.submit(self._check_dir, path): path}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            if is_cancelled is not None and is_cancelled():
+                for future in pending:
+                    future.cancel()
+                return None
+
+            for future in done:
+                dir_path = pending.pop(future)
+                record, was_scanned = future.result()
+                checked += 1
+                scanned += was_scanned
+                if record is None:
+                    continue
+                found[dir_path] = record
+                for name in record.children:
+                    child = os.path.join(dir_path, name)
+                    pending[pool.submit(self._check_dir, child)] = child
+
+        if path not in found:
+            return None
+
+        # Суммы поддеревьев снизу вверх: дети всегда длиннее родителя
+        totals = {}
+        for dir_path in sorted(found, key=len, reverse=True):
+            record = found[dir_path]
+            total = DirTotals(record.own.size, record.own.files, record.own.dirs)
+            for name in record.children:
+                child_total = totals.get(os.path.join(dir_path, name))
+                if child_total is not None:
+                    total.add(child_total)
+            totals[dir_path] = total
+
+        children = [(name, totals[os.path.join(path, name)])
+                    for name in found[path].children if os.path.join(path, name) in totals]
+        children.sort(key=lambda item: item[1].size, reverse=True)
+        return RollupResult(path, totals[path], children, scanned, checked)
+
+
+def format_rollup_lines(result, count=TOP_CHILDREN):
+    """Строки итога: общие суммы и крупнейшие подпапки"""
+    totals = result.totals
+    lines = [f"📊 Всего: {format_size(totals.size)} — файлов {totals.files}, папок {totals.dirs}"]
+    top = result.top(count)
+    if top:
+        lines.append("📁 Крупнейшие папки:")
+        lines.extend(f"  📂 {name} — {format_size(t.size)} ({t.files} файлов)" for name, t in top)
+    return lines
@@ -0,0 +1,115 @@
+import os
+import re
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Число потоков обхода дерева
+SEARCH_WORKERS = 8
+# Сколько совпадений показывать по умолчанию
+DEFAULT_SEARCH_LIMIT = 1000
+# Сколько совпадений копить перед передачей получателю
+SEARCH_BATCH_SIZE = 200
+
+
+def compile_pattern(pattern):
+    """Шаблон имени: 're:<выражение>' — регулярное выражение, иначе glob (*.txt, file?)
+
+    Регистр не учитывается. Возвращает скомпилированное выражение, имя проверяется
+    через search(): регулярное выражение ищется в любом месте имени, glob — по всему имени.
+    """
+    if pattern.startswith("re:"):
+        return re.compile(pattern[3:], re.IGNORECASE)
+    return re.compile("^" + fnmatch.translate(pattern), re.IGNORECASE)
+
+
+def _scan_dir(path, rel, regex):
+    """Читает одну папку: (совпадения [(отн. путь, это_папка)], подпапки [(путь, отн. путь)])"""
+    matches = []
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                    if is_dir and not entry.is_symlink():
+                        subdirs.append((entry.path, f"{rel}/{entry.name}" if rel else entry.name))
+                except OSError:
+                    continue
+                if regex.search(entry.name):
+                    matches.append((f"{rel}/{entry.name}" if rel else entry.name, is_dir))
+    except OSError:
+        pass
+    return matches, subdirs
+
+
+def search_tree(root_path, regex, on_matches, limit=DEFAULT_SEARCH_LIMIT,
+                is_cancelled=None, workers=SEARCH_WORKERS, pool=None):
+    """Ищет имена по дереву root_path, раздавая папки пулу потоков
+
+    pool — общий пул обхода; без него на время поиска создаётся свой из workers потоков.
+    on_matches(порция) получает совпадения по мере нахождения, из вызывающего потока.
+    Возвращает (найдено, упёрлись_в_лимит).
+    """
+    if pool is None:
+        with ThreadPoolExecutor(max_workers=workers) as own_pool:
+            return search_tree(root_path, regex, on_matches, limit, is_cancelled, pool=own_pool)
+
+    found = 0
+    batch = []
+    pending = {pool.submit(_scan_dir, root_path, "", regex)}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            matches, subdirs = future.result()
+            for path, rel in subdirs:
+                pending.add(pool.submit(_scan_dir, path, rel, regex))
+            batch.extend(matches)
+
+        if is_cancelled is not None and is_cancelled():
+            break
+
+        if found + len(batch) >= limit:
+            batch = batch[:limit - found]
+            found += len(batch)
+            on_matches(batch)
+            for future in pending:
+                future.cancel()
+            return found, True
+
+        if len(batch) >= SEARCH_BATCH_SIZE or not pending:
+            found += len(batch)
+            if batch:
+                on_matches(batch)
+            batch = []
+
+    for future in pending:
+        future.cancel()
+    return found, False
+
+
+def search_index(index, regex, on_matches, limit=DEFAULT_SEARCH_LIMIT, is_cancelled=None):
+    """Тот же поиск, но по индексу метаданных вместо обхода диска"""
+    found = 0
+    batch = []
+    for rel, is_dir in index.search_names(regex):
+        if is_cancelled is not None and is_cancelled():
+            break
+        batch.append((rel, is_dir))
+        if found + len(batch) >= limit:
+            found += len(batch)
+            on_matches(batch)
+            return found, True
+        if len(batch) >= SEARCH_BATCH_SIZE:
+            found += len(batch)
+            on_matches(batch)
+            batch = []
+
+    if batch:
+        found += len(batch)
+        on_matches(batch)
+    return found, False
+
+
+def format_search_lines(matches):
+    """Строки панели информации для порции совпадений"""
+    return "\n".join(f"  {'📂' if is_dir else '📄'} {rel}" for rel, is_dir in matches)
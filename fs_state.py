@@ -0,0 +1,16 @@
+import os
+
+# Служебная папка рядом с корнем main: журналы, индексы, кэши
+STATE_DIR_NAME = ".fs_manager"
+
+
+def get_state_dir(root_path):
+    """Возвращает (и при необходимости создаёт) служебную папку для корня root_path"""
+    path = os.path.join(os.path.dirname(os.path.abspath(root_path)), STATE_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_state_file(root_path, name):
+    """Путь к служебному файлу name для корня root_path"""
+    return os.path.join(get_state_dir(root_path), name)
@@ -1,79 +1,363 @@
 import sys
 import os
+import time
+
+# Начало отсчёта для --profile-startup: до загрузки Qt
+STARTUP_STARTED = time.perf_counter()
+
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QHBoxLayout, QTreeView, QTextEdit, QLineEdit,
-                               QPushButton, QLabel, QFileSystemModel,
-                               QSplitter, QMessageBox, QMenu, QDialog,
-                               QDialogButtonBox, QFormLayout, QListWidget,
-                               QInputDialog)
-from PySide6.QtGui import QAction, QFont, QIcon
-from PySide6.QtCore import Qt, QDir, QItemSelectionModel
+                               QPushButton, QLabel, QSplitter, QMessageBox, QMenu, QDialog,
+                               QInputDialog, QTableView, QHeaderView, QDockWidget,
+                               QFileDialog, QTabBar)
+from PySide6.QtGui import QAction, QFont
+from PySide6.QtCore import Qt, QObject, QThread, QTimer, Signal, QFileSystemWatcher
+
+from fs_commands import (CommandEngine, CommandResult, COMMANDS_HELP, COMMAND_NAMES,
+                         OPERATION_COMMANDS, parse_command)
+from fs_metrics import Metrics, tracking
+from fs_operations import COPY, MOVE, DELETE
+from fs_listing import iter_dir_chunks, iter_index_chunks, list_chunks
+from fs_models import DirEntryModel, DirTreeModel
+from fs_preview import iter_line_checkpoints
+from fs_index import MetadataIndex, INDEX_FILE_NAME
+from fs_rename import (RenameResult, plan_renames, group_rename_pairs, has_pending_journal,
+                       rollback_journal)
+from fs_rollup import format_rollup_lines
+from fs_search import format_search_lines, DEFAULT_SEARCH_LIMIT
+from fs_state import get_state_file
+
+# Окно объединения событий наблюдателя за папкой, мс
+WATCH_DEBOUNCE_MS = 100
+# При большем числе изменений панель перестраивается целиком, а не правится по записям
+PATCH_MAX_CHANGES = 1000
+
+
+class StartupProfile:
+    """Отметки времени запуска для --profile-startup"""
+
+    def __init__(self, started):
+        self.started = started
+        self.marks = []
+        self.reported = False
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+        print("⏱ Запуск:")
+        previous = self.started
+        for name, moment in self.marks:
+            print(f"  {name:<32} +{(moment - previous) * 1000:8.1f} мс"
+                  f"  ({(moment - self.started) * 1000:8.1f} мс)")
+            previous = moment
+
+
+class DirListingWorker(QThread):
+    """Фоновое чтение папки: записи отдаются порциями"""
+    chunk_ready = Signal(int, list)  # поколение, [(имя, это_папка)]
+    listing_done = Signal(int, int)  # поколение, всего записей
+    listing_failed = Signal(int, str)  # поколение, сообщение
+
+    def __init__(self, generation, path, index=None, listings=None, span=None, parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.path = path
+        self.index = index
+        self.listings = listings
+        self.span = span  # Замер, которому засчитываются вызовы потока
+
+    def run(self):
+        with tracking(self.span):
+            self.read()
+
+    def read(self):
+        total = 0
+        try:
+            for chunk in self.iter_chunks():
+                total += len(chunk)
+                self.chunk_ready.emit(self.generation, chunk)
+        except PermissionError:
+            self.listing_failed.emit(self.generation, "❌ Нет доступа к этой папке")
+            return
+        except OSError as e:
+            self.listing_failed.emit(self.generation, f"❌ Не удалось прочитать папку: {e}")
+            return
+        finally:
+            if self.index is not None:
+                self.index.close()  # Соединение этого потока
+
+        if not self.isInterruptionRequested():
+            self.listing_done.emit(self.generation, total)
+
+    def iter_chunks(self):
+        is_cancelled = self.isInterruptionRequested
+        key = None
+        if self.listings is not None:
+            key = self.listings.stat_key(self.path)
+            entries = self.listings.get(self.path, key)
+            if entries is not None:
+                yield from list_chunks(entries, is_cancelled=is_cancelled)
+                return
+
+        # Актуальная запись индекса избавляет от чтения папки с диска
+        entries = self.index.list_dir(self.path) if self.index is not None else None
+        if entries is not None:
+            yield from iter_index_chunks(entries, is_cancelled=is_cancelled)
+            return
+
+        scan_started = time.time_ns()
+        read = {}
+        for chunk in iter_dir_chunks(self.path, is_cancelled=is_cancelled,
+                                     keep_other=key is not None):
+            read.update(chunk)
+            yield [(name, is_dir) for name, is_dir in chunk if is_dir is not None]
+        if key is not None and not is_cancelled():
+            self.listings.put(self.path, key, read, scan_started)
+
+
+class DirPatchWorker(QThread):
+    """Перечитывает изменившуюся папку: обновляет её запись в индексе и отдаёт записи"""
+    patch_ready = Signal(int, str, list)  # поколение, папка, [(имя, это_папка)]
+
+    def __init__(self, generation, path, index, parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.path = path
+        self.index = index
+
+    def run(self):
+        try:
+            entries = [(e.name, e.is_dir) for e in self.index.refresh_dir(self.path)]
+        finally:
+            self.index.close()
+        self.patch_ready.emit(self.generation, self.path, entries)
+
+
+class SearchWorker(QThread):
+    """Фоновый поиск по именам через командное ядро, совпадения отдаются порциями"""
+    matches_found = Signal(int, list)  # поколение, [(отн. путь, это_папка)]
+    search_done = Signal(int, object)  # поколение, CommandResult
+
+    def __init__(self, generation, job, indexes=(), parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.job = job  # job(on_matches, is_cancelled) -> CommandResult
+        self.indexes = indexes  # Индексы, которыми может пользоваться job
 
+    def run(self):
+        def on_matches(batch):
+            self.matches_found.emit(self.generation, batch)
 
-class RenameDialog(QDialog):
-    def __init__(self, current_name, parent=None):
+        try:
+            result = self.job(on_matches, self.isInterruptionRequested)
+        finally:
+            for index in self.indexes:
+                if index is not None:
+                    index.close()  # Соединение этого потока
+        if not self.isInterruptionRequested():
+            self.search_done.emit(self.generation, result)
+
+
+class RollupWorker(QThread):
+    """Считает размер поддерева папки в фоне"""
+    rollup_ready = Signal(int, object)  # поколение, RollupResult или None
+
+    def __init__(self, generation, rollup, path, parent=None):
         super().__init__(parent)
-        self.setWindowTitle("Переименовать")
-        self.setModal(True)
-        self.resize(300, 100)
+        self.generation = generation
+        self.rollup = rollup
+        self.path = path
+
+    def run(self):
+        result = self.rollup.compute(self.path, is_cancelled=self.isInterruptionRequested)
+        if not self.isInterruptionRequested():
+            self.rollup_ready.emit(self.generation, result)
 
-        layout = QFormLayout(self)
 
-        self.old_name_label = QLabel(current_name)
-        self.new_name_input = QLineEdit(current_name)
+class IndexUpdateWorker(QThread):
+    """Фоновое обновление индекса метаданных"""
+    index_updated = Signal(int, int)  # проверено папок, перечитано папок
 
-        layout.addRow("Текущее имя:", self.old_name_label)
-        layout.addRow("Новое имя:", self.new_name_input)
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
 
-        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-        buttons.accepted.connect(self.accept)
-        buttons.rejected.connect(self.reject)
+    def run(self):
+        try:
+            checked, refreshed = self.index.update(is_cancelled=self.isInterruptionRequested)
+        except Exception:
+            checked, refreshed = 0, 0
+        finally:
+            self.index.close()
+        self.index_updated.emit(checked, refreshed)
+
+
+class TextIndexWorker(QThread):
+    """Фоновое обновление индекса содержимого файлов"""
+    text_index_updated = Signal(object)  # TextIndexStats или None, если прервано
+
+    def __init__(self, text_index, span=None, parent=None):
+        super().__init__(parent)
+        self.text_index = text_index
+        self.span = span
 
-        layout.addRow(buttons)
+    def run(self):
+        try:
+            with tracking(self.span):
+                stats = self.text_index.update(is_cancelled=self.isInterruptionRequested)
+        except Exception:
+            stats = None
+        finally:
+            self.text_index.close()
+        self.text_index_updated.emit(stats)
 
-    def get_new_name(self):
-        return self.new_name_input.text().strip()
 
+class LineIndexWorker(QThread):
+    """Фоновое построение индекса строк для панели просмотра"""
+    lines_found = Signal(int, object, int, bool)  # поколение, опорные смещения, строк, готово
 
-class GroupRenameDialog(QDialog):
-    def __init__(self, file_count, parent=None):
+    def __init__(self, generation, path, span=None, parent=None):
         super().__init__(parent)
-        self.setWindowTitle("Групповое переименование")
-        self.setModal(True)
-        self.resize(400, 150)
+        self.generation = generation
+        self.path = path
+        self.span = span
+
+    def run(self):
+        try:
+            with tracking(self.span):
+                self.scan()
+        except (OSError, ValueError):
+            pass  # Панель покажет строки, найденные до ошибки
 
-        layout = QFormLayout(self)
+    def scan(self):
+        for checkpoints, line_count, complete in iter_line_checkpoints(
+                self.path, is_cancelled=self.isInterruptionRequested):
+            self.lines_found.emit(self.generation, checkpoints, line_count, complete)
 
-        self.file_count_label = QLabel(f"Будет переименовано файлов: {file_count}")
-        self.new_name_input = QLineEdit()
-        self.new_name_input.setPlaceholderText("Введите новое базовое имя")
 
-        layout.addRow(self.file_count_label)
-        layout.addRow("Базовое имя:", self.new_name_input)
+class RenameWorker(QThread):
+    """Фоновое выполнение пакета переименований"""
+    progress = Signal(int, int)  # выполнено, всего
+    rename_done = Signal(object)  # RenameResult
 
-        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-        buttons.accepted.connect(self.accept)
-        buttons.rejected.connect(self.reject)
+    def __init__(self, action, parent=None):
+        super().__init__(parent)
+        self.action = action  # action(progress) -> RenameResult
+        self.last_reported = 0
 
-        layout.addRow(buttons)
+    def run(self):
+        try:
+            result = self.action(self.report_progress)
+        except Exception as e:
+            result = RenameResult()
+            result.warnings.append(f"Ошибка: {e}")
+        self.rename_done.emit(result)
 
-    def get_new_name(self):
-        return self.new_name_input.text().strip()
+    def report_progress(self, done, total):
+        # Не чаще одного сигнала на процент, чтобы не засыпать очередь событий
+        if done == total or done - self.last_reported >= max(1, total // 100):
+            self.last_reported = done
+            self.progress.emit(done, total)
+
+
+class OperationSignals(QObject):
+    """Переносит сообщения очереди файловых операций из её потоков в поток окна"""
+    updated = Signal(object)  # FileOperation
 
 
 class FileManagerApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, profile=None, metrics=None):
         super().__init__()
+        self.profile = profile
+        # Время горячих путей и вызовы файловой системы (Помощь → Диагностика)
+        self.metrics = metrics or Metrics()
         self.setWindowTitle("Файловый менеджер")
         self.resize(1000, 700)
 
-        # Корневая папка main
-        self.root_path = os.path.join(os.getcwd(), "main")
-        os.makedirs(self.root_path, exist_ok=True)
-        self.current_path = self.root_path
-
+        # Корневая папка и текущая папка — состояние сессии командного ядра.
+        # У каждой вкладки своя сессия; пул обхода, кэши и очередь операций у них
+        # общие. self.engine — сессия открытой вкладки
+        self.engine = CommandEngine(os.path.join(os.getcwd(), "main"))
+        self.sessions = [self.engine]
+
+        # Фоновое чтение текущей папки
+        self.listing_generation = 0
+        self.listing_worker = None
+        self.listing_span = None
+
+        # Групповое переименование
+        self.rename_worker = None
+
+        # Индексы метаданных корней (первый открывается после показа окна)
+        self.index_worker = None
+        self.index_update_pending = False
+
+        # Индекс содержимого файлов обновляется следом за индексом метаданных
+        self.text_index_worker = None
+        self.text_index_pending = False
+        self.text_index_span = None
+
+        # Наблюдатель за текущей папкой: изменения правят панель по записям
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.watching = False
+        self.changed_dirs = set()
+        self.change_timer = QTimer(self)
+        self.change_timer.setSingleShot(True)
+        self.change_timer.setInterval(WATCH_DEBOUNCE_MS)
+        self.change_timer.timeout.connect(self.flush_dir_changes)
+
+        # Размер текущей папки и её подпапок
+        self.rollup_generation = 0
+        self.rollup_worker = None
+
+        # Очередь копирования, перемещения и удаления; панель создаётся при первой операции
+        self.operation_signals = OperationSignals(self)
+        self.operation_signals.updated.connect(self.on_operation_updated)
+        self.engine.operations.on_update = self.operation_signals.updated.emit
+        self.operations_panel = None
+        self.reported_operations = set()
+
+        # Просмотр файла; панель создаётся при первом выборе файла
+        self.preview_panel = None
+        self.preview_generation = 0
+        self.line_index_worker = None
+        self.line_index_span = None
+
+        # Поиск по именам
+        self.search_generation = 0
+        self.search_worker = None
+
+        self.model = None
+        self.started = False  # finish_startup ещё не выполнялся
         self.setup_ui()
+        self.mark_startup("окно построено")
+
+        # Модель файловой системы, индекс и первое чтение папки — после того,
+        # как каркас окна будет показан
+        QTimer.singleShot(0, self.finish_startup)
+
+    def mark_startup(self, name):
+        if self.profile is not None:
+            self.profile.mark(name)
+
+    def finish_startup(self):
+        self.mark_startup("каркас окна показан")
+
         self.setup_file_system()
+        self.mark_startup("модель файловой системы")
+
+        self.engine.index = self.open_index(self.root_path)
+        self.mark_startup("индекс открыт")
+
+        # Прерванный пакет переименований предлагаем довести или откатить
+        self.check_rename_journal()
+        self.schedule_index_update()
+        self.started = True
 
     def setup_ui(self):
         # Центральный виджет
@@ -96,13 +380,30 @@ class FileManagerApp(QMainWindow):
         self.refresh_button.clicked.connect(self.refresh_view)
         self.refresh_button.setFixedWidth(80)
 
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Поиск: *.txt или re:выражение")
+        self.search_input.setFixedWidth(250)
+        self.search_input.returnPressed.connect(self.on_search_entered)
+
         path_layout.addWidget(self.path_label)
         path_layout.addStretch()
+        path_layout.addWidget(self.search_input)
         path_layout.addWidget(self.up_button)
         path_layout.addWidget(self.refresh_button)
 
         main_layout.addLayout(path_layout)
 
+        # Вкладки; при одной вкладке полоса скрыта
+        self.tab_bar = QTabBar()
+        self.tab_bar.setTabsClosable(True)
+        self.tab_bar.setExpanding(False)
+        self.tab_bar.setDocumentMode(True)
+        self.tab_bar.setAutoHide(True)
+        self.tab_bar.addTab(self.tab_title(self.engine))
+        self.tab_bar.currentChanged.connect(self.on_tab_changed)
+        self.tab_bar.tabCloseRequested.connect(self.close_tab)
+        main_layout.addWidget(self.tab_bar)
+
         # Splitter для дерева файлов и информации
         splitter = QSplitter(Qt.Horizontal)
 
@@ -129,11 +430,46 @@ class FileManagerApp(QMainWindow):
 
         right_layout.addWidget(QLabel("Информация о папке:"))
 
+        self.dir_header_label = QLabel()
+        self.dir_header_label.setFont(QFont("Consolas", 10))
+        right_layout.addWidget(self.dir_header_label)
+
+        self.totals_label = QLabel()
+        self.totals_label.setFont(QFont("Consolas", 10))
+        right_layout.addWidget(self.totals_label)
+
+        # Содержимое папки: строки создаются только для видимой области
+        self.entry_model = DirEntryModel(self)
+        self.entry_view = QTableView()
+        self.entry_view.setFont(QFont("Consolas", 10))
+        self.entry_view.setModel(self.entry_model)
+        self.entry_view.setShowGrid(False)
+        self.entry_view.setWordWrap(False)
+        self.entry_view.setSelectionBehavior(QTableView.SelectRows)
+        self.entry_view.setEditTriggers(QTableView.NoEditTriggers)
+        self.entry_view.verticalHeader().hide()
+        # Фиксированная высота строк: представлению не нужно измерять каждую строку
+        self.entry_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.entry_view.verticalHeader().setDefaultSectionSize(
+            self.entry_view.fontMetrics().height() + 4)
+        self.entry_view.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        # Без индикатора сортировки — исходный порядок: папки, затем файлы
+        self.entry_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.entry_view.setSortingEnabled(True)
+        self.entry_view.doubleClicked.connect(self.on_entry_double_clicked)
+        self.entry_view.selectionModel().currentRowChanged.connect(self.on_entry_current_changed)
+
+        # Вывод команд, результатов поиска и справки
         self.info_text = QTextEdit()
         self.info_text.setFont(QFont("Consolas", 10))
         self.info_text.setReadOnly(True)
 
-        right_layout.addWidget(self.info_text)
+        right_splitter = QSplitter(Qt.Vertical)
+        right_splitter.addWidget(self.entry_view)
+        right_splitter.addWidget(self.info_text)
+        right_splitter.setSizes([450, 200])
+
+        right_layout.addWidget(right_splitter)
 
         # Командная строка
         command_layout = QHBoxLayout()
@@ -162,11 +498,22 @@ class FileManagerApp(QMainWindow):
         self.create_menu()
 
     def create_menu(self):
-        menubar = self.menuBar()
+        # Пункты меню создаются при первом открытии
+        self.add_lazy_menu("Файл", self.fill_file_menu)
+        self.add_lazy_menu("Правка", self.fill_edit_menu)
+        self.add_lazy_menu("Помощь", self.fill_help_menu)
+
+    def add_lazy_menu(self, title, fill):
+        menu = self.menuBar().addMenu(title)
+
+        def on_first_show():
+            menu.aboutToShow.disconnect(on_first_show)
+            fill(menu)
 
-        # Меню Файл
-        file_menu = menubar.addMenu("Файл")
+        menu.aboutToShow.connect(on_first_show)
+        return menu
 
+    def fill_file_menu(self, file_menu):
         new_folder_action = QAction("Создать папку", self)
         new_folder_action.triggered.connect(self.create_new_folder)
         file_menu.addAction(new_folder_action)
@@ -176,6 +523,28 @@ class FileManagerApp(QMainWindow):
         group_rename_action.triggered.connect(self.group_rename_selected)
         file_menu.addAction(group_rename_action)
 
+        rule_rename_action = QAction("Переименование по шаблону...", self)
+        rule_rename_action.triggered.connect(self.rule_rename)
+        file_menu.addAction(rule_rename_action)
+
+        duplicates_action = QAction("Найти дубликаты", self)
+        duplicates_action.triggered.connect(self.find_duplicates)
+        file_menu.addAction(duplicates_action)
+
+        file_menu.addSeparator()
+
+        new_tab_action = QAction("Новая вкладка", self)
+        new_tab_action.triggered.connect(lambda: self.open_tab())
+        file_menu.addAction(new_tab_action)
+
+        open_root_action = QAction("Открыть папку во вкладке...", self)
+        open_root_action.triggered.connect(self.open_root_tab)
+        file_menu.addAction(open_root_action)
+
+        close_tab_action = QAction("Закрыть вкладку", self)
+        close_tab_action.triggered.connect(lambda: self.close_tab(self.tab_bar.currentIndex()))
+        file_menu.addAction(close_tab_action)
+
         file_menu.addSeparator()
 
         refresh_action = QAction("Обновить", self)
@@ -186,80 +555,440 @@ class FileManagerApp(QMainWindow):
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
 
-        # Меню Помощь
-        help_menu = menubar.addMenu("Помощь")
+    def fill_edit_menu(self, edit_menu):
+        undo_action = QAction(self)
+        undo_action.triggered.connect(lambda: self.run_history_command("отмена"))
+        edit_menu.addAction(undo_action)
+
+        redo_action = QAction(self)
+        redo_action.triggered.connect(lambda: self.run_history_command("повтор"))
+        edit_menu.addAction(redo_action)
 
+        def update_actions():
+            # Пункты называют пакет, который будет отменён или повторён
+            for action, group, title in (
+                    (undo_action, self.engine.history.next_undo(), "Отменить"),
+                    (redo_action, self.engine.history.next_redo(), "Повторить")):
+                action.setEnabled(group is not None and self.rename_worker is None)
+                action.setText(f"{title}: {group.title}" if group is not None
+                               else f"{title} переименование")
+
+        update_actions()
+        edit_menu.aboutToShow.connect(update_actions)
+
+    def run_history_command(self, command):
+        self.info_text.append(f"> {command}")
+        self.start_rename(lambda progress: self.engine.execute(command, progress=progress),
+                          self.show_command_result)
+
+    def fill_help_menu(self, help_menu):
         help_action = QAction("Справка по командам", self)
         help_action.triggered.connect(self.show_help)
         help_menu.addAction(help_action)
 
+        diagnostics_action = QAction("Диагностика", self)
+        diagnostics_action.triggered.connect(self.show_diagnostics)
+        help_menu.addAction(diagnostics_action)
+
     def setup_file_system(self):
-        # Модель файловой системы
-        self.model = QFileSystemModel()
-        self.model.setRootPath(self.root_path)
-        self.model.setNameFilters([])  # Показывать все файлы
-        self.model.setNameFilterDisables(False)
+        # Модель дерева: папки читаются при раскрытии через общий кэш и пул обхода
+        self.model = DirTreeModel(self.engine.listings, self.engine.scan_pool, parent=self)
+        self.model.set_root(self.root_path)
 
         self.tree_view.setModel(self.model)
-        self.tree_view.setRootIndex(self.model.index(self.root_path))
-
-        # Скрываем колонки размера, типа и даты изменения
-        self.tree_view.hideColumn(1)  # Размер
-        self.tree_view.hideColumn(2)  # Тип
-        self.tree_view.hideColumn(3)  # Дата изменения
+        self.tree_view.expanded.connect(self.model.on_expanded)
+        self.tree_view.collapsed.connect(self.model.on_collapsed)
+        self.tree_view.selectionModel().currentChanged.connect(self.on_tree_current_changed)
+        self.show_tree_at(self.current_path)
 
         self.update_info()
 
+    def show_tree_at(self, path):
+        """Показывает в дереве содержимое папки path; её поддерево не выгружается"""
+        index = self.model.path_index(path)
+        self.model.pin(path)
+        self.tree_view.setRootIndex(index)
+
+    @property
+    def root_path(self):
+        return self.engine.root_path
+
+    @property
+    def index(self):
+        return self.engine.index
+
+    @property
+    def rename_journal_path(self):
+        return self.engine.rename_journal_path
+
+    @property
+    def current_path(self):
+        return self.engine.current_path
+
+    @current_path.setter
+    def current_path(self, path):
+        self.engine.current_path = path
+
     def get_relative_path(self):
-        rel_path = os.path.relpath(self.current_path, start=self.root_path)
-        return rel_path if rel_path != "." else "main"
+        return self.engine.get_relative_path()
+
+    def open_index(self, root_path):
+        return MetadataIndex(root_path, get_state_file(root_path, INDEX_FILE_NAME))
+
+    @staticmethod
+    def tab_title(session):
+        return os.path.basename(session.current_path) or session.current_path
+
+    def open_tab(self, root_path=None):
+        """Новая вкладка: копия открытой или с корнем root_path
+
+        Сессии одного корня делят индексы; папки, уже прочитанные в других
+        вкладках, берутся из общего кэша.
+        """
+        if not self.started:
+            return
+        new_root = False
+        if root_path is None:
+            session = self.engine.new_session()
+        else:
+            root_path = os.path.abspath(root_path)
+            same_root = next((s for s in self.sessions if s.root_path == root_path), None)
+            if same_root is not None:
+                session = same_root.new_session()
+                session.current_path = session.root_path
+            else:
+                session = self.engine.new_session(root_path)
+                session.index = self.open_index(session.root_path)
+                new_root = True
+
+        self.sessions.append(session)
+        self.tab_bar.setCurrentIndex(self.tab_bar.addTab(self.tab_title(session)))
+        if new_root:
+            self.check_rename_journal()
+
+    def open_root_tab(self):
+        path = QFileDialog.getExistingDirectory(self, "Открыть папку во вкладке", self.root_path)
+        if path:
+            self.open_tab(path)
+
+    def close_tab(self, position):
+        if len(self.sessions) < 2 or position < 0:
+            return
+        session = self.sessions.pop(position)
+        self.tab_bar.removeTab(position)  # Переключит вкладку, если закрыта открытая
+        if not any(s.root_path == session.root_path for s in self.sessions):
+            # Последняя вкладка этого корня: соединения потока окна больше не нужны
+            session.index.close()
+            session.text_index.close()
+
+    def on_tab_changed(self, position):
+        if position < 0 or self.sessions[position] is self.engine:
+            return
+
+        self.cancel_dir_listing()
+        self.cancel_rollup()
+        # Результаты поиска относятся к папке прежней вкладки
+        if self.cancel_search():
+            self.info_text.append("⏹ Поиск остановлен.")
+        self.engine = self.sessions[position]
+        if self.model is not None:
+            if self.model.root_path != self.root_path:
+                self.model.set_root(self.root_path)
+            self.show_tree_at(self.current_path)
+            self.update_info()
+            self.schedule_index_update()
 
     def update_info(self):
-        self.path_label.setText(f"Текущий путь: {self.get_relative_path()}")
-        self.show_dir_info()
+        with self.metrics.measure("update_info"):
+            self.path_label.setText(f"Текущий путь: {self.get_relative_path()}")
+            position = self.sessions.index(self.engine)
+            self.tab_bar.setTabText(position, self.tab_title(self.engine))
+            self.tab_bar.setTabToolTip(position, self.current_path)
+            self.watch_current_dir()
+            self.show_dir_info()
+
+    def watch_current_dir(self):
+        """Переключает наблюдатель на текущую папку"""
+        watched = self.watcher.directories()
+        if watched == [self.current_path]:
+            return
+        if watched:
+            self.watcher.removePaths(watched)
+        self.changed_dirs.clear()
+        self.watching = self.watcher.addPath(self.current_path)
+
+    def on_directory_changed(self, path):
+        # События копятся и обрабатываются одной пачкой по таймеру
+        self.changed_dirs.add(path)
+        if not self.change_timer.isActive():
+            self.change_timer.start()
+
+    def refresh_changed_dir(self, dirs=()):
+        """Вызывается после собственных изменений в текущей папке
+
+        dirs — другие затронутые папки: наблюдатель следит только за текущей,
+        а дерево может показывать их раскрытыми.
+        """
+        if self.watching:
+            for path in dirs:
+                self.changed_dirs.add(os.path.normpath(path))
+            self.on_directory_changed(self.current_path)
+        else:
+            self.refresh_view()  # Наблюдатель недоступен — полное обновление
+
+    def flush_dir_changes(self):
+        changed = self.changed_dirs
+        self.changed_dirs = set()
+        for path in changed:
+            self.model.refresh_dir(path)
+        if self.current_path not in changed:
+            return
+
+        if not os.path.isdir(self.current_path):
+            # Текущую папку удалили — поднимаемся до существующей
+            path = self.current_path
+            while path != self.root_path and not os.path.isdir(path):
+                path = os.path.dirname(path)
+            self.open_directory(path)
+            return
+
+        if self.listing_worker is not None or self.index is None:
+            self.show_dir_info()  # Чтение ещё идёт — проще начать заново
+            return
+
+        worker = DirPatchWorker(self.listing_generation, self.current_path, self.index, self)
+        worker.patch_ready.connect(self.on_dir_patch_ready)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    def on_dir_patch_ready(self, generation, path, entries):
+        if generation != self.listing_generation or self.listing_worker is not None:
+            return  # Панель уже перестраивается
+
+        new_entries = dict(entries)
+        old_entries = self.entry_model.entry_map()
+        removed = [name for name, is_dir in old_entries.items()
+                   if new_entries.get(name) != is_dir]
+        added = [(name, is_dir) for name, is_dir in new_entries.items()
+                 if old_entries.get(name) != is_dir]
+        if not removed and not added:
+            return
+
+        if (not old_entries or not new_entries
+                or len(removed) + len(added) > PATCH_MAX_CHANGES):
+            self.show_dir_info()
+            return
+
+        self.entry_model.remove_names(removed)
+        self.entry_model.insert_entries(added)
+        self.start_rollup()
 
     def show_dir_info(self):
-        rel = self.get_relative_path()
-        info_text = f"📂 Текущая директория: {rel}\n\n"
+        """Запускает фоновое чтение текущей папки, записи добавляются в панель порциями"""
+        self.cancel_dir_listing()
+        # Замер идёт до конца фонового чтения
+        self.listing_span = self.metrics.start("show_dir_info")
+
+        self.dir_header_label.setText(f"📂 Текущая директория: {self.get_relative_path()}")
+        self.entry_model.clear()
+
+        worker = DirListingWorker(self.listing_generation, self.current_path, self.index,
+                                  self.engine.listings, span=self.listing_span, parent=self)
+        worker.chunk_ready.connect(self.on_listing_chunk)
+        worker.listing_done.connect(self.on_listing_done)
+        worker.listing_failed.connect(self.on_listing_failed)
+        worker.finished.connect(worker.deleteLater)
+        self.listing_worker = worker
+        worker.start()
+
+        self.totals_label.setText("📊 Подсчёт размера...")
+        self.start_rollup()
+
+    def start_rollup(self):
+        """Пересчитывает размер текущей папки; неизменившиеся ветки берутся из кэша"""
+        self.cancel_rollup()
+
+        worker = RollupWorker(self.rollup_generation, self.engine.rollup, self.current_path, self)
+        worker.rollup_ready.connect(self.on_rollup_ready)
+        worker.finished.connect(worker.deleteLater)
+        self.rollup_worker = worker
+        worker.start()
+
+    def cancel_rollup(self):
+        self.rollup_generation += 1
+        if self.rollup_worker is not None:
+            self.rollup_worker.requestInterruption()
+            self.rollup_worker = None
+
+    def on_rollup_ready(self, generation, result):
+        if generation != self.rollup_generation:
+            return
 
-        try:
-            entries = os.listdir(self.current_path)
-            if not entries:
-                info_text += " (папка пуста)"
-            else:
-                dirs = [e for e in entries if os.path.isdir(os.path.join(self.current_path, e))]
-                files = [e for e in entries if os.path.isfile(os.path.join(self.current_path, e))]
+        self.rollup_worker = None
+        if result is None:
+            self.totals_label.setText("📊 Размер недоступен")
+            return
+        self.totals_label.setText("\n".join(format_rollup_lines(result)))
+
+    def schedule_index_update(self):
+        """Запускает обновление индекса; повторный вызов во время обновления даст ещё один проход"""
+        if self.index is None:
+            return  # Индекс ещё не открыт — первый проход запустит finish_startup
+        if self.index_worker is not None:
+            self.index_update_pending = True
+            return
 
-                info_text += "📁 Папки:\n"
-                for d in dirs:
-                    info_text += f"  📂 {d}\n"
+        self.index_update_pending = False
+        worker = IndexUpdateWorker(self.index, self)
+        worker.index_updated.connect(self.on_index_updated)
+        worker.finished.connect(worker.deleteLater)
+        self.index_worker = worker
+        worker.start()
+
+    def on_index_updated(self, checked, refreshed):
+        self.index_worker = None
+        if refreshed:
+            self.statusBar().showMessage(
+                f"Индекс обновлён: проверено папок {checked}, перечитано {refreshed}", 3000)
+        if self.index_update_pending:
+            self.schedule_index_update()
+        else:
+            self.schedule_text_index_update()
 
-                info_text += "\n📄 Файлы:\n"
-                for f in files:
-                    ext = os.path.splitext(f)[1] or "(без расширения)"
-                    info_text += f"  📄 {f} — {ext}\n"
+    def schedule_text_index_update(self):
+        """Запускает обновление индекса содержимого; как schedule_index_update"""
+        if self.text_index_worker is not None:
+            self.text_index_pending = True
+            return
 
-        except PermissionError:
-            info_text += "❌ Нет доступа к этой папке"
+        self.text_index_pending = False
+        self.text_index_span = self.metrics.start("индекс содержимого")
+        worker = TextIndexWorker(self.engine.text_index, span=self.text_index_span, parent=self)
+        worker.text_index_updated.connect(self.on_text_index_updated)
+        worker.finished.connect(worker.deleteLater)
+        self.text_index_worker = worker
+        worker.start()
+
+    def on_text_index_updated(self, stats):
+        self.text_index_worker = None
+        if stats is not None:
+            self.metrics.finish(self.text_index_span, files=stats.files, indexed=stats.indexed)
+            if stats.indexed or stats.removed:
+                self.statusBar().showMessage(
+                    f"Индекс содержимого обновлён: разобрано файлов {stats.indexed}, "
+                    f"убрано {stats.removed}", 3000)
+        self.text_index_span = None
+        if self.text_index_pending:
+            self.schedule_text_index_update()
+
+    def on_search_entered(self):
+        pattern = self.search_input.text().strip()
+        if not pattern:
+            self.cancel_search()
+            return
+
+        self.info_text.append(f"🔍 Поиск: {pattern}")
+        self.start_search(lambda on_matches, is_cancelled: self.engine.find(
+            CommandResult(f"поиск {pattern}"), pattern, DEFAULT_SEARCH_LIMIT,
+            on_matches, is_cancelled))
+
+    def start_search(self, job):
+        """Запускает поиск в фоне, совпадения дописываются в панель по мере нахождения"""
+        self.cancel_search()
+
+        worker = SearchWorker(self.search_generation, job,
+                              (self.index, self.engine.text_index), self)
+        worker.matches_found.connect(self.on_search_matches)
+        worker.search_done.connect(self.on_search_done)
+        worker.finished.connect(worker.deleteLater)
+        self.search_worker = worker
+        worker.start()
+
+    def find_duplicates(self):
+        """Поиск одинаковых файлов во всём main в фоне; итог — в панели информации"""
+        self.info_text.append("🔍 Поиск дубликатов...")
+        self.start_search(lambda on_matches, is_cancelled: self.engine.execute(
+            "дубли", is_cancelled=is_cancelled))
+
+    def cancel_search(self):
+        """Останавливает поиск; возвращает True, если он шёл"""
+        self.search_generation += 1  # Поздние совпадения будут отброшены
+        if self.search_worker is None:
+            return False
+        self.search_worker.requestInterruption()
+        self.search_worker = None
+        return True
+
+    def on_search_matches(self, generation, matches):
+        if generation == self.search_generation:
+            self.info_text.append(format_search_lines(matches))
+
+    def on_search_done(self, generation, result):
+        if generation != self.search_generation:
+            return
+
+        self.search_worker = None
+        self.show_command_result(result)
+
+    def cancel_dir_listing(self):
+        """Останавливает чтение папки, если оно ещё не закончилось"""
+        self.listing_generation += 1  # Порции от прежнего чтения будут отброшены
+        self.listing_span = None
+        if self.listing_worker is not None:
+            self.listing_worker.requestInterruption()
+            self.listing_worker = None
+
+    def on_listing_chunk(self, generation, chunk):
+        if generation != self.listing_generation:
+            return  # Ответ от уже отменённого чтения
+        self.entry_model.append_entries(chunk)
 
-        self.info_text.setText(info_text)
+    def on_listing_done(self, generation, total):
+        if generation != self.listing_generation:
+            return
+
+        if self.profile is not None and not self.profile.reported:
+            self.mark_startup("первое чтение папки")
+            self.profile.report()
+
+        self.listing_worker = None
+        self.finish_listing_span(entries=total)
+        self.entry_model.finish_loading()
+        if total == 0:
+            self.dir_header_label.setText(
+                f"📂 Текущая директория: {self.get_relative_path()} (папка пуста)")
+
+    def on_listing_failed(self, generation, message):
+        if generation != self.listing_generation:
+            return
+
+        self.listing_worker = None
+        self.finish_listing_span(failed=True)
+        self.dir_header_label.setText(
+            f"📂 Текущая директория: {self.get_relative_path()}\n{message}")
+
+    def finish_listing_span(self, **extra):
+        if self.listing_span is not None:
+            self.metrics.finish(self.listing_span, **extra)
+            self.listing_span = None
+
+    def on_entry_double_clicked(self, index):
+        name, is_dir = self.entry_model.entry(index.row())
+        if is_dir:
+            self.open_directory(os.path.join(self.current_path, name))
 
     def go_up(self):
-        parent = os.path.dirname(self.current_path)
-        if os.path.commonpath([parent, self.root_path]) != self.root_path:
-            QMessageBox.warning(self, "Ошибка", "Нельзя подняться выше 'main'.")
-        elif parent == self.current_path:
-            QMessageBox.information(self, "Информация", "Вы уже в корне дерева.")
+        result = self.engine.go_up(CommandResult("нд"))
+        if result.ok:
+            self.show_command_result(result)
         else:
-            self.current_path = parent
-            self.tree_view.setRootIndex(self.model.index(self.current_path))
-            self.update_info()
+            QMessageBox.warning(self, "Ошибка", result.lines[-1].lstrip("❌ "))
 
     def on_item_double_clicked(self, index):
         path = self.model.filePath(index)
         if os.path.isdir(path):
             self.current_path = path
-            self.tree_view.setRootIndex(index)
+            self.show_tree_at(path)
             self.update_info()
 
     def show_context_menu(self, position):
@@ -283,6 +1012,18 @@ class FileManagerApp(QMainWindow):
             rename_action.triggered.connect(lambda: self.rename_item(path))
             menu.addAction(rename_action)
 
+            preview_action = QAction("Просмотр", self)
+            preview_action.triggered.connect(lambda: self.show_preview(path, force=True))
+            menu.addAction(preview_action)
+
+        menu.addSeparator()
+        paths = self.selected_tree_paths() or [path]
+        for title, kind in (("Копировать в...", COPY), ("Переместить в...", MOVE),
+                            ("Удалить", DELETE)):
+            action = QAction(title, self)
+            action.triggered.connect(lambda checked=False, kind=kind: self.operate_on(kind, paths))
+            menu.addAction(action)
+
         # Добавляем действие для группового переименования выделенных файлов
         selected_indexes = self.tree_view.selectionModel().selectedIndexes()
         if len(selected_indexes) > 1:
@@ -292,16 +1033,159 @@ class FileManagerApp(QMainWindow):
 
         menu.exec_(self.tree_view.viewport().mapToGlobal(position))
 
+    def selected_tree_paths(self):
+        return [self.model.filePath(index)
+                for index in self.tree_view.selectionModel().selectedIndexes()
+                if index.column() == 0]
+
+    def operate_on(self, kind, paths):
+        """Копирование, перемещение или удаление paths через очередь операций"""
+        destination = None
+        if kind == DELETE:
+            names = ", ".join(os.path.basename(p) for p in paths[:5])
+            if len(paths) > 5:
+                names += f" и ещё {len(paths) - 5}"
+            answer = QMessageBox.question(self, "Удаление", f"Удалить {names}?")
+            if answer != QMessageBox.Yes:
+                return
+        else:
+            destination = QFileDialog.getExistingDirectory(self, "Папка назначения",
+                                                           self.current_path)
+            if not destination:
+                return
+
+        result = CommandResult("операция")
+        operation = self.engine.check_operation(result, kind, paths, destination)
+        if operation is None:
+            QMessageBox.warning(self, "Ошибка", result.lines[-1].lstrip("❌ "))
+            return
+        self.start_operation(operation)
+
+    def start_operation(self, operation):
+        self.close_preview()
+        if self.operations_panel is None:
+            from fs_dialogs import OperationsPanel
+
+            self.operations_panel = OperationsPanel(self.engine.operations)
+            dock = QDockWidget("Операции", self)
+            dock.setWidget(self.operations_panel)
+            self.addDockWidget(Qt.BottomDockWidgetArea, dock)
+        self.operations_panel.parentWidget().show()
+        self.info_text.append(f"⏳ {operation.title}")
+        self.engine.operations.submit(operation)
+
+    def on_operation_updated(self, operation):
+        if self.operations_panel is not None:
+            self.operations_panel.update_operation(operation)
+        # Состояние читается при доставке: поздние сигналы хода уже видят завершение
+        if operation.finished and operation.id not in self.reported_operations:
+            self.reported_operations.add(operation.id)
+            result = self.engine.report_operation(CommandResult(operation.title), operation)
+            self.info_text.append("\n".join(result.lines))
+            dirs = {os.path.dirname(path) for path in operation.sources}
+            if operation.destination is not None:
+                dirs.add(operation.destination)
+            self.refresh_changed_dir(dirs)
+            self.schedule_index_update()
+
+    def on_tree_current_changed(self, current, previous):
+        if current.isValid() and not self.model.isDir(current):
+            self.show_preview(self.model.filePath(current))
+
+    def on_entry_current_changed(self, current, previous):
+        if not current.isValid():
+            return
+        name, is_dir = self.entry_model.entry(current.row())
+        if not is_dir:
+            self.show_preview(os.path.join(self.current_path, name))
+
+    def show_preview(self, path, force=False):
+        """Показывает файл в панели просмотра; закрытую панель открывает только force"""
+        if self.preview_panel is None:
+            from fs_dialogs import PreviewPanel
+
+            self.preview_panel = PreviewPanel()
+            self.preview_panel.mode_changed.connect(self.on_preview_mode_changed)
+            dock = QDockWidget("Просмотр", self)
+            dock.setWidget(self.preview_panel)
+            dock.visibilityChanged.connect(self.on_preview_visibility_changed)
+            self.addDockWidget(Qt.RightDockWidgetArea, dock)
+        elif self.preview_panel.parentWidget().isHidden():
+            if not force:
+                return
+            self.preview_panel.parentWidget().show()
+
+        self.cancel_line_index()
+        with self.metrics.measure("просмотр файла"):
+            preview = self.preview_panel.show_file(path)
+        if preview is not None and not preview.is_binary:
+            self.start_line_index()
+
+    def start_line_index(self):
+        preview = self.preview_panel.preview
+        if preview.complete:
+            return
+        self.line_index_span = self.metrics.start("индекс строк")
+        worker = LineIndexWorker(self.preview_generation, preview.path, span=self.line_index_span,
+                                 parent=self)
+        worker.lines_found.connect(self.on_lines_found)
+        worker.finished.connect(lambda: self.on_line_index_finished(worker))
+        worker.finished.connect(worker.deleteLater)
+        self.line_index_worker = worker
+        worker.start()
+
+    def on_line_index_finished(self, worker):
+        # Ссылка держится до конца потока: до тех пор у него открыто своё отображение файла
+        if worker is self.line_index_worker:
+            self.line_index_worker = None
+
+    def cancel_line_index(self):
+        """Останавливает индекс строк и ждёт поток: после этого файл им не отображён"""
+        self.preview_generation += 1
+        self.line_index_span = None
+        worker = self.line_index_worker
+        if worker is not None:
+            self.line_index_worker = None
+            worker.requestInterruption()
+            worker.wait()  # Прерывание проверяется между порциями по SCAN_BLOCK_BYTES
+
+    def on_lines_found(self, generation, checkpoints, line_count, complete):
+        if generation != self.preview_generation:
+            return
+        self.preview_panel.add_lines(checkpoints, line_count, complete)
+        if complete:
+            self.metrics.finish(self.line_index_span, lines=line_count)
+            self.line_index_span = None
+
+    def on_preview_mode_changed(self, hex_mode):
+        if not hex_mode and self.line_index_worker is None:
+            self.start_line_index()
+
+    def on_preview_visibility_changed(self, visible):
+        if not visible and self.preview_panel.parentWidget().isHidden():
+            self.close_preview()
+
+    def close_preview(self):
+        """Освобождает файл панели просмотра: отображённый в память файл
+        на Windows нельзя переименовать, переместить или удалить"""
+        if self.preview_panel is not None:
+            self.cancel_line_index()
+            self.preview_panel.close_file()
+
     def rename_item(self, path):
         current_name = os.path.basename(path)
+        from fs_dialogs import RenameDialog  # Модуль диалогов загружается при первом использовании
+
         dialog = RenameDialog(current_name, self)
         if dialog.exec_() == QDialog.Accepted:
             new_name = dialog.get_new_name()
             if new_name and new_name != current_name:
+                self.close_preview()
                 try:
                     new_path = os.path.join(os.path.dirname(path), new_name)
-                    os.rename(path, new_path)
-                    self.refresh_view()
+                    self.engine.rename_path(path, new_path,
+                                            f"Переименование: {current_name} → {new_name}")
+                    self.refresh_changed_dir([os.path.dirname(path)])
                     QMessageBox.information(self, "Успех", f"Успешно переименовано в: {new_name}")
                 except Exception as e:
                     QMessageBox.critical(self, "Ошибка", f"Не удалось переименовать: {e}")
@@ -325,6 +1209,8 @@ class FileManagerApp(QMainWindow):
         # Сортируем файлы по имени для последовательной нумерации
         file_paths.sort()
 
+        from fs_dialogs import GroupRenameDialog
+
         dialog = GroupRenameDialog(len(file_paths), self)
         if dialog.exec_() == QDialog.Accepted:
             new_base_name = dialog.get_new_name()
@@ -334,40 +1220,97 @@ class FileManagerApp(QMainWindow):
 
             self.perform_group_rename(file_paths, new_base_name)
 
+    def rule_rename(self):
+        """Переименование файлов текущей папки по правилу с предпросмотром"""
+        from fs_dialogs import RuleRenameDialog
+
+        dialog = RuleRenameDialog(self.engine.preview_rule, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+
+        # План строится заново: пока диалог был открыт, папка могла измениться
+        pattern, template = dialog.get_rule()
+        directory = self.current_path
+        self.start_rename(
+            lambda progress: self.engine.run_plan(
+                self.engine.preview_rule(pattern, template, directory).plan,
+                f"Переименование по шаблону: {pattern} → {template}", progress),
+            self.show_rename_result)
+
     def perform_group_rename(self, file_paths, new_base_name):
         """Выполняет групповое переименование файлов"""
-        success_count = 0
-        warning_messages = []
-
-        for i, old_path in enumerate(file_paths, 1):
-            if not os.path.exists(old_path):
-                warning_messages.append(f"Файл не существует: {os.path.basename(old_path)}")
-                continue
+        pairs = group_rename_pairs(file_paths, new_base_name)
+        listdir = self.engine.listings.listdir
+        span = self.metrics.start("perform_group_rename")
+
+        def on_done(result):
+            self.metrics.finish(span, files=len(pairs), renamed=result.success_count)
+            self.show_rename_result(result)
+
+        def rename(progress):
+            with span.track():
+                return self.engine.run_plan(plan_renames(pairs, listdir), title, progress)
+
+        title = f"Групповое переименование: {new_base_name} ({len(pairs)} файлов)"
+        self.start_rename(rename, on_done)
+
+    def start_rename(self, action, on_done):
+        """Запускает пакет переименований в фоне; on_done(result) вызывается по завершении"""
+        if self.rename_worker is not None:
+            QMessageBox.information(self, "Информация",
+                                    "Дождитесь завершения текущего переименования.")
+            return
 
-            # Получаем расширение файла
-            _, ext = os.path.splitext(old_path)
+        self.close_preview()
+        worker = RenameWorker(action, self)
+        worker.progress.connect(self.on_rename_progress)
+        worker.rename_done.connect(lambda result: self.on_rename_done(result, on_done))
+        worker.finished.connect(worker.deleteLater)
+        self.rename_worker = worker
+        self.statusBar().showMessage("Переименование...")
+        worker.start()
 
-            # Формируем новое имя: базовое_имя_номер.расширение
-            new_name = f"{new_base_name}_{i}{ext}"
-            new_path = os.path.join(os.path.dirname(old_path), new_name)
+    def on_rename_progress(self, done, total):
+        self.statusBar().showMessage(f"Переименование: {done}/{total}")
 
-            try:
-                os.rename(old_path, new_path)
-                success_count += 1
-            except Exception as e:
-                warning_messages.append(f"Ошибка переименования {os.path.basename(old_path)}: {e}")
+    def on_rename_done(self, result, on_done):
+        self.rename_worker = None
+        self.statusBar().clearMessage()
+        on_done(result)
 
+    def show_rename_result(self, result):
         # Показываем результаты
-        result_message = f"Успешно переименовано: {success_count} файлов"
-        if warning_messages:
-            result_message += f"\n\nПредупреждения:\n" + "\n".join(warning_messages)
+        result_message = f"Успешно переименовано: {result.success_count} файлов"
+        if result.warnings:
+            result_message += f"\n\nПредупреждения:\n" + "\n".join(result.warnings)
 
         QMessageBox.information(self, "Результат", result_message)
-        self.refresh_view()
+        self.refresh_changed_dir({os.path.dirname(path) for pair in result.renamed
+                                  for path in pair})
+
+    def check_rename_journal(self):
+        """Предлагает продолжить или откатить пакет, прерванный сбоем"""
+        if not has_pending_journal(self.rename_journal_path):
+            return
+
+        box = QMessageBox(self)
+        box.setWindowTitle("Прерванное переименование")
+        box.setText("Предыдущее групповое переименование не было завершено.")
+        resume_button = box.addButton("Продолжить", QMessageBox.AcceptRole)
+        rollback_button = box.addButton("Откатить", QMessageBox.DestructiveRole)
+        box.addButton("Позже", QMessageBox.RejectRole)
+        box.exec_()
+
+        path = self.rename_journal_path
+        if box.clickedButton() is resume_button:
+            self.start_rename(self.engine.resume_renames, self.show_rename_result)
+        elif box.clickedButton() is rollback_button:
+            self.start_rename(lambda progress: rollback_journal(path, progress),
+                              self.show_rename_result)
 
     def open_directory(self, path):
         self.current_path = path
-        self.tree_view.setRootIndex(self.model.index(path))
+        self.show_tree_at(path)
         self.update_info()
 
     def create_new_folder(self):
@@ -376,15 +1319,17 @@ class FileManagerApp(QMainWindow):
             try:
                 new_folder_path = os.path.join(self.current_path, name)
                 os.makedirs(new_folder_path, exist_ok=True)
-                self.refresh_view()
+                self.refresh_changed_dir()
                 QMessageBox.information(self, "Успех", f"Папка '{name}' создана")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось создать папку: {e}")
 
     def refresh_view(self):
-        self.model.setRootPath(self.root_path)  # Обновляем модель
-        self.tree_view.setRootIndex(self.model.index(self.current_path))
-        self.update_info()
+        with self.metrics.measure("refresh_view"):
+            self.model.refresh_all()  # Сверяем прочитанные папки дерева с диском
+            self.show_tree_at(self.current_path)
+            self.update_info()
+            self.schedule_index_update()
 
     def execute_command(self):
         command = self.command_input.text().strip()
@@ -394,130 +1339,150 @@ class FileManagerApp(QMainWindow):
         self.command_input.clear()
         self.info_text.append(f"> {command}")
 
-        parts = command.split()
-        cmd = parts[0].lower() if parts else ""
-
-        try:
-            if cmd == "выход":
-                self.close()
-
-            elif cmd == "нд":
-                self.go_up()
-
-            elif cmd == "вд":
-                if len(parts) < 2:
-                    self.info_text.append("❌ Укажите имя папки.")
-                    return
-
-                target = os.path.join(self.current_path, parts[1])
-                if os.path.isdir(target):
-                    self.current_path = target
-                    self.tree_view.setRootIndex(self.model.index(self.current_path))
-                    self.update_info()
-                else:
-                    self.info_text.append("❌ Папка не найдена.")
-
-            elif cmd == "имя":
-                if len(parts) < 3:
-                    self.info_text.append("❌ Использование: имя <старое> <новое>")
-                    return
+        cmd, args = parse_command(command)
+        # Неизвестные команды в замерах сводятся в одну строку
+        with self.metrics.measure(f"команда {cmd if cmd in COMMAND_NAMES else '?'}"):
+            self.dispatch_command(command, cmd, args)
 
-                old_name = os.path.join(self.current_path, parts[1])
-                new_name_full = ' '.join(parts[2:])
-                new_name = os.path.join(self.current_path, new_name_full)
+    def dispatch_command(self, command, cmd, args):
+        # Команды, которым в окне нужны диалоги или фоновое выполнение;
+        # остальные целиком выполняет командное ядро
+        if cmd == "выход":
+            self.close()
 
-                if not os.path.exists(old_name):
-                    self.info_text.append("❌ Файл или папка не существует.")
-                    return
+        elif cmd == "нд":
+            self.go_up()
 
-                os.rename(old_name, new_name)
-                self.info_text.append(f"✅ Переименовано: {parts[1]} → {new_name_full}")
-                self.refresh_view()
+        elif cmd == "инфо":
+            self.show_dir_info()
 
-            elif cmd == "имягр":
-                if len(parts) < 3:
-                    self.info_text.append("❌ Использование: имягр <новое> <имя1> <имя2> <имя3> ...")
-                    return
-
-                new_base_name = parts[1]
-                file_names = parts[2:]
-
-                self.execute_group_rename_command(new_base_name, file_names)
-
-            elif cmd == "инфо":
-                self.show_dir_info()
-
-            elif cmd == "помощь":
-                self.show_help()
+        elif cmd == "помощь":
+            self.show_help()
 
+        elif cmd == "поиск":
+            if not args and self.cancel_search():
+                self.info_text.append("⏹ Поиск остановлен.")
+                return
+            self.start_search(lambda on_matches, is_cancelled: self.engine.execute(
+                command, on_matches=on_matches, is_cancelled=is_cancelled))
+
+        elif cmd in ("искать", "дубли", "размер") or (cmd == "имяпр" and args[:1] == ["-n"]):
+            # Пробный прогон имяпр строит полный план — тоже в фоне
+            self.start_search(lambda on_matches, is_cancelled: self.engine.execute(
+                command, is_cancelled=is_cancelled))
+
+        elif cmd in OPERATION_COMMANDS:
+            result = CommandResult(command)
+            operation = self.engine.make_operation(result, cmd, args)
+            if operation is None:
+                self.show_command_result(result)
             else:
-                self.info_text.append("❌ Неизвестная команда.")
-                self.show_help()
+                self.start_operation(operation)
 
-        except Exception as e:
-            self.info_text.append(f"⚠️ Ошибка: {e}")
+        elif cmd in ("имягр", "отмена", "повтор") or (cmd == "имяпр" and args[:1] != ["-n"]):
+            self.start_rename(lambda progress: self.engine.execute(command, progress=progress),
+                              self.show_command_result)
 
-    def execute_group_rename_command(self, new_base_name, file_names):
-        """Выполняет групповое переименование из командной строки"""
-        success_count = 0
-        warning_messages = []
+        elif cmd == "имя":
+            self.close_preview()
+            self.show_command_result(self.engine.execute(command))
 
-        for i, file_name in enumerate(file_names, 1):
-            old_path = os.path.join(self.current_path, file_name)
-
-            if not os.path.exists(old_path):
-                warning_messages.append(f"Файл не существует: {file_name}")
-                continue
-
-            # Получаем расширение файла
-            _, ext = os.path.splitext(old_path)
-
-            # Формируем новое имя: базовое_имя_номер.расширение
-            new_name = f"{new_base_name}_{i}{ext}"
-            new_path = os.path.join(self.current_path, new_name)
-
-            try:
-                os.rename(old_path, new_path)
-                success_count += 1
-                self.info_text.append(f"✅ {file_name} → {new_name}")
-            except Exception as e:
-                warning_messages.append(f"Ошибка переименования {file_name}: {e}")
-
-        # Выводим предупреждения
-        for warning in warning_messages:
-            self.info_text.append(f"⚠️ {warning}")
-
-        if success_count > 0:
-            self.info_text.append(f"✅ Успешно переименовано: {success_count} файлов")
-
-        self.refresh_view()
+        else:
+            self.show_command_result(self.engine.execute(command))
+
+    def show_command_result(self, result):
+        """Выводит результат командного ядра одним вызовом и обновляет вид"""
+        if result.lines:
+            self.info_text.append("\n".join(result.lines))
+        if result.navigated:
+            self.show_tree_at(self.current_path)
+            self.update_info()
+        elif result.changed:
+            self.refresh_changed_dir()
 
     def show_help(self):
-        help_text = """
-📋 Доступные команды:
-
-  Нд - подняться на уровень вверх
-  Вд <папка> - перейти в подпапку
-  имя <старое> <новое> - переименовать файл/папку
-  имягр <новое> <имя1> <имя2> ... - групповое переименование файлов
-  инфо - показать содержимое текущей папки
-  помощь - показать эту справку
-  выход - закрыть программу
-
+        help_text = COMMANDS_HELP + """
 💡 Советы:
 - Двойной клик по папке в дереве открывает её
 - Правая кнопка мыши открывает контекстное меню
 - Используйте кнопку 'Наверх' для перехода в родительскую папку
 - Для группового переименования выделите несколько файлов с помощью Shift/Ctrl
 """
+        self.cancel_search()
         self.info_text.setText(help_text)
 
+    def show_diagnostics(self):
+        from fs_dialogs import DiagnosticsDialog
+
+        dialog = DiagnosticsDialog(self.metrics, self.diagnostics_extra, self)
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.show()
+
+    def diagnostics_extra(self):
+        """Строки о кэшах и фоновой работе для окна диагностики"""
+        listings = self.engine.listings.stats()
+        text_index = self.engine.text_index.stats()
+        roots = {session.root_path for session in self.sessions}
+        lines = [
+            f"Вкладок: {len(self.sessions)}, корней: {len(roots)}",
+            f"Кэш папок: попаданий {listings['hits']}, промахов {listings['misses']}, "
+            f"вытеснено {listings['evictions']}, папок {listings['entries']}, "
+            f"{listings['bytes'] // 1024} из {listings['max_bytes'] // 1024} КБ",
+            f"Кэш размеров: папок {len(self.engine.rollup.records)} "
+            f"из {self.engine.rollup.max_dirs}, вытеснено {self.engine.rollup.evictions}",
+            f"Индекс содержимого: файлов {text_index['files']}, слов {text_index['terms']}",
+            f"Файловых операций в работе: {len(self.engine.operations.active())}",
+        ]
+        if self.model is not None:
+            tree = self.model.stats()
+            lines.insert(3, f"Дерево: узлов {tree['nodes']} из {tree['max_nodes']}, "
+                            f"свёрнутых папок {tree['collapsed']}, "
+                            f"выгружено узлов {tree['evicted']}")
+        return lines
+
+    def closeEvent(self, event):
+        self.change_timer.stop()
+        self.watcher.removePaths(self.watcher.directories())
+        self.watching = False
+        self.cancel_dir_listing()
+        self.cancel_rollup()
+        self.cancel_search()
+        self.close_preview()
+        self.engine.operations.on_update = None
+        self.engine.operations.shutdown()  # Незавершённые операции отменяются (очередь общая)
+        # Переименование прерывание не проверяет: пакет не обрывается на середине
+        for worker in self.findChildren(QThread):
+            worker.requestInterruption()
+            worker.wait()
+        self.engine.scan_pool.shutdown(wait=True, cancel_futures=True)
+        for session in self.sessions:
+            if session.index is not None:
+                session.index.close()
+            session.text_index.close()
+        self.metrics.close()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
+    metrics_path = None
+    if "--metrics" in sys.argv[:-1]:
+        # --metrics <файл>: замеры дописываются в файл JSON lines
+        position = sys.argv.index("--metrics")
+        metrics_path = sys.argv[position + 1]
+        del sys.argv[position:position + 2]
+
+    profile = None
+    if "--profile-startup" in sys.argv:
+        sys.argv.remove("--profile-startup")
+        profile = StartupProfile(STARTUP_STARTED)
+        profile.mark("импорт PySide6")
+
     app = QApplication(sys.argv)
     app.setStyle('Fusion')  # Современный стиль
+    if profile is not None:
+        profile.mark("QApplication")
 
-    window = FileManagerApp()
+    window = FileManagerApp(profile, Metrics(metrics_path))
     window.show()
 
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,387 @@
+"""Полнотекстовый поиск по содержимому файлов дерева main
+
+Обратный индекс хранится в SQLite: словарь слов, список файлов и для каждого
+слова — файлы, где оно встречается, с числом вхождений. Обновление проходит
+дерево, сравнивает размер и mtime каждого файла с сохранёнными и разбирает на
+слова только новые и изменившиеся файлы — в пуле процессов. Запрос не читает
+файлы: результаты ранжируются по BM25 только по данным индекса.
+"""
+import os
+import re
+import math
+import time
+import heapq
+import sqlite3
+import threading
+import multiprocessing
+from array import array
+from itertools import repeat
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fs_index import RACY_MTIME_NS
+
+# Имя файла индекса в служебной папке
+TEXT_INDEX_NAME = "text_index.sqlite3"
+# Сколько байт от начала файла индексировать
+TEXT_MAX_BYTES = 16 * 1024 * 1024
+# По скольким байтам начала файла решать, текстовый ли он
+TEXT_SNIFF_BYTES = 8 * 1024
+# Меньше стольких файлов разбираем в своём процессе: запуск пула дороже
+POOL_MIN_FILES = 32
+# Сколько разобранных файлов записывать одной транзакцией
+STORE_BATCH_FILES = 1024
+# Кэш страниц базы на соединение, КБ
+CACHE_KB = 64 * 1024
+# Сколько результатов показывать
+TEXT_SEARCH_LIMIT = 50
+# Тип элементов списка слов файла: по нему удаляются записи файла из индекса
+TERM_ID_TYPE = "I"
+# Параметры ранжирования BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Слово — от 2 до 64 букв, цифр или подчёркиваний; регистр не учитывается, ё = е
+_WORD_RE = re.compile(r"\w{2,64}")
+_QUERY_RE = re.compile(r"(\w{2,64})(\*?)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    term_ids BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (term_id, file_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class TextIndexStats:
+    """Итог обновления индекса"""
+
+    def __init__(self, files, indexed, removed):
+        self.files = files  # Файлов в дереве
+        self.indexed = indexed  # Разобрано заново
+        self.removed = removed  # Убрано исчезнувших
+
+
+class TextHit:
+    """Найденный файл: относительный путь, оценка и число вхождений слов запроса"""
+    __slots__ = ("path", "score", "count")
+
+    def __init__(self, path, score, count):
+        self.path = path
+        self.score = score
+        self.count = count
+
+
+def _normalize(text):
+    return text.casefold().replace("ё", "е")
+
+
+def _decode(data):
+    """Текст из байтов: UTF-8, иначе cp1251; None для двоичных данных"""
+    if b"\0" in data[:TEXT_SNIFF_BYTES]:
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start >= len(data) - 3 and len(data) >= TEXT_MAX_BYTES:
+            return data[:e.start].decode("utf-8")  # Обрезали посреди символа
+        return data.decode("cp1251", errors="replace")
+
+
+def tokenize_file(path):
+    """(слово -> число вхождений, всего слов) или None для двоичных и недоступных файлов
+
+    Выполняется в процессах пула, поэтому не трогает индекс.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read(TEXT_MAX_BYTES)
+    except OSError:
+        return None
+    text = _decode(data)
+    if text is None:
+        return None
+
+    counts = {}
+    for word in _WORD_RE.findall(_normalize(text)):
+        counts[word] = counts.get(word, 0) + 1
+    return counts, sum(counts.values())
+
+
+def _tokenize_all(paths, workers):
+    """Результаты tokenize_file по порядку paths; большие пакеты — в пуле процессов"""
+    done = 0
+    if len(paths) >= POOL_MIN_FILES:
+        try:
+            # Пул создаётся в режиме spawn: fork из многопоточного процесса небезопасен
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+            try:
+                chunksize = max(1, min(64, len(paths) // 64))
+                for tokens in pool.map(tokenize_file, paths, chunksize=chunksize):
+                    yield tokens
+                    done += 1
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+            return
+        except (BrokenProcessPool, OSError):
+            pass  # Пул не запустился или упал — досчитываем в своём процессе
+
+    for path in paths[done:]:
+        yield tokenize_file(path)
+
+
+def _walk_files(root_path, is_cancelled=None):
+    """(отн. путь, размер, mtime) обычных файлов без перехода по символическим ссылкам"""
+    stack = [(root_path, "")]
+    while stack:
+        if is_cancelled is not None and is_cancelled():
+            return
+        path, rel = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    entry_rel = f"{rel}/{entry.name}" if rel else entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, entry_rel))
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            yield entry_rel, st.st_size, st.st_mtime_ns
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+class TextIndex:
+    """Обратный индекс содержимого файлов дерева root_path
+
+    Пути хранятся относительно корня через '/'. Соединения с базой — у каждого
+    потока свои, как в MetadataIndex; обновления выполняются по одному.
+    """
+
+    def __init__(self, root_path, db_path, workers=None):
+        self.root_path = os.path.abspath(root_path)
+        self.db_path = db_path
+        self.workers = workers
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        self.update_lock = threading.Lock()
+        self.updated = False  # Прошло ли обновление в этом процессе
+
+    def connection(self):
+        """Соединение текущего потока; база создаётся при первом обращении"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA cache_size = -{CACHE_KB}")
+            conn.executescript(SCHEMA)
+            self.local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def meta(self, key, default=0):
+        row = self.connection().execute("SELECT value FROM meta WHERE key = ?",
+                                        (key,)).fetchone()
+        return row[0] if row else default
+
+    def is_built(self):
+        """Проходило ли обновление хотя бы раз (в любом процессе)"""
+        return self.meta("files", None) is not None
+
+    def stats(self):
+        conn = self.connection()
+        return {
+            "files": self.meta("files"),
+            "terms": conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0],
+        }
+
+    def update(self, is_cancelled=None):
+        """Разбирает новые и изменившиеся файлы, убирает исчезнувшие
+
+        Возвращает TextIndexStats или None, если обновление прервано (уже
+        записанные файлы остаются в индексе).
+        """
+        with self.update_lock:
+            conn = self.connection()
+            scan_started = time.time_ns()
+            stored = {path: (size, mtime_ns) for path, size, mtime_ns in
+                      conn.execute("SELECT path, size, mtime_ns FROM files")}
+
+            seen = set()
+            todo = []
+            for rel, size, mtime_ns in _walk_files(self.root_path, is_cancelled):
+                seen.add(rel)
+                if stored.get(rel) != (size, mtime_ns):
+                    if scan_started - mtime_ns < RACY_MTIME_NS:
+                        mtime_ns = -1  # Слишком свежий файл — разберём ещё раз в следующий проход
+                    todo.append((rel, size, mtime_ns))
+            if is_cancelled is not None and is_cancelled():
+                return None
+
+            removed = [path for path in stored if path not in seen]
+            if removed:
+                with self.write_lock, conn:
+                    for path in removed:
+                        self._delete_file(conn, path)
+
+            term_ids = {}
+            batch = []
+            paths = [os.path.join(self.root_path, *rel.split("/")) for rel, _, _ in todo]
+            tokens = _tokenize_all(paths, self.workers)
+            try:
+                for item, result in zip(todo, tokens):
+                    if is_cancelled is not None and is_cancelled():
+                        return None
+                    batch.append((item, result))
+                    if len(batch) >= STORE_BATCH_FILES:
+                        self._store(conn, batch, term_ids)
+                        batch = []
+            finally:
+                tokens.close()  # Останавливает пул, если обход прерван
+            self._store(conn, batch, term_ids)
+
+            with self.write_lock, conn:
+                if removed or todo:
+                    # Слова, которых не осталось ни в одном файле
+                    conn.execute("DELETE FROM terms WHERE NOT EXISTS "
+                                 "(SELECT 1 FROM postings WHERE term_id = terms.id)")
+                count, total = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM files WHERE length > 0"
+                ).fetchone()
+                conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                 (("files", count), ("length", total)))
+            self.updated = True
+            return TextIndexStats(len(seen), len(todo), len(removed))
+
+    @staticmethod
+    def _delete_file(conn, path):
+        row = conn.execute("SELECT id, term_ids FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            file_id, term_ids = row
+            conn.executemany("DELETE FROM postings WHERE term_id = ? AND file_id = ?",
+                             zip(array(TERM_ID_TYPE, term_ids), repeat(file_id)))
+            conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _store(self, conn, batch, term_ids):
+        """Записывает порцию [((отн. путь, размер, mtime), итог tokenize_file)]"""
+        if not batch:
+            return
+        with self.write_lock, conn:
+            rows = []
+            for (rel, size, mtime_ns), result in batch:
+                counts, length = result if result is not None else ({}, 0)
+                self._delete_file(conn, rel)
+                for term in counts:
+                    if term not in term_ids:
+                        term_ids[term] = self._term_id(conn, term)
+                ids = array(TERM_ID_TYPE, map(term_ids.__getitem__, counts))
+                file_id = conn.execute(
+                    "INSERT INTO files (path, size, mtime_ns, length, term_ids) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (rel, size, mtime_ns, length, ids.tobytes())).lastrowid
+                rows.extend(zip(ids, repeat(file_id), counts.values()))
+            # В порядке ключа вставка идёт по соседним страницам, а не вразброс;
+            # внутри слова файлы уже идут по возрастанию id
+            rows.sort(key=itemgetter(0))
+            conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", rows)
+
+    @staticmethod
+    def _term_id(conn, term):
+        row = conn.execute("SELECT id FROM terms WHERE term = ?", (term,)).fetchone()
+        if row is not None:
+            return row[0]
+        return conn.execute("INSERT INTO terms (term) VALUES (?)", (term,)).lastrowid
+
+    def search(self, query, limit=TEXT_SEARCH_LIMIT):
+        """Файлы, где есть все слова запроса, по убыванию оценки BM25
+
+        Слово со звёздочкой на конце (отчёт*) — любое слово с таким началом.
+        Возвращает (первые limit результатов [TextHit], всего найдено).
+        Запрос без слов — ValueError.
+        """
+        words = _QUERY_RE.findall(_normalize(query))
+        if not words:
+            raise ValueError("в запросе нет слов (от 2 букв или цифр)")
+
+        conn = self.connection()
+        file_count = self.meta("files")
+        if not file_count:
+            return [], 0
+        average_length = self.meta("length") / file_count
+
+        # Для каждого слова — файлы с ним и число вхождений (у слова с * — всех подходящих)
+        postings = []
+        for word, prefix in words:
+            if prefix:
+                condition, params = "t.term >= ? AND t.term < ?", (word, word + "\U0010ffff")
+            else:
+                condition, params = "t.term = ?", (word,)
+            found = dict(conn.execute(
+                f"SELECT p.file_id, SUM(p.count) FROM terms t "
+                f"JOIN postings p ON p.term_id = t.id WHERE {condition} GROUP BY p.file_id",
+                params))
+            if not found:
+                return [], 0
+            postings.append(found)
+
+        # Пересечение начинаем с самого редкого слова: дальше множество только сужается
+        postings.sort(key=len)
+        matches = {file_id: [] for file_id in postings[0]}  # file_id -> [(idf, вхождений)]
+        for found in postings:
+            idf = math.log(1 + (file_count - len(found) + 0.5) / (len(found) + 0.5))
+            matches = {file_id: parts for file_id, parts in matches.items() if file_id in found}
+            for file_id, parts in matches.items():
+                parts.append((idf, found[file_id]))
+        if not matches:
+            return [], 0
+
+        lengths = {}
+        file_ids = list(matches)
+        for start in range(0, len(file_ids), 500):
+            chunk = file_ids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            lengths.update(conn.execute(
+                f"SELECT id, length FROM files WHERE id IN ({marks})", chunk))
+
+        ranked = []
+        for file_id, parts in matches.items():
+            # Вклад слова растёт с числом вхождений, но насыщается; длинные файлы штрафуются
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths.get(file_id, 0) / average_length)
+            score = sum(idf * count * (BM25_K1 + 1) / (count + norm) for idf, count in parts)
+            ranked.append((score, file_id))
+        top = heapq.nlargest(limit, ranked)
+
+        hits = []
+        for score, file_id in top:
+            row = conn.execute("SELECT path FROM files WHERE id = ?", (file_id,)).fetchone()
+            if row is not None:
+                hits.append(TextHit(row[0], score, sum(count for _, count in matches[file_id])))
+        return hits, len(matches)